@@ -2,35 +2,111 @@
 Telegram Note Taker 配置文件
 """
 import os
-from typing import List
+import threading
+from typing import Dict, FrozenSet, List, Optional, Set
+
+ENV_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+
+# 进程启动时已经存在的环境变量优先于 .env 中的值
+_PROCESS_ENV_KEYS = frozenset(os.environ)
+# 上次从 .env 写入 os.environ 的变量（重新加载时移除 .env 中已删除的变量）
+_env_file_keys: Set[str] = set()
+
+
+def _read_env_file(env_file: str) -> Dict[str, str]:
+    """读取 .env 文件中的变量"""
+    try:
+        # 尝试使用 python-dotenv
+        from dotenv import dotenv_values
+        return {key: value for key, value in dotenv_values(env_file).items() if value is not None}
+    except ImportError:
+        # 如果没有 python-dotenv，手动解析
+        values = {}
+        with open(env_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and '=' in line:
+                    key, value = line.split('=', 1)
+                    values[key.strip()] = value.strip()
+        return values
+
 
 # 自动加载 .env 文件
 def _load_env_file():
-    """加载 .env 文件中的环境变量"""
-    env_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
-    if os.path.exists(env_file):
-        try:
-            # 尝试使用 python-dotenv
-            from dotenv import load_dotenv
-            load_dotenv(env_file)
-        except ImportError:
-            # 如果没有 python-dotenv，手动解析
-            with open(env_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#') and '=' in line:
-                        key, value = line.split('=', 1)
-                        os.environ[key.strip()] = value.strip()
+    """加载 .env 文件中的环境变量，可重复调用以重新加载"""
+    global _env_file_keys
+    values = _read_env_file(ENV_FILE) if os.path.exists(ENV_FILE) else {}
+    for key in _env_file_keys - values.keys():
+        os.environ.pop(key, None)
+    loaded = set()
+    for key, value in values.items():
+        if key not in _PROCESS_ENV_KEYS:
+            os.environ[key] = value
+            loaded.add(key)
+    _env_file_keys = loaded
+
+
+def _env_file_mtime() -> float:
+    """.env 的修改时间，不存在时为 0"""
+    try:
+        return os.stat(ENV_FILE).st_mtime
+    except OSError:
+        return 0.0
 
 # 在导入时自动加载环境变量
 _load_env_file()
 
+
+class ConfigSnapshot:
+    """每条消息都要检查的访问控制配置，加载时解析一次
+
+    列表解析为 frozenset，成员判断为 O(1)；重新加载时整体替换快照对象，
+    处理中的消息看到的始终是同一份完整配置。
+    """
+    
+    __slots__ = ('allowed_groups', 'admin_ids', 'summary_report_chat_id', 'env_mtime')
+    
+    def __init__(self, allowed_groups: FrozenSet[int], admin_ids: FrozenSet[int],
+                 summary_report_chat_id: int = 0, env_mtime: float = 0.0):
+        self.allowed_groups = allowed_groups
+        self.admin_ids = admin_ids
+        self.summary_report_chat_id = summary_report_chat_id
+        self.env_mtime = env_mtime
+    
+    def is_allowed_chat(self, chat_id: int) -> bool:
+        """没有配置允许列表时允许所有群组"""
+        return not self.allowed_groups or chat_id in self.allowed_groups
+    
+    def is_admin(self, user_id: int) -> bool:
+        return user_id in self.admin_ids
+
 class Config:
     """应用程序配置类"""
     
     # Telegram Bot Token (必须设置)
     BOT_TOKEN: str = os.getenv('TELEGRAM_BOT_TOKEN', '')
     
+    # 接收更新的方式 ('polling' 长轮询, 'webhook' 内置 HTTP 服务器接收推送)
+    BOT_MODE: str = os.getenv('BOT_MODE', 'polling')
+    
+    # 同时处理的 Update 数量（不同群组并发，同一群组内始终按顺序处理）
+    MAX_CONCURRENT_UPDATES: int = int(os.getenv('MAX_CONCURRENT_UPDATES', '8'))
+    # 同时运行的实时总结回调数量（单独限流，不占用消息处理名额）
+    HEAVY_UPDATE_CONCURRENCY: int = int(os.getenv('HEAVY_UPDATE_CONCURRENCY', '2'))
+    
+    # Webhook 设置（仅 BOT_MODE=webhook 时生效）
+    WEBHOOK_URL: str = os.getenv('WEBHOOK_URL', '')  # 外部可访问的 HTTPS 地址，例如 https://bot.example.com
+    WEBHOOK_PATH: str = os.getenv('WEBHOOK_PATH', '/webhook')
+    WEBHOOK_LISTEN: str = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+    WEBHOOK_PORT: int = int(os.getenv('WEBHOOK_PORT', '8080'))
+    WEBHOOK_SECRET_TOKEN: str = os.getenv('WEBHOOK_SECRET_TOKEN', '')  # 留空时每次启动随机生成
+    WEBHOOK_MAX_CONNECTIONS: int = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))  # Telegram 推送的最大并发连接数
+    
+    # 运行指标（Prometheus 文本格式）：webhook 模式挂在 Webhook 服务器上，
+    # 长轮询模式单独监听 WEBHOOK_LISTEN:WEBHOOK_PORT（Dockerfile 中 EXPOSE 的 8080）
+    METRICS_ENABLED: bool = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+    METRICS_PATH: str = os.getenv('METRICS_PATH', '/metrics')
+    
     # 管理员用户ID列表 (可以管理bot的用户)
     @classmethod
     def get_admin_ids(cls) -> List[int]:
@@ -42,7 +118,7 @@ class Config:
                 return []
         return []
     
-    ADMIN_IDS: List[int] = []  # 将在运行时动态获取
+    ADMIN_IDS: FrozenSet[int] = frozenset()  # 由 reload() 填充
     
     # 允许记录的群组ID列表 (留空表示允许所有群组)
     @classmethod
@@ -55,14 +131,67 @@ class Config:
                 return []
         return []
     
-    ALLOWED_GROUPS: List[int] = []  # 将在运行时动态获取
+    ALLOWED_GROUPS: FrozenSet[int] = frozenset()  # 由 reload() 填充
     
     # 数据存储设置
     DATA_DIR: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
     LOG_DIR: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
     
-    # 消息存储格式 ('json', 'txt', 'sqlite')
-    STORAGE_FORMAT: str = 'json'
+    # 消息存储格式 ('json', 'jsonl', 'txt', 'sqlite')
+    STORAGE_FORMAT: str = os.getenv('STORAGE_FORMAT', 'json')
+    
+    # JSONL 格式的 fsync 间隔（秒），0 表示每条消息都立即 fsync
+    JSONL_FSYNC_INTERVAL: float = float(os.getenv('JSONL_FSYNC_INTERVAL', '1.0'))
+    
+    # SQLite 连接设置（WAL 模式下的读连接池大小、同步级别和缓存）
+    SQLITE_READ_POOL_SIZE: int = int(os.getenv('SQLITE_READ_POOL_SIZE', '4'))
+    SQLITE_SYNCHRONOUS: str = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')  # 'OFF', 'NORMAL', 'FULL'
+    SQLITE_CACHE_SIZE_MB: int = int(os.getenv('SQLITE_CACHE_SIZE_MB', '16'))
+    SQLITE_MMAP_SIZE_MB: int = int(os.getenv('SQLITE_MMAP_SIZE_MB', '64'))
+    # 旧版本数据库在线迁移时每个事务回填的行数
+    SQLITE_MIGRATION_BATCH_SIZE: int = int(os.getenv('SQLITE_MIGRATION_BATCH_SIZE', '5000'))
+    
+    # 异步批量写入队列（handle_message 只入队，由后台线程批量落盘）
+    WRITE_QUEUE_ENABLED: bool = os.getenv('WRITE_QUEUE_ENABLED', 'true').lower() == 'true'
+    WRITE_QUEUE_MAXSIZE: int = int(os.getenv('WRITE_QUEUE_MAXSIZE', '10000'))
+    WRITE_BATCH_SIZE: int = int(os.getenv('WRITE_BATCH_SIZE', '200'))
+    WRITE_FLUSH_INTERVAL: float = float(os.getenv('WRITE_FLUSH_INTERVAL', '0.5'))  # 秒
+    WRITE_QUEUE_PUT_TIMEOUT: float = float(os.getenv('WRITE_QUEUE_PUT_TIMEOUT', '10'))  # 队列满时最长等待秒数
+    
+    # 异步处理器中的阻塞存储操作（统计、搜索、读取消息和历史总结）在专用线程池中执行
+    STORAGE_EXECUTOR_WORKERS: int = int(os.getenv('STORAGE_EXECUTOR_WORKERS', '4'))
+    STORAGE_CALL_TIMEOUT: float = float(os.getenv('STORAGE_CALL_TIMEOUT', '30'))  # 秒，0 表示不限制
+    
+    # 事件循环阻塞监控：心跳迟到超过阈值时记录阻塞位置的调用栈（秒，0 表示不监控）
+    LOOP_LAG_THRESHOLD: float = float(os.getenv('LOOP_LAG_THRESHOLD', '0.25'))
+    LOOP_MONITOR_INTERVAL: float = float(os.getenv('LOOP_MONITOR_INTERVAL', '0.1'))
+    
+    # 管理员 /profile 命令的采样分析：采样间隔（秒）、最长采样时间（秒）、最多保存的调用栈数、报告中的热点数
+    PROFILE_SAMPLE_INTERVAL: float = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+    PROFILE_MAX_SECONDS: int = int(os.getenv('PROFILE_MAX_SECONDS', '120'))
+    PROFILE_MAX_STACKS: int = int(os.getenv('PROFILE_MAX_STACKS', '20000'))
+    PROFILE_TOP_N: int = int(os.getenv('PROFILE_TOP_N', '15'))
+    
+    # 分段索引（文件格式下 群组+日期 -> 文件 的目录）保存间隔（秒）
+    SEGMENT_INDEX_SAVE_INTERVAL: float = float(os.getenv('SEGMENT_INDEX_SAVE_INTERVAL', '5'))
+    
+    # 群组目录（data/groups.json）保存间隔（秒）
+    GROUP_REGISTRY_SAVE_INTERVAL: float = float(os.getenv('GROUP_REGISTRY_SAVE_INTERVAL', '10'))
+    
+    # 文件格式下的群组统计汇总（data/stats_rollup.json）保存间隔（秒）
+    STATS_ROLLUP_SAVE_INTERVAL: float = float(os.getenv('STATS_ROLLUP_SAVE_INTERVAL', '10'))
+    
+    # 冷归档：超过指定天数的 JSON / JSONL 日文件压缩到 data/archive/（默认 0，不归档）
+    # 归档会删除原日文件，直接读取 chat_*.json 的脚本将看不到已归档的日期
+    ARCHIVE_AFTER_DAYS: int = int(os.getenv('ARCHIVE_AFTER_DAYS', '0'))
+    ARCHIVE_COMPRESSION_LEVEL: int = int(os.getenv('ARCHIVE_COMPRESSION_LEVEL', '6'))  # gzip 压缩级别 1-9
+    ARCHIVE_CHECK_INTERVAL: float = float(os.getenv('ARCHIVE_CHECK_INTERVAL', '86400'))  # 秒
+    
+    # Parquet 导出（scripts/export_parquet.py，需要安装 pyarrow）
+    EXPORT_DIR: str = os.getenv('EXPORT_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'exports'))
+    EXPORT_BATCH_ROWS: int = int(os.getenv('EXPORT_BATCH_ROWS', '50000'))  # 每批读取 / 缓冲的行数
+    EXPORT_MAX_OPEN_FILES: int = int(os.getenv('EXPORT_MAX_OPEN_FILES', '32'))
+    EXPORT_COMPRESSION: str = os.getenv('EXPORT_COMPRESSION', 'zstd')  # 'zstd', 'snappy', 'gzip', 'none'
     
     # 每个文件最大消息数量 (用于分割大文件)
     MAX_MESSAGES_PER_FILE: int = 10000
@@ -77,7 +206,16 @@ class Config:
     MEDIA_DIR: str = os.path.join(DATA_DIR, 'media')
     
     # 日志级别 ('DEBUG', 'INFO', 'WARNING', 'ERROR')
-    LOG_LEVEL: str = 'INFO'
+    LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO')
+    
+    # 日志经内存队列由后台线程写入文件和控制台；队列满时丢弃新日志，不阻塞消息处理
+    LOG_QUEUE_MAXSIZE: int = int(os.getenv('LOG_QUEUE_MAXSIZE', '10000'))
+    LOG_CONSOLE: bool = os.getenv('LOG_CONSOLE', 'true').lower() == 'true'
+    
+    # 高频事件的日志级别和采样率，格式 "事件=值,事件=值"
+    # 事件: message_received, message_saved, message_filtered, message_private, chat_denied
+    LOG_EVENT_LEVELS: str = os.getenv('LOG_EVENT_LEVELS', '')     # 例如 message_saved=INFO
+    LOG_SAMPLE_RATES: str = os.getenv('LOG_SAMPLE_RATES', '')     # 例如 message_saved=0.01
     
     # 消息过滤设置
     IGNORE_COMMANDS: bool = True  # 忽略以 / 开头的命令
@@ -105,20 +243,44 @@ class Config:
     ANTHROPIC_API_KEY: str = os.getenv('ANTHROPIC_API_KEY', '')
     ANTHROPIC_MODEL: str = os.getenv('ANTHROPIC_MODEL', 'claude-3-sonnet-20240229')
     
+    # AI 接口 HTTP 连接池（所有总结请求共用，保持 keep-alive 并缓存 DNS）
+    AI_HTTP_POOL_SIZE: int = int(os.getenv('AI_HTTP_POOL_SIZE', '20'))           # 最大连接数
+    AI_HTTP_POOL_PER_HOST: int = int(os.getenv('AI_HTTP_POOL_PER_HOST', '10'))   # 单个主机最大连接数
+    AI_HTTP_DNS_TTL: int = int(os.getenv('AI_HTTP_DNS_TTL', '300'))              # DNS 缓存时间（秒）
+    AI_HTTP_KEEPALIVE: float = float(os.getenv('AI_HTTP_KEEPALIVE', '60'))       # 空闲连接保持时间（秒）
+    AI_HTTP_TIMEOUT: float = float(os.getenv('AI_HTTP_TIMEOUT', '120'))          # 单个请求总超时（秒）
+    
+    # AI 接口限流（每分钟请求数 / token 数，0 表示不限制）以及服务端限流时的最大重试次数
+    AI_RATE_LIMIT_RPM: int = int(os.getenv('AI_RATE_LIMIT_RPM', '60'))
+    AI_RATE_LIMIT_TPM: int = int(os.getenv('AI_RATE_LIMIT_TPM', '150000'))
+    AI_MAX_RETRIES: int = int(os.getenv('AI_MAX_RETRIES', '3'))
+    
     # AI 总结配置
     SUMMARY_LANGUAGE: str = os.getenv('SUMMARY_LANGUAGE', 'zh')  # 总结语言
     SUMMARY_LENGTH: str = os.getenv('SUMMARY_LENGTH', 'medium')  # 'short', 'medium', 'long'
     SUMMARY_STYLE: str = os.getenv('SUMMARY_STYLE', 'bullet')   # 'bullet', 'paragraph', 'structured'
     
+    # 分层总结：单次请求的聊天记录 token 预算，超出时分块并发总结后再合并
+    SUMMARY_CHUNK_TOKENS: int = int(os.getenv('SUMMARY_CHUNK_TOKENS', '12000'))
+    SUMMARY_MAP_CONCURRENCY: int = int(os.getenv('SUMMARY_MAP_CONCURRENCY', '4'))  # 分块总结的最大并发数
+    
     # 自动总结时间 (24小时格式，例如 "23:30")
     AUTO_SUMMARY_TIME: str = os.getenv('AUTO_SUMMARY_TIME', '23:30')
     
+    # 每日自动总结同时处理的群组数
+    SUMMARY_CONCURRENCY: int = int(os.getenv('SUMMARY_CONCURRENCY', '4'))
+    
     # 最小消息数量才触发总结
     MIN_MESSAGES_FOR_SUMMARY: int = int(os.getenv('MIN_MESSAGES_FOR_SUMMARY', '10'))
     
     # 总结存储目录
     SUMMARY_DIR: str = os.path.join(DATA_DIR, 'summaries')
     
+    # 总结缓存（消息窗口未变化时复用已生成的总结，保存在 data/summary_cache.json）
+    SUMMARY_CACHE_ENABLED: bool = os.getenv('SUMMARY_CACHE_ENABLED', 'true').lower() == 'true'
+    SUMMARY_CACHE_TTL: float = float(os.getenv('SUMMARY_CACHE_TTL', '86400'))  # 秒
+    SUMMARY_CACHE_MAX_ENTRIES: int = int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', '500'))
+    
     # 是否在群组中发送总结
     SEND_SUMMARY_TO_CHAT: bool = os.getenv('SEND_SUMMARY_TO_CHAT', 'false').lower() == 'true'
     
@@ -130,7 +292,45 @@ class Config:
             return int(chat_id_str.strip())
         return 0
     
-    SUMMARY_REPORT_CHAT_ID: int = 0  # 将在运行时动态获取
+    SUMMARY_REPORT_CHAT_ID: int = 0  # 由 reload() 填充
+    
+    # 检查 .env 修改时间的间隔（秒），修改后自动重新加载允许的群组和管理员列表，0 表示只响应 SIGHUP
+    CONFIG_RELOAD_INTERVAL: float = float(os.getenv('CONFIG_RELOAD_INTERVAL', '5'))
+    
+    _snapshot: Optional[ConfigSnapshot] = None
+    _reload_lock = threading.Lock()
+    
+    @classmethod
+    def snapshot(cls) -> ConfigSnapshot:
+        """当前的访问控制配置快照"""
+        return cls._snapshot or cls.reload(reload_env=False)
+    
+    @classmethod
+    def reload(cls, reload_env: bool = True) -> ConfigSnapshot:
+        """重新解析允许的群组、管理员和报告群组（reload_env=True 时先重新读取 .env）"""
+        with cls._reload_lock:
+            env_mtime = _env_file_mtime()
+            if reload_env:
+                _load_env_file()
+            snapshot = ConfigSnapshot(
+                allowed_groups=frozenset(cls.get_allowed_groups()),
+                admin_ids=frozenset(cls.get_admin_ids()),
+                summary_report_chat_id=cls.get_summary_report_chat_id(),
+                env_mtime=env_mtime
+            )
+            cls.ALLOWED_GROUPS = snapshot.allowed_groups
+            cls.ADMIN_IDS = snapshot.admin_ids
+            cls.SUMMARY_REPORT_CHAT_ID = snapshot.summary_report_chat_id
+            cls._snapshot = snapshot
+            return snapshot
+    
+    @classmethod
+    def reload_if_changed(cls) -> bool:
+        """.env 修改时间变化时重新加载，返回是否重新加载"""
+        if cls._snapshot is not None and _env_file_mtime() == cls._snapshot.env_mtime:
+            return False
+        cls.reload()
+        return True
 
     @classmethod
     def validate(cls) -> bool:
@@ -139,6 +339,13 @@ class Config:
             print("错误: 请设置 TELEGRAM_BOT_TOKEN 环境变量")
             return False
         
+        if cls.BOT_MODE not in ('polling', 'webhook'):
+            print(f"错误: BOT_MODE 只能是 polling 或 webhook，当前为 {cls.BOT_MODE}")
+            return False
+        if cls.BOT_MODE == 'webhook' and not cls.WEBHOOK_URL:
+            print("错误: BOT_MODE=webhook 时需要设置 WEBHOOK_URL")
+            return False
+        
         # 创建必要的目录
         os.makedirs(cls.DATA_DIR, exist_ok=True)
         os.makedirs(cls.LOG_DIR, exist_ok=True)
@@ -154,4 +361,8 @@ class Config:
             elif cls.AI_PROVIDER == 'claude' and not cls.ANTHROPIC_API_KEY:
                 print("警告: 启用了 AI 总结但未设置 ANTHROPIC_API_KEY")
         
-        return True
\ No newline at end of file
+        return True
+
+
+# 导入时解析一次
+Config.reload(reload_env=False)
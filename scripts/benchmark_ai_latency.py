@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+AI 接口请求延迟基准测试
+对比"每次请求新建 ClientSession"与共享连接池在本地模拟服务器上的延迟和连接复用
+
+用法:
+    python scripts/benchmark_ai_latency.py [--requests 200] [--concurrency 4] [--latency 0.01]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config.config import Config
+from ai_summary import OpenAIProvider
+from mock_openai_server import MockOpenAIServer
+
+
+async def _run(provider: OpenAIProvider, requests: int, concurrency: int):
+    """并发发送请求，返回每个请求的耗时（毫秒）"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await provider._complete(f"[2024-01-01 10:00:00] 测试用户: 第 {i} 条基准测试消息")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies
+
+
+async def _bench(args):
+    server = MockOpenAIServer(latency=args.latency)
+    await server.start()
+    Config.OPENAI_BASE_URL = server.base_url
+    Config.OPENAI_API_KEY = Config.OPENAI_API_KEY or 'benchmark'
+    # 只测量连接开销，不受限流影响
+    Config.AI_RATE_LIMIT_RPM = 0
+    Config.AI_RATE_LIMIT_TPM = 0
+
+    results = {}
+    try:
+        for name, shared in (('每次新建会话 (旧)', False), ('共享连接池 (新)', True)):
+            provider = OpenAIProvider()
+            if shared:
+                await provider.start()
+            start = time.perf_counter()
+            latencies = await _run(provider, args.requests, args.concurrency)
+            elapsed = time.perf_counter() - start
+            stats = provider.get_stats()
+            await provider.close()
+
+            latencies.sort()
+            results[name] = {
+                'p50': statistics.median(latencies),
+                'p95': latencies[int(len(latencies) * 0.95) - 1],
+                'throughput': args.requests / elapsed,
+                'created': stats['connections_created'],
+                'reused': stats['connections_reused'],
+            }
+    finally:
+        await server.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AI 接口请求延迟基准测试')
+    parser.add_argument('--requests', type=int, default=200, help='请求数')
+    parser.add_argument('--concurrency', type=int, default=4, help='并发数')
+    parser.add_argument('--latency', type=float, default=0.01, help='模拟服务器每个请求的延迟（秒）')
+    args = parser.parse_args()
+
+    print(f"📊 AI 接口延迟基准测试 ({args.requests} 个请求, 并发 {args.concurrency})")
+    print("=" * 72)
+    results = asyncio.run(_bench(args))
+    for name, r in results.items():
+        print(
+            f"{name:<18} p50 {r['p50']:7.2f} ms  p95 {r['p95']:7.2f} ms  "
+            f"{r['throughput']:7.1f} 次/秒  新建连接 {r['created']:4d}  复用 {r['reused']:4d}"
+        )
+
+    before, after = results.values()
+    print("=" * 72)
+    print(f"🚀 p50 延迟降低: {before['p50'] / after['p50']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
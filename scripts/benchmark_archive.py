@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+冷归档基准测试
+生成一年的合成 JSON 日文件（indent=2，与 JSON 存储格式相同），归档后对比磁盘占用和按天读取延迟
+
+用法:
+    python scripts/benchmark_archive.py [--chats 5] [--days 365] [--messages 300] [--level 6]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from config.config import Config
+
+WORDS = ['项目', '进度', '会议', '发布', '测试', '部署', '服务器', '数据库', '性能', '优化',
+         'release', 'deploy', 'bug', 'review', 'docker', 'python', 'cache', 'index']
+
+
+def _seed(data_dir: str, chats: int, days: int, per_day: int, start: datetime):
+    """写入 chats 个群组 days 天的 JSON 日文件"""
+    rng = random.Random(42)
+    for c in range(chats):
+        chat_id = -1001000000000 - c
+        for d in range(days):
+            day = start + timedelta(days=d)
+            messages = []
+            for i in range(per_day):
+                ts = day + timedelta(seconds=i * 86400 // per_day)
+                user = rng.randint(0, 50)
+                messages.append({
+                    'message_id': d * per_day + i,
+                    'chat_id': chat_id,
+                    'chat_title': f'测试群组 {c}',
+                    'user_id': 10000 + user,
+                    'username': f'user{user}',
+                    'first_name': f'用户{user}',
+                    'last_name': None,
+                    'message_text': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 20))),
+                    'message_type': 'text',
+                    'timestamp': ts.strftime('%Y-%m-%d %H:%M:%S'),
+                    'media_info': None
+                })
+            filename = f"chat_{abs(chat_id)}_{day.strftime('%Y%m%d')}.json"
+            with open(os.path.join(data_dir, filename), 'w', encoding='utf-8') as f:
+                json.dump(messages, f, ensure_ascii=False, indent=2)
+
+
+def _dir_size(path: str) -> int:
+    """目录下所有文件的总字节数"""
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+def _read_latency(index, samples):
+    """按天读取消息的中位延迟（毫秒）"""
+    from storage import MESSAGE_FILE_EXTENSIONS, load_messages_file
+    timings = []
+    for chat_id, date_str in samples:
+        start = time.perf_counter()
+        for path in index.get_segment_paths(chat_id, date_str, MESSAGE_FILE_EXTENSIONS):
+            load_messages_file(path)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='冷归档基准测试')
+    parser.add_argument('--chats', type=int, default=5, help='群组数')
+    parser.add_argument('--days', type=int, default=365, help='天数')
+    parser.add_argument('--messages', type=int, default=300, help='每个群组每天的消息数')
+    parser.add_argument('--level', type=int, default=6, help='gzip 压缩级别')
+    parser.add_argument('--samples', type=int, default=200, help='读取延迟采样天数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        Config.DATA_DIR = data_dir
+        Config.STORAGE_FORMAT = 'json'
+        from archive import Archiver
+        from segment_index import get_segment_index
+
+        start = datetime(2024, 1, 1)
+        print(f"📊 冷归档基准测试 ({args.chats} 个群组 × {args.days} 天 × {args.messages} 条/天, gzip -{args.level})")
+        _seed(data_dir, args.chats, args.days, args.messages, start)
+        index = get_segment_index(data_dir)
+
+        rng = random.Random(7)
+        chat_ids = list(index.get_chats())
+        samples = [
+            (rng.choice(chat_ids), (start + timedelta(days=rng.randrange(args.days))).strftime('%Y%m%d'))
+            for _ in range(args.samples)
+        ]
+
+        before_bytes = _dir_size(data_dir)
+        before_latency = _read_latency(index, samples)
+
+        cutoff = (start + timedelta(days=args.days)).strftime('%Y%m%d')
+        began = time.perf_counter()
+        stats = Archiver(data_dir, compression_level=args.level).archive_before(cutoff)
+        elapsed = time.perf_counter() - began
+
+        after_bytes = _dir_size(data_dir)
+        after_latency = _read_latency(index, samples)
+
+        print("=" * 64)
+        print(f"归档 {stats['days']:,} 天 / {stats['files']:,} 个文件，耗时 {elapsed:.1f} 秒")
+        print(f"{'':<12}{'磁盘占用':>14}{'按天读取 p50':>16}")
+        print(f"{'归档前':<12}{before_bytes / 1024 / 1024:>11.1f} MB{before_latency:>13.2f} ms")
+        print(f"{'归档后':<12}{after_bytes / 1024 / 1024:>11.1f} MB{after_latency:>13.2f} ms")
+        print("=" * 64)
+        print(f"🚀 压缩比 {before_bytes / after_bytes:.1f}x，读取延迟 {after_latency / before_latency:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Parquet 导出吞吐量基准测试
+分别在 SQLite 和 JSONL 存储格式下写入合成消息，测量全量导出和增量导出的行/秒及峰值内存
+
+用法:
+    python scripts/benchmark_export.py [--messages 500000] [--chats 20] [--batch-rows 50000]
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from config.config import Config
+
+WORDS = ['项目', '进度', '会议', '发布', '测试', '部署', '服务器', '数据库', '性能', '优化',
+         'release', 'deploy', 'bug', 'review', 'docker', 'python', 'cache', 'index']
+
+
+def _make_messages(count: int, chats: int, start: datetime):
+    """生成跨越约一年的合成消息（按时间顺序）"""
+    rng = random.Random(42)
+    step = 365 * 86400 / count
+    for i in range(count):
+        user = rng.randint(0, 200)
+        yield {
+            'message_id': i,
+            'chat_id': -1001000000000 - i % chats,
+            'chat_title': f'测试群组 {i % chats}',
+            'user_id': 10000 + user,
+            'username': f'user{user}',
+            'first_name': f'用户{user}',
+            'last_name': None,
+            'message_text': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 20))),
+            'message_type': 'photo' if i % 10 == 0 else 'text',
+            'timestamp': (start + timedelta(seconds=int(i * step))).strftime('%Y-%m-%d %H:%M:%S'),
+            'media_info': {'file_id': f'AgAD{i}', 'width': 1280} if i % 10 == 0 else None
+        }
+
+
+def _seed_sqlite(messages):
+    """通过 MessageStorage 批量写入 SQLite"""
+    from storage import MessageStorage
+    storage = MessageStorage()
+    batch = []
+    for message in messages:
+        batch.append(message)
+        if len(batch) >= 5000:
+            storage.save_messages(batch)
+            batch = []
+    storage.save_messages(batch)
+    storage.close()
+
+
+def _seed_jsonl(data_dir: str, messages):
+    """按消息日期直接写入 JSONL 日文件"""
+    files = {}
+    try:
+        for message in messages:
+            date_str = message['timestamp'][:10].replace('-', '')
+            key = (message['chat_id'], date_str)
+            if key not in files:
+                path = os.path.join(data_dir, f"chat_{abs(message['chat_id'])}_{date_str}.jsonl")
+                files[key] = open(path, 'w', encoding='utf-8')
+            files[key].write(json.dumps(message, ensure_ascii=False) + '\n')
+    finally:
+        for f in files.values():
+            f.close()
+
+
+def _bench(storage_format: str, args):
+    """在临时目录中写入数据并导出两次（全量 + 无新数据的增量）"""
+    from exporter import ParquetExporter
+    from sqlite_pool import close_connection_manager
+    from segment_index import close_segment_index
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        Config.DATA_DIR = data_dir
+        Config.STORAGE_FORMAT = storage_format
+        messages = _make_messages(args.messages, args.chats, datetime(2024, 1, 1))
+        if storage_format == 'sqlite':
+            _seed_sqlite(messages)
+        else:
+            _seed_jsonl(data_dir, messages)
+
+        export_dir = os.path.join(data_dir, 'exports')
+        full = ParquetExporter(export_dir, batch_rows=args.batch_rows).export()
+        incremental = ParquetExporter(export_dir, batch_rows=args.batch_rows).export()
+        size = sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, files in os.walk(export_dir) for name in files
+        )
+        if storage_format == 'sqlite':
+            close_connection_manager()
+        else:
+            close_segment_index(data_dir)
+    return full, incremental, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parquet 导出吞吐量基准测试')
+    parser.add_argument('--messages', type=int, default=500_000, help='消息数量')
+    parser.add_argument('--chats', type=int, default=20, help='群组数')
+    parser.add_argument('--batch-rows', type=int, default=50_000, help='每批读取和缓冲的行数')
+    args = parser.parse_args()
+
+    print(f"📊 Parquet 导出基准测试 ({args.messages:,} 条消息, {args.chats} 个群组, 约 1 年)")
+    print("=" * 72)
+    for storage_format in ('sqlite', 'jsonl'):
+        full, incremental, size = _bench(storage_format, args)
+        print(f"{storage_format:<8} 全量 {full['rows'] / full['seconds']:>9,.0f} 行/秒 "
+              f"({full['seconds']:.1f} 秒, {full['files']} 个文件, {size / 1024 / 1024:.1f} MB)  "
+              f"增量 {incremental['rows']} 行 {incremental['seconds'] * 1000:.0f} ms")
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print("=" * 72)
+    print(f"进程峰值内存 {peak_mb:.0f} MB (batch-rows={args.batch_rows:,})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+全文搜索性能基准测试
+向临时 SQLite 数据库写入大量合成消息，对比 FTS5 trigram 索引与 LIKE 全表扫描的查询延迟
+
+用法:
+    python scripts/benchmark_fts_search.py [--rows 1000000] [--batch 20000]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from config.config import Config
+
+WORDS = [
+    '项目', '进度', '会议', '发布', '版本', '测试', '部署', '服务器', '数据库', '性能',
+    '优化', '需求', '设计', '文档', '周报', '预算', '客户', '反馈', '上线', '回滚',
+    'release', 'deploy', 'bug', 'review', 'merge', 'docker', 'kubernetes', 'python',
+    'latency', 'cache', 'index', 'query', 'timeout', 'retry', 'backup', 'monitor',
+]
+
+# 少量消息中出现的罕见短语（LIKE 需要扫描几乎整张表才能找到）
+RARE_PHRASES = ['灾备演练复盘', 'postmortem', '数据迁移方案']
+RARE_EVERY = 20000
+
+# 常见词（最新消息中即可找到足够结果）与罕见短语
+QUERIES = ['服务器', '数据库 性能', 'kubernetes', '灾备演练', 'postmortem', '数据迁移方案', '迁移方案 数据库']
+
+
+def _make_rows(start: int, count: int, rng: random.Random):
+    """生成一批合成消息行"""
+    for i in range(start, start + count):
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 16)))
+        if i % RARE_EVERY == 0:
+            text += ' ' + RARE_PHRASES[i // RARE_EVERY % len(RARE_PHRASES)]
+        yield (
+            i, -1001000000000 - i % 200, f'群组 {i % 200}', 10000 + i % 5000, f'user{i % 5000}',
+            '用户', None, f'{text} #{i}', 'text',
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(1700000000 + i * 3)), None, None
+        )
+
+
+def _seed(rows: int, batch: int):
+    """批量写入合成消息（FTS 索引由触发器同步维护）"""
+    from sqlite_pool import get_connection_manager
+    from storage import INSERT_MESSAGE_SQL
+    rng = random.Random(42)
+    for start in range(0, rows, batch):
+        with get_connection_manager().writer() as conn:
+            conn.executemany(INSERT_MESSAGE_SQL, _make_rows(start, min(batch, rows - start), rng))
+        if (start // batch) % 10 == 9 or start + batch >= rows:
+            print(f"   已写入 {min(start + batch, rows):,} / {rows:,}", flush=True)
+
+
+def _time_queries(search, repeat: int):
+    """返回每个查询的中位延迟（毫秒）"""
+    timings = {}
+    for q in QUERIES:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            search(q)
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[q] = statistics.median(samples)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='全文搜索性能基准测试')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='合成消息数量')
+    parser.add_argument('--batch', type=int, default=20_000, help='每个事务写入的消息数')
+    parser.add_argument('--repeat', type=int, default=5, help='每个查询重复次数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        Config.DATA_DIR = data_dir
+        Config.STORAGE_FORMAT = 'sqlite'
+        from storage import MessageStorage
+        storage = MessageStorage()
+
+        print(f"📊 全文搜索基准测试 ({args.rows:,} 条消息, SQLite {sqlite3.sqlite_version})")
+        print(f"   FTS5 trigram 索引: {'可用' if storage.fts_enabled else '不可用'}")
+        start = time.perf_counter()
+        _seed(args.rows, args.batch)
+        print(f"   写入耗时 {time.perf_counter() - start:.1f} 秒, "
+              f"数据库大小 {os.path.getsize(os.path.join(data_dir, 'messages.db')) / 1024 / 1024:.0f} MB")
+        print("=" * 64)
+
+        fts = _time_queries(lambda q: storage.search_messages(q, limit=5), args.repeat)
+        storage.fts_enabled = False
+        like = _time_queries(lambda q: storage.search_messages(q, limit=5), max(1, args.repeat // 2))
+        storage.fts_enabled = True
+
+        print(f"{'查询':<16}{'FTS5 (ms)':>12}{'LIKE (ms)':>12}")
+        for q in QUERIES:
+            print(f"{q:<16}{fts[q]:>12.2f}{like[q]:>12.2f}")
+        print("=" * 64)
+        print(f"🚀 FTS5 中位延迟 {statistics.median(fts.values()):.2f} ms，"
+              f"LIKE 中位延迟 {statistics.median(like.values()):.2f} ms")
+
+        # 群组内搜索 + 翻页
+        chat_id = -1001000000007
+        start = time.perf_counter()
+        storage.search_messages('服务器', chat_id=chat_id, limit=5, offset=50)
+        print(f"   群组内第 11 页: {(time.perf_counter() - start) * 1000:.2f} ms")
+        storage.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+消息记录端到端基准测试
+用与 Telegram 推送相同结构的 JSON 构造真实的 Update / Message 对象（文字、图片、文档、贴纸等，
+中英文混合，多个群组和用户），逐条交给 TelegramNoteTaker.handle_message，
+经 _extract_message_data 写入 MessageStorage，分别测试每种 STORAGE_FORMAT。
+
+输出每种格式的吞吐量、单条延迟 p50/p99 和每条消息写入的字节数；
+--output 把结果以一行 JSON 追加到文件（含 git 提交），便于跨提交比较。
+
+用法:
+    python scripts/benchmark_ingest.py [--messages 5000] [--chats 50] [--users 500]
+                                       [--formats json,jsonl,txt,sqlite] [--write-queue]
+                                       [--output benchmark_results.jsonl]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from config.config import Config
+
+ZH_WORDS = ['项目', '进度', '会议', '发布', '测试', '部署', '服务器', '数据库', '性能', '优化',
+            '今天', '明天', '需求', '文档', '问题', '已经', '修复', '大家', '看一下', '没问题']
+EN_WORDS = ['release', 'deploy', 'bug', 'review', 'docker', 'python', 'cache', 'index',
+            'meeting', 'latency', 'merge', 'rollback', 'ship', 'LGTM', 'ticket', 'hotfix']
+STICKER_EMOJI = ['😀', '👍', '🎉', '🤔', '😂', '🔥', '❤️', '🙏']
+
+# 消息类型分布（与普通群聊接近）
+MESSAGE_MIX = [('text', 0.70), ('photo', 0.12), ('document', 0.06), ('sticker', 0.10), ('voice', 0.02)]
+
+
+class UpdateFactory:
+    """生成 Telegram Update 的 JSON（与 Bot API 推送的结构一致）"""
+
+    def __init__(self, chats: int, users: int, seed: int = 42):
+        self.rng = random.Random(seed)
+        self.chats = [
+            {'id': -1001000000000 - i, 'type': 'supergroup', 'title': f'测试群组 {i}' if i % 2 else f'Test Group {i}'}
+            for i in range(chats)
+        ]
+        self.users = [
+            {'id': 10000 + i, 'is_bot': False,
+             'first_name': f'用户{i}' if i % 3 else f'User{i}',
+             'last_name': None if i % 4 else f'L{i}',
+             'username': f'user{i}' if i % 5 else None}
+            for i in range(users)
+        ]
+        self._types = [name for name, _ in MESSAGE_MIX]
+        self._weights = [weight for _, weight in MESSAGE_MIX]
+        self._next_id = 1
+
+    def _text(self) -> str:
+        """中英文混合的文本，长度接近聊天消息"""
+        words = ZH_WORDS if self.rng.random() < 0.6 else EN_WORDS
+        sep = '' if words is ZH_WORDS else ' '
+        return sep.join(self.rng.choice(words) for _ in range(self.rng.randint(2, 30)))
+
+    def _file_id(self) -> str:
+        return ''.join(self.rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-')
+                       for _ in range(72))
+
+    def make(self) -> dict:
+        """生成一条群组消息的 Update"""
+        update_id = self._next_id
+        self._next_id += 1
+        chat = self.rng.choice(self.chats)
+        user = {k: v for k, v in self.rng.choice(self.users).items() if v is not None}
+        message = {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': chat,
+            'from': user,
+        }
+        kind = self.rng.choices(self._types, self._weights)[0]
+        if kind == 'text':
+            message['text'] = self._text()
+        elif kind == 'photo':
+            message['photo'] = [
+                {'file_id': self._file_id(), 'file_unique_id': f'p{update_id}s{size}',
+                 'width': size, 'height': size, 'file_size': size * 120}
+                for size in (90, 320, 1280)
+            ]
+            if self.rng.random() < 0.4:
+                message['caption'] = self._text()
+        elif kind == 'document':
+            message['document'] = {
+                'file_id': self._file_id(), 'file_unique_id': f'd{update_id}',
+                'file_name': f'report_{update_id}.pdf', 'mime_type': 'application/pdf',
+                'file_size': self.rng.randint(10_000, 5_000_000)
+            }
+        elif kind == 'sticker':
+            message['sticker'] = {
+                'file_id': self._file_id(), 'file_unique_id': f's{update_id}',
+                'type': 'regular', 'width': 512, 'height': 512,
+                'is_animated': False, 'is_video': False,
+                'emoji': self.rng.choice(STICKER_EMOJI)
+            }
+        elif kind == 'voice':
+            message['voice'] = {
+                'file_id': self._file_id(), 'file_unique_id': f'v{update_id}',
+                'duration': self.rng.randint(1, 60), 'file_size': self.rng.randint(5_000, 500_000)
+            }
+        return {'update_id': update_id, 'message': message}
+
+
+def _dir_size(path: str) -> int:
+    """目录下所有文件的总字节数"""
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+def _git_commit() -> str:
+    """当前 git 提交（不在仓库中时为空）"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+async def _drive(bot, updates) -> list:
+    """逐条调用 handle_message，返回每条的耗时（毫秒）"""
+    timings = []
+    for update in updates:
+        start = time.perf_counter()
+        await bot.handle_message(update, None)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def run_format(storage_format: str, payloads: list, write_queue: bool) -> dict:
+    """用一种存储格式跑完所有消息"""
+    from telegram import Update
+    from bot import TelegramNoteTaker
+    from async_storage import shutdown_storage_executor
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        Config.DATA_DIR = data_dir
+        Config.STORAGE_FORMAT = storage_format
+        Config.WRITE_QUEUE_ENABLED = write_queue
+        bot = TelegramNoteTaker()
+        updates = [Update.de_json(payload, None) for payload in payloads]
+
+        if bot.write_queue:
+            bot.write_queue.start()
+        start = time.perf_counter()
+        timings = asyncio.run(_drive(bot, updates))
+        if bot.write_queue:
+            bot.write_queue.stop()
+        bot.group_registry.flush()
+        bot.storage.close()
+        elapsed = time.perf_counter() - start
+        shutdown_storage_executor()
+
+        written = _dir_size(data_dir)
+
+    timings.sort()
+    return {
+        'messages': len(timings),
+        'seconds': round(elapsed, 3),
+        'messages_per_second': round(len(timings) / elapsed, 1),
+        'p50_ms': round(statistics.median(timings), 4),
+        'p99_ms': round(timings[int(len(timings) * 0.99) - 1], 4),
+        'bytes_per_message': round(written / len(timings), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='消息记录端到端基准测试')
+    parser.add_argument('--messages', type=int, default=5000, help='消息数量')
+    parser.add_argument('--chats', type=int, default=50, help='群组数')
+    parser.add_argument('--users', type=int, default=500, help='用户数')
+    parser.add_argument('--formats', default='json,jsonl,txt,sqlite', help='逗号分隔的存储格式')
+    parser.add_argument('--write-queue', action='store_true', help='启用批量写入队列（默认直接写入）')
+    parser.add_argument('--output', help='把结果以一行 JSON 追加到此文件')
+    args = parser.parse_args()
+
+    try:
+        import telegram  # noqa: F401
+    except ImportError:
+        print("❌ 需要安装 python-telegram-bot: pip install -r requirements.txt")
+        return 1
+
+    # 基准测试只测消息记录：关闭 AI 总结和控制台日志，日志写到临时目录
+    log_dir = tempfile.mkdtemp(prefix='benchmark_ingest_logs_')
+    Config.LOG_DIR = log_dir
+    Config.LOG_CONSOLE = False
+    Config.BOT_TOKEN = Config.BOT_TOKEN or 'benchmark'
+    Config.BOT_MODE = 'polling'
+    Config.ENABLE_AI_SUMMARY = False
+    Config.LOOP_LAG_THRESHOLD = 0
+
+    factory = UpdateFactory(args.chats, args.users)
+    payloads = [factory.make() for _ in range(args.messages)]
+
+    formats = [f.strip() for f in args.formats.split(',') if f.strip()]
+    print(f"📊 消息记录基准测试 ({args.messages:,} 条消息, {args.chats} 个群组, {args.users} 个用户, "
+          f"{'写入队列' if args.write_queue else '直接写入'})")
+    print("=" * 72)
+    print(f"{'格式':<8}{'条/秒':>12}{'p50 (ms)':>12}{'p99 (ms)':>12}{'字节/条':>12}")
+    results = {}
+    try:
+        for storage_format in formats:
+            result = run_format(storage_format, payloads, args.write_queue)
+            results[storage_format] = result
+            print(f"{storage_format:<8}{result['messages_per_second']:>12,.0f}{result['p50_ms']:>12.3f}"
+                  f"{result['p99_ms']:>12.3f}{result['bytes_per_message']:>12,.0f}")
+    finally:
+        from log_pipeline import stop_logging
+        stop_logging()
+        shutil.rmtree(log_dir, ignore_errors=True)
+    print("=" * 72)
+
+    record = {
+        'benchmark': 'ingest',
+        'commit': _git_commit(),
+        'timestamp': datetime.now().strftime(Config.TIME_FORMAT),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {
+            'messages': args.messages, 'chats': args.chats, 'users': args.users,
+            'write_queue': args.write_queue,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        print(f"💾 结果已追加到 {args.output}")
+    else:
+        print(json.dumps(record, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
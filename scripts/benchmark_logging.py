@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+消息处理日志开销基准测试
+对比旧的日志方式（每条消息 5 次 print(flush=True) + 同步 FileHandler / StreamHandler）
+与日志队列 + 按事件级别 / 采样输出的新方式，测量 handle_message 日志部分的单条延迟。
+控制台输出重定向到临时文件（实际部署时输出到终端或 docker 日志管道，旧方式只会更慢）。
+
+用法:
+    python scripts/benchmark_logging.py [--messages 20000]
+"""
+
+import argparse
+import contextlib
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from log_pipeline import LOG_FORMAT, EventLog, setup_logging, stop_logging
+
+
+class _Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def _make_message(i: int):
+    """构造与 telegram.Message 字段相同的简单对象"""
+    return _Obj(
+        message_id=i,
+        text=f'这是第 {i} 条测试消息，内容长度和普通群聊差不多 benchmark message {i}',
+        chat=_Obj(id=-1001234567890 - i % 20, title=f'测试群组 {i % 20}', type='supergroup'),
+        from_user=_Obj(id=10000 + i % 50, first_name=f'用户{i % 50}', username=f'user{i % 50}'),
+    )
+
+
+def legacy_handler(logger: logging.Logger, message):
+    """旧 handle_message / _is_allowed_chat 的日志部分"""
+    chat_info = f"群组: {message.chat.title}" if message.chat.title else f"Chat ID: {message.chat.id}"
+    user_info = f"{message.from_user.first_name}"
+    if message.from_user.username:
+        user_info += f" (@{message.from_user.username})"
+    print(f"📨 收到消息 - {chat_info} | {user_info}", flush=True)
+    print(f"💬 内容: {message.text}", flush=True)
+    print("-" * 50, flush=True)
+    logger.info(f"收到消息 - {chat_info} | {user_info} | 类型: {message.chat.type}")
+    print(f"✅ 允许所有群组，当前群组 ID: {message.chat.id}", flush=True)
+    print(f"✅ 消息已保存: {message.chat.title} - {message.from_user.first_name}", flush=True)
+    logger.info(f"记录消息: {message.chat.title} - {message.from_user.first_name}: {message.text[:50]}")
+
+
+def pipeline_handler(events: EventLog, message):
+    """新 handle_message 的日志部分"""
+    if events.enabled('message_received'):
+        events.log('message_received', chat_id=message.chat.id, user_id=message.from_user.id,
+                   type='文本', chat_type=message.chat.type)
+    events.log('message_saved', chat_id=message.chat.id, message_id=message.message_id, type='text')
+
+
+def _measure(handler, target, messages):
+    """逐条调用 handler，返回每条的耗时（微秒）"""
+    timings = []
+    for message in messages:
+        start = time.perf_counter()
+        handler(target, message)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def bench_legacy(log_dir: str, console, messages):
+    logger = logging.getLogger('benchmark_legacy')
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handlers = [
+        logging.FileHandler(os.path.join(log_dir, 'legacy.log'), encoding='utf-8'),
+        logging.StreamHandler(console),
+    ]
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logger.addHandler(handler)
+    with contextlib.redirect_stdout(console):
+        timings = _measure(legacy_handler, logger, messages)
+    for handler in handlers:
+        logger.removeHandler(handler)
+        handler.close()
+    return timings
+
+
+def bench_pipeline(log_dir: str, console, messages, level: str, sample_rates=None):
+    with contextlib.redirect_stderr(console):
+        logger = setup_logging('benchmark_pipeline', log_dir=log_dir, level=level, console=True)
+    events = EventLog(logger, sample_rates=sample_rates)
+    timings = _measure(pipeline_handler, events, messages)
+    stop_logging('benchmark_pipeline')
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='消息处理日志开销基准测试')
+    parser.add_argument('--messages', type=int, default=20000, help='消息数量')
+    args = parser.parse_args()
+
+    messages = [_make_message(i) for i in range(args.messages)]
+    cases = [
+        ('旧方式 print + 同步写文件', lambda d, c: bench_legacy(d, c, messages)),
+        ('日志队列 DEBUG（全部事件）', lambda d, c: bench_pipeline(d, c, messages, 'DEBUG')),
+        ('日志队列 DEBUG 采样 1%', lambda d, c: bench_pipeline(d, c, messages, 'DEBUG', {'message_received': 0.01, 'message_saved': 0.01})),
+        ('日志队列 INFO（默认）', lambda d, c: bench_pipeline(d, c, messages, 'INFO')),
+        ('日志队列 WARNING', lambda d, c: bench_pipeline(d, c, messages, 'WARNING')),
+    ]
+
+    print(f"📊 消息处理日志开销 ({args.messages:,} 条消息)")
+    print("=" * 72)
+    print(f"{'方式':<28}{'p50 (µs)':>10}{'p99 (µs)':>10}{'条/秒':>14}")
+    for name, run in cases:
+        with tempfile.TemporaryDirectory() as log_dir, \
+                open(os.path.join(log_dir, 'console.out'), 'w', encoding='utf-8') as console:
+            timings = run(log_dir, console)
+        timings.sort()
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        rate = len(timings) / (sum(timings) / 1e6)
+        print(f"{name:<28}{statistics.median(timings):>10.1f}{p99:>10.1f}{rate:>14,.0f}")
+    print("=" * 72)
+
+
+if __name__ == '__main__':
+    main()
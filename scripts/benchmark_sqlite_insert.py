@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+SQLite 写入性能基准测试
+对比"每条消息新建连接 + 默认回滚日志"与共享连接管理器（WAL）的插入吞吐量
+
+用法:
+    python scripts/benchmark_sqlite_insert.py [--messages 5000]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from config.config import Config
+
+
+def _make_message(i: int) -> dict:
+    """构造一条测试消息"""
+    return {
+        'message_id': i,
+        'chat_id': -1001234567890 - (i % 20),
+        'chat_title': '性能测试群组',
+        'user_id': 10000 + i % 50,
+        'username': f'user{i % 50}',
+        'first_name': '测试',
+        'last_name': None,
+        'message_text': f'这是第 {i} 条测试消息 benchmark message {i}',
+        'message_type': 'text',
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'media_info': None
+    }
+
+
+def bench_connect_per_insert(data_dir: str, messages: list) -> float:
+    """旧实现：每条消息单独 connect，默认 DELETE 日志模式"""
+    db_path = os.path.join(data_dir, 'messages.db')
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message_id INTEGER, chat_id INTEGER, chat_title TEXT,
+                user_id INTEGER, username TEXT, first_name TEXT, last_name TEXT,
+                message_text TEXT, message_type TEXT, timestamp DATETIME,
+                media_info TEXT, raw_data TEXT
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_id ON messages(chat_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON messages(timestamp)')
+
+    start = time.perf_counter()
+    for msg in messages:
+        with sqlite3.connect(db_path) as conn:
+            conn.execute('''
+                INSERT INTO messages (
+                    message_id, chat_id, chat_title, user_id, username,
+                    first_name, last_name, message_text, message_type,
+                    timestamp, media_info, raw_data
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                msg['message_id'], msg['chat_id'], msg['chat_title'], msg['user_id'],
+                msg.get('username'), msg['first_name'], msg.get('last_name'),
+                msg['message_text'], msg['message_type'], msg['timestamp'],
+                json.dumps(msg.get('media_info')), json.dumps(msg)
+            ))
+        conn.close()
+    return time.perf_counter() - start
+
+
+def bench_storage(data_dir: str, messages: list) -> float:
+    """当前实现：MessageStorage.save_message（共享连接管理器）"""
+    Config.DATA_DIR = data_dir
+    Config.STORAGE_FORMAT = 'sqlite'
+    from storage import MessageStorage
+
+    storage = MessageStorage()
+    start = time.perf_counter()
+    for msg in messages:
+        storage.save_message(msg)
+    elapsed = time.perf_counter() - start
+    storage.close()
+    return elapsed
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='SQLite 插入吞吐量基准测试')
+    parser.add_argument('--messages', type=int, default=5000, help='插入的消息数量')
+    args = parser.parse_args()
+
+    messages = [_make_message(i) for i in range(args.messages)]
+
+    print(f"📊 SQLite 插入基准测试 ({args.messages} 条消息)")
+    print(f"   SQLite 版本: {sqlite3.sqlite_version}, synchronous={Config.SQLITE_SYNCHRONOUS}")
+    print("=" * 60)
+
+    results = {}
+    for name, bench in (('每次新建连接 (旧)', bench_connect_per_insert),
+                        ('共享连接 + WAL (新)', bench_storage)):
+        with tempfile.TemporaryDirectory() as data_dir:
+            elapsed = bench(data_dir, messages)
+        results[name] = args.messages / elapsed
+        print(f"{name:<20} {elapsed:8.2f} 秒  {results[name]:10.0f} 条/秒")
+
+    before, after = results.values()
+    print("=" * 60)
+    print(f"🚀 提升: {after / before:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
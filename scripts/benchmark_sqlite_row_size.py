@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+SQLite 行编码基准测试
+对比旧行格式（每行额外保存整条消息的 raw_data JSON，无媒体时 media_info 为 'null'）
+与紧凑行格式（不保存 raw_data，无媒体时 media_info 为 NULL）的每条消息字节数和写入吞吐量
+
+用法:
+    python scripts/benchmark_sqlite_row_size.py [--messages 200000] [--batch 1000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from config.config import Config
+
+LEGACY_INSERT_SQL = '''
+    INSERT INTO messages (
+        message_id, chat_id, chat_title, user_id, username,
+        first_name, last_name, message_text, message_type,
+        timestamp, media_info, raw_data, ts
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+WORDS = ['项目', '进度', '会议', '发布', '测试', '部署', '服务器', '数据库', '性能', '优化',
+         'release', 'deploy', 'bug', 'review', 'docker', 'python', 'cache', 'index']
+
+
+def _make_messages(count: int):
+    """生成合成消息，约 10% 带媒体信息"""
+    rng = random.Random(42)
+    messages = []
+    for i in range(count):
+        media_info = None
+        message_type = 'text'
+        if i % 10 == 0:
+            message_type = 'photo'
+            media_info = {'file_id': f'AgACAgUAAxkBAAI{i:010d}', 'caption': '截图', 'width': 1280, 'height': 720}
+        messages.append({
+            'message_id': i,
+            'chat_id': -1001000000000 - i % 20,
+            'chat_title': f'测试群组 {i % 20}',
+            'user_id': 10000 + i % 500,
+            'username': f'user{i % 500}',
+            'first_name': '用户',
+            'last_name': None,
+            'message_text': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 20))),
+            'message_type': message_type,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(1700000000 + i * 3)),
+            'media_info': media_info
+        })
+    return messages
+
+
+def _legacy_rows(batch, timestamp_to_epoch):
+    """按旧行格式生成插入参数"""
+    return [
+        (
+            m['message_id'], m['chat_id'], m['chat_title'], m['user_id'], m['username'],
+            m['first_name'], m['last_name'], m['message_text'], m['message_type'], m['timestamp'],
+            json.dumps(m['media_info']), json.dumps(m), timestamp_to_epoch(m['timestamp'])
+        )
+        for m in batch
+    ]
+
+
+def _run(name: str, messages, batch_size: int):
+    """在临时数据库中写入全部消息，返回写入吞吐量和每条消息字节数"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        Config.DATA_DIR = data_dir
+        Config.STORAGE_FORMAT = 'sqlite'
+        from sqlite_pool import close_connection_manager, get_connection_manager
+        from storage import MessageStorage, timestamp_to_epoch
+        storage = MessageStorage()
+
+        legacy = name == 'legacy'
+        if legacy:
+            with get_connection_manager().writer() as conn:
+                conn.execute('ALTER TABLE messages ADD COLUMN raw_data TEXT')
+
+        start = time.perf_counter()
+        for i in range(0, len(messages), batch_size):
+            batch = messages[i:i + batch_size]
+            if legacy:
+                with get_connection_manager().writer() as conn:
+                    conn.executemany(LEGACY_INSERT_SQL, _legacy_rows(batch, timestamp_to_epoch))
+            else:
+                storage.save_messages(batch)
+        elapsed = time.perf_counter() - start
+
+        with get_connection_manager().reader() as conn:
+            table_bytes = conn.execute(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name = 'messages'"
+            ).fetchone()[0] if _has_dbstat(conn) else None
+        storage.close()
+        close_connection_manager()
+        file_bytes = os.path.getsize(os.path.join(data_dir, 'messages.db'))
+
+    return {
+        'throughput': len(messages) / elapsed,
+        'table_bytes': table_bytes / len(messages) if table_bytes else None,
+        'file_bytes': file_bytes / len(messages),
+    }
+
+
+def _has_dbstat(conn) -> bool:
+    """dbstat 虚拟表需要 SQLITE_ENABLE_DBSTAT_VTAB 编译选项"""
+    try:
+        conn.execute('SELECT 1 FROM dbstat LIMIT 1')
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite 行编码基准测试')
+    parser.add_argument('--messages', type=int, default=200_000, help='消息数量')
+    parser.add_argument('--batch', type=int, default=1000, help='每个事务写入的消息数')
+    args = parser.parse_args()
+
+    messages = _make_messages(args.messages)
+    print(f"📊 SQLite 行编码基准测试 ({args.messages:,} 条消息, 每批 {args.batch})")
+    print("=" * 72)
+    results = {}
+    for name, label in (('legacy', '旧格式 (raw_data)'), ('compact', '紧凑格式 (新)')):
+        r = results[name] = _run(name, messages, args.batch)
+        table = f"{r['table_bytes']:7.1f}" if r['table_bytes'] else '    n/a'
+        print(f"{label:<18} 写入 {r['throughput']:9,.0f} 条/秒  "
+              f"messages 表 {table} 字节/条  文件 {r['file_bytes']:7.1f} 字节/条")
+
+    before, after = results['legacy'], results['compact']
+    print("=" * 72)
+    print(f"🚀 每条消息文件字节数减少 {1 - after['file_bytes'] / before['file_bytes']:.0%}，"
+          f"写入吞吐量 {after['throughput'] / before['throughput']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
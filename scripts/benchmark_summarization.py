@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+AI 总结端到端延迟基准测试
+在临时数据目录中写入一天的消息（10 到 10 万条），用本地模拟 OpenAI 服务器
+计时 AISummarizer.generate_daily_summary，并拆分各阶段耗时：
+
+    读取   _spool_messages（读文件 / SQLite 并格式化、分块暂存，在存储线程池中执行）
+    提示词 _build_*_prompt
+    限流   rate_limiter.acquire 的等待时间
+    网络   OpenAIProvider._complete（并发请求按时间区间合并，不重复计算）
+    保存   _save_summary
+    其他   总耗时减去以上阶段（线程切换、调度等）
+
+--output 把结果以一行 JSON 追加到文件（含 git 提交），便于跨提交比较。
+
+用法:
+    python scripts/benchmark_summarization.py [--sizes 10,100,1000,10000,100000] [--formats jsonl,sqlite]
+                                              [--latency 0.2] [--tokens-per-second 0] [--completion-tokens 200]
+                                              [--error-rate 0] [--repeat 3] [--output benchmark_results.jsonl]
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config.config import Config
+from ai_summary import AISummarizer
+from async_storage import shutdown_storage_executor
+from mock_openai_server import MockOpenAIServer
+from storage import MessageStorage
+
+STAGES = ('load', 'prompt', 'ratelimit', 'network', 'save')
+STAGE_NAMES = {'load': '读取', 'prompt': '提示词', 'ratelimit': '限流', 'network': '网络', 'save': '保存', 'other': '其他'}
+
+ZH_WORDS = ['项目', '进度', '会议', '发布', '测试', '部署', '服务器', '数据库', '性能', '优化',
+            '今天', '明天', '需求', '文档', '问题', '已经', '修复', '大家', '看一下', '没问题']
+EN_WORDS = ['release', 'deploy', 'bug', 'review', 'docker', 'python', 'cache', 'index',
+            'meeting', 'latency', 'merge', 'rollback', 'ship', 'LGTM', 'ticket', 'hotfix']
+
+
+class StageTimer:
+    """记录各阶段的时间区间
+
+    同一阶段的并发调用（如分块总结的网络请求）按区间合并计算墙钟时间，
+    "其他"为总耗时减去所有阶段区间的并集。
+    """
+
+    def __init__(self):
+        self.intervals: Dict[str, List[Tuple[float, float]]] = defaultdict(list)
+
+    def wrap(self, stage: str, func):
+        """包装同步函数"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.intervals[stage].append((start, time.perf_counter()))
+        return wrapper
+
+    def wrap_async(self, stage: str, func):
+        """包装协程函数"""
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.intervals[stage].append((start, time.perf_counter()))
+        return wrapper
+
+    @staticmethod
+    def _union(intervals: List[Tuple[float, float]]) -> float:
+        """区间并集的总长度"""
+        total = 0.0
+        end = float('-inf')
+        for start, stop in sorted(intervals):
+            if stop <= end:
+                continue
+            total += stop - max(start, end)
+            end = stop
+        return total
+
+    def breakdown(self, total: float) -> Dict[str, float]:
+        """各阶段的墙钟时间（毫秒）"""
+        result = {stage: self._union(self.intervals[stage]) * 1000 for stage in STAGES}
+        covered = self._union([item for stage in STAGES for item in self.intervals[stage]])
+        result['other'] = max(0.0, total - covered) * 1000
+        result['requests'] = len(self.intervals['network'])
+        return result
+
+
+def _instrument(summarizer: AISummarizer, timer: StageTimer):
+    """在实例上替换各阶段的方法"""
+    provider = summarizer.provider
+    summarizer._spool_messages = timer.wrap('load', summarizer._spool_messages)
+    summarizer._save_summary = timer.wrap('save', summarizer._save_summary)
+    for name in ('_build_prompt_from_lines', '_build_map_prompt', '_build_reduce_prompt'):
+        setattr(provider, name, timer.wrap('prompt', getattr(provider, name)))
+    provider._complete = timer.wrap_async('network', provider._complete)
+    provider.rate_limiter.acquire = timer.wrap_async('ratelimit', provider.rate_limiter.acquire)
+
+
+def _write_day(chat_id: int, count: int, rng: random.Random):
+    """写入今天的 count 条消息（分段文件按写入日期命名，时间戳均匀分布在一天内）"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    storage = MessageStorage()
+    batch = []
+    for i in range(count):
+        seconds = i * 86400 // count
+        words = ZH_WORDS if rng.random() < 0.6 else EN_WORDS
+        sep = '' if words is ZH_WORDS else ' '
+        user = rng.randrange(200)
+        batch.append({
+            'message_id': i + 1,
+            'chat_id': chat_id,
+            'chat_title': f'基准测试群组 {count}',
+            'user_id': 10000 + user,
+            'username': f'user{user}' if user % 5 else None,
+            'first_name': f'用户{user}',
+            'last_name': None,
+            'message_text': sep.join(rng.choice(words) for _ in range(rng.randint(2, 30))),
+            'message_type': 'text',
+            'timestamp': f'{today} {seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}',
+            'media_info': None,
+        })
+        if len(batch) >= 5000:
+            storage.save_messages(batch)
+            batch = []
+    if batch:
+        storage.save_messages(batch)
+    storage.close()
+
+
+async def _summarize_once(chat_id: int) -> Dict[str, float]:
+    """计时一次 generate_daily_summary"""
+    summarizer = AISummarizer()
+    timer = StageTimer()
+    _instrument(summarizer, timer)
+    await summarizer.start()
+    try:
+        start = time.perf_counter()
+        summary = await summarizer.generate_daily_summary(chat_id, datetime.now())
+        total = time.perf_counter() - start
+    finally:
+        await summarizer.close()
+    result = timer.breakdown(total)
+    result['total'] = total * 1000
+    result['ok'] = summary is not None
+    return result
+
+
+async def _bench_format(storage_format: str, sizes: List[int], args) -> Dict[str, Dict]:
+    """一种存储格式下依次测试各个消息规模"""
+    server = MockOpenAIServer(
+        latency=args.latency,
+        jitter=args.jitter,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        retry_after=0.1,
+        seed=42
+    )
+    await server.start()
+    Config.OPENAI_BASE_URL = server.base_url
+
+    results = {}
+    data_dir = tempfile.mkdtemp(prefix='benchmark_summarization_')
+    try:
+        Config.DATA_DIR = data_dir
+        Config.SUMMARY_DIR = os.path.join(data_dir, 'summaries')
+        Config.STORAGE_FORMAT = storage_format
+        os.makedirs(Config.SUMMARY_DIR, exist_ok=True)
+
+        rng = random.Random(42)
+        for size in sizes:
+            chat_id = -1002000000000 - size
+            await asyncio.to_thread(_write_day, chat_id, size, rng)
+            requests_before, errors_before = server.request_count, server.errors_returned
+
+            runs = [await _summarize_once(chat_id) for _ in range(args.repeat)]
+            result = {
+                key: round(statistics.median(run[key] for run in runs), 2)
+                for key in (*STAGES, 'other', 'total')
+            }
+            result['requests'] = runs[0]['requests']
+            result['server_requests'] = server.request_count - requests_before
+            result['server_errors'] = server.errors_returned - errors_before
+            result['failed_runs'] = sum(1 for run in runs if not run['ok'])
+            results[str(size)] = result
+    finally:
+        await server.stop()
+        shutdown_storage_executor()
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return results
+
+
+def _git_commit() -> str:
+    """当前 git 提交（不在仓库中时为空）"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def _print_table(storage_format: str, results: Dict[str, Dict]):
+    print(f"\n📁 存储格式: {storage_format}")
+    header = f"{'消息数':>8}{'总耗时':>11}" + ''.join(
+        f"{STAGE_NAMES[stage]:>9}" for stage in (*STAGES, 'other')
+    ) + f"{'请求数':>7}  主要耗时"
+    print(header)
+    for size, r in results.items():
+        dominant = max((*STAGES, 'other'), key=lambda stage: r[stage])
+        row = f"{int(size):>8,}{r['total']:>9.1f}ms" + ''.join(
+            f"{r[stage]:>9.1f}" for stage in (*STAGES, 'other')
+        )
+        note = f"  ⚠️ 失败 {r['failed_runs']} 次" if r['failed_runs'] else ''
+        print(f"{row}{r['requests']:>7}  {STAGE_NAMES[dominant]} "
+              f"({r[dominant] / r['total'] * 100 if r['total'] else 0:.0f}%){note}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AI 总结端到端延迟基准测试')
+    parser.add_argument('--sizes', default='10,100,1000,10000,100000', help='逗号分隔的每天消息数')
+    parser.add_argument('--formats', default='jsonl,sqlite', help='逗号分隔的存储格式（json/jsonl/sqlite）')
+    parser.add_argument('--latency', type=float, default=0.2, help='模拟服务器首个 token 前的延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='模拟服务器的随机延迟上限（秒）')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help='模拟服务器输出速率（0 表示不限速）')
+    parser.add_argument('--completion-tokens', type=int, default=200, help='每个请求输出的 token 数')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟服务器随机返回 429 / 500 的概率')
+    parser.add_argument('--repeat', type=int, default=3, help='每个规模重复次数（取中位数）')
+    parser.add_argument('--output', help='把结果以一行 JSON 追加到此文件')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    formats = [f.strip() for f in args.formats.split(',') if f.strip()]
+
+    # 只测总结流程：关闭缓存，限流只在 --error-rate 触发 429 时起作用
+    Config.ENABLE_AI_SUMMARY = True
+    Config.AI_PROVIDER = 'openai'
+    Config.OPENAI_API_KEY = Config.OPENAI_API_KEY or 'benchmark'
+    Config.SUMMARY_CACHE_ENABLED = False
+    Config.MIN_MESSAGES_FOR_SUMMARY = 1
+    Config.AI_RATE_LIMIT_RPM = 0
+    Config.AI_RATE_LIMIT_TPM = 0
+
+    print(f"📊 AI 总结端到端延迟 (模拟服务器延迟 {args.latency * 1000:.0f} ms, "
+          f"输出 {args.completion_tokens} tokens"
+          f"{f' @ {args.tokens_per_second:.0f} tokens/s' if args.tokens_per_second else ''}, "
+          f"分块预算 {Config.SUMMARY_CHUNK_TOKENS} tokens, 并发 {Config.SUMMARY_MAP_CONCURRENCY}, "
+          f"重复 {args.repeat} 次取中位数)")
+    print("=" * 100)
+    results = {}
+    for storage_format in formats:
+        results[storage_format] = asyncio.run(_bench_format(storage_format, sizes, args))
+        _print_table(storage_format, results[storage_format])
+    print("=" * 100)
+
+    record = {
+        'benchmark': 'summarization',
+        'commit': _git_commit(),
+        'timestamp': datetime.now().strftime(Config.TIME_FORMAT),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {
+            'sizes': sizes, 'latency': args.latency, 'jitter': args.jitter,
+            'tokens_per_second': args.tokens_per_second, 'completion_tokens': args.completion_tokens,
+            'error_rate': args.error_rate, 'repeat': args.repeat,
+            'chunk_tokens': Config.SUMMARY_CHUNK_TOKENS, 'map_concurrency': Config.SUMMARY_MAP_CONCURRENCY,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        print(f"💾 结果已追加到 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
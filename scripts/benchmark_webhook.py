@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Webhook 接收基准测试
+启动内置 webhook 服务器，用多个并发客户端 POST 合成的 Telegram Update，
+消费端用与机器人相同的按群组保序调度器并发处理（模拟处理耗时后写入批量写入队列），
+测量请求吞吐量、请求延迟以及全部消息落盘的端到端耗时。
+
+用法:
+    python scripts/benchmark_webhook.py [--updates 5000] [--clients 20] [--concurrency 1,8,32] [--handler-ms 5]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import aiohttp
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from config.config import Config
+from update_processor import ChatOrderedDispatcher
+from webhook_server import SECRET_TOKEN_HEADER, WebhookServer
+
+SECRET = 'benchmark-secret'
+
+
+def make_update(i: int) -> dict:
+    """构造一条群组文本消息的 Update（与 Telegram 推送的 JSON 结构一致）"""
+    chat_id = -1001000000000 - i % 20
+    user_id = 10000 + i % 50
+    return {
+        'update_id': i,
+        'message': {
+            'message_id': i,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'supergroup', 'title': f'测试群组 {i % 20}'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'用户{i % 50}', 'username': f'user{i % 50}'},
+            'text': f'webhook 基准测试消息 {i}',
+        }
+    }
+
+
+def to_message_data(update: dict) -> dict:
+    """与 handle_message 提取的字段一致"""
+    message = update['message']
+    return {
+        'message_id': message['message_id'],
+        'chat_id': message['chat']['id'],
+        'chat_title': message['chat']['title'],
+        'user_id': message['from']['id'],
+        'username': message['from'].get('username'),
+        'first_name': message['from'].get('first_name'),
+        'last_name': message['from'].get('last_name'),
+        'message_text': message.get('text'),
+        'message_type': 'text',
+        'timestamp': datetime.fromtimestamp(message['date']).strftime(Config.TIME_FORMAT),
+        'media_info': None
+    }
+
+
+async def _consume(queue: asyncio.Queue, write_queue, concurrency: int, handler_ms: float, total: int):
+    """模拟 Application 的 update fetcher：每个 Update 一个任务，交给按群组保序的调度器处理"""
+    dispatcher = ChatOrderedDispatcher(concurrency)
+
+    async def handle(update):
+        if handler_ms:
+            await asyncio.sleep(handler_ms / 1000)
+        await write_queue.put(to_message_data(update))
+
+    tasks = []
+    for _ in range(total):
+        update = await queue.get()
+        chat_id = update['message']['chat']['id']
+        tasks.append(asyncio.create_task(dispatcher.run(chat_id, handle(update))))
+    await asyncio.gather(*tasks)
+
+
+async def _send(url: str, updates: list, clients: int):
+    """clients 个并发连接依次发送 updates，返回每个请求的延迟（毫秒）"""
+    latencies = []
+    position = 0
+    headers = {SECRET_TOKEN_HEADER: SECRET}
+    connector = aiohttp.TCPConnector(limit=clients)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def client():
+            nonlocal position
+            while position < len(updates):
+                update = updates[position]
+                position += 1
+                start = time.perf_counter()
+                async with session.post(url, json=update, headers=headers) as resp:
+                    assert resp.status == 200, resp.status
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*(client() for _ in range(clients)))
+    return latencies
+
+
+async def run_once(updates: list, clients: int, concurrency: int, handler_ms: float) -> dict:
+    """一轮测试：返回吞吐量和延迟"""
+    from storage import MessageStorage
+    from write_queue import MessageWriteQueue
+
+    storage = MessageStorage()
+    write_queue = MessageWriteQueue(storage)
+    write_queue.start()
+    queue: asyncio.Queue = asyncio.Queue()
+    server = WebhookServer(queue, lambda data: data, secret_token=SECRET, host='127.0.0.1', port=0)
+    await server.start()
+
+    start = time.perf_counter()
+    consumer = asyncio.create_task(_consume(queue, write_queue, concurrency, handler_ms, len(updates)))
+    latencies = await _send(f'http://127.0.0.1:{server.port}{server.path}', updates, clients)
+    ingest_seconds = time.perf_counter() - start
+    await consumer
+    write_queue.stop()
+    processed_seconds = time.perf_counter() - start
+    await server.stop()
+    storage.close()
+
+    latencies.sort()
+    return {
+        'requests_per_second': len(updates) / ingest_seconds,
+        'p50_ms': statistics.median(latencies),
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1],
+        'processed_per_second': len(updates) / processed_seconds,
+        'saved': write_queue.get_stats()['written'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Webhook 接收基准测试')
+    parser.add_argument('--updates', type=int, default=5000, help='发送的 Update 数量')
+    parser.add_argument('--clients', type=int, default=20, help='并发发送的客户端数（相当于 WEBHOOK_MAX_CONNECTIONS）')
+    parser.add_argument('--concurrency', default='1,8,32', help='逗号分隔的 MAX_CONCURRENT_UPDATES 取值')
+    parser.add_argument('--handler-ms', type=float, default=5.0, help='每个 Update 的模拟处理耗时（毫秒）')
+    parser.add_argument('--format', default='sqlite', choices=['json', 'jsonl', 'sqlite'], help='存储格式')
+    args = parser.parse_args()
+
+    updates = [make_update(i) for i in range(args.updates)]
+    print(f"📊 Webhook 基准测试 ({args.updates:,} 个 Update, {args.clients} 个客户端, "
+          f"处理耗时 {args.handler_ms} ms, 存储 {args.format})")
+    print("=" * 72)
+    print(f"{'并发处理':>8}{'请求/秒':>12}{'p50':>10}{'p99':>10}{'处理完成/秒':>14}{'已保存':>10}")
+    for concurrency in (int(x) for x in args.concurrency.split(',')):
+        with tempfile.TemporaryDirectory() as data_dir:
+            Config.DATA_DIR = data_dir
+            Config.STORAGE_FORMAT = args.format
+            result = asyncio.run(run_once(updates, args.clients, concurrency, args.handler_ms))
+        print(f"{concurrency:>8}{result['requests_per_second']:>12,.0f}{result['p50_ms']:>8.2f}ms"
+              f"{result['p99_ms']:>8.2f}ms{result['processed_per_second']:>14,.0f}{result['saved']:>10,}")
+    print("=" * 72)
+
+
+if __name__ == '__main__':
+    main()
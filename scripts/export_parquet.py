@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+把消息导出为按 群组 / 月份 分区的 Parquet 文件（需要 pip install pyarrow）
+
+用法:
+    python scripts/export_parquet.py                  # 增量导出上次水位线之后的新消息
+    python scripts/export_parquet.py --full           # 忽略水位线，从头导出到新的输出目录
+    python scripts/export_parquet.py --output /mnt/exports --batch-rows 20000
+
+读取示例:
+    import pyarrow.dataset as ds
+    ds.dataset('exports', format='parquet', partitioning='hive').to_table()
+    # DuckDB: SELECT * FROM read_parquet('exports/**/*.parquet', hive_partitioning = true)
+
+导出可以在 Bot 运行时进行，只读取已写入的消息。
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from config.config import Config
+from exporter import WATERMARK_FILENAME, ParquetExporter
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='把消息导出为分区 Parquet 文件')
+    parser.add_argument('--output', default=Config.EXPORT_DIR, help='输出目录')
+    parser.add_argument('--batch-rows', type=int, default=Config.EXPORT_BATCH_ROWS, help='每批读取和缓冲的行数')
+    parser.add_argument('--full', action='store_true', help='忽略水位线，从头导出')
+    args = parser.parse_args()
+
+    if args.full and os.path.exists(os.path.join(args.output, WATERMARK_FILENAME)):
+        print(f"⚠️ {args.output} 中已有导出数据，从头导出会产生重复行，请指定新的 --output")
+        return 1
+
+    try:
+        exporter = ParquetExporter(args.output, batch_rows=args.batch_rows)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+
+    print(f"📦 导出 {Config.STORAGE_FORMAT} 格式的消息到 {args.output}")
+    stats = exporter.export(full=args.full)
+    rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+    print(f"✅ 已导出 {stats['rows']:,} 条消息，{stats['files']} 个文件，"
+          f"耗时 {stats['seconds']:.1f} 秒 ({rate:,.0f} 行/秒)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,10 +12,12 @@ from pathlib import Path
 
 # 添加项目根目录到路径
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
 
 from config.config import Config
-from src.storage import MessageStorage
-from src.ai_summary import AISummarizer
+from storage import MESSAGE_FILE_EXTENSIONS, MessageStorage, load_messages_file
+from segment_index import get_segment_index
+from ai_summary import AISummarizer
 
 async def generate_available_summaries():
     """生成所有可用数据的总结"""
@@ -38,30 +40,25 @@ async def generate_available_summaries():
         storage = MessageStorage()
         summarizer = AISummarizer()
         
-        # 扫描数据目录
-        data_dir = Path(__file__).parent / 'data'
+        # 通过分段索引查找消息（已归档的日期同样可以读取）
+        data_dir = Path(config.DATA_DIR)
         if not data_dir.exists():
             print("❌ 数据目录不存在")
             return
-            
-        # 查找所有消息文件
-        message_files = list(data_dir.glob("chat_*_*.json"))
         
-        if not message_files:
+        index = get_segment_index(config.DATA_DIR)
+        chats = index.get_chats()
+        if not chats:
             print("❌ 没有找到任何消息文件")
             return
             
-        print(f"📁 找到 {len(message_files)} 个消息文件")
+        print(f"📁 找到 {len(chats)} 个群组的消息记录")
         
         # 按日期分组
         dates_data = {}
         
-        for file in message_files:
-            # 从文件名提取信息: chat_CHATID_YYYYMMDD.json
-            parts = file.stem.split('_')
-            if len(parts) >= 3:
-                chat_id = parts[1]
-                date_str = parts[2]
+        for chat_id in chats:
+            for date_str in index.get_chat_dates(chat_id):
                 date_obj = datetime.strptime(date_str, '%Y%m%d')
                 date_key = date_obj.strftime('%Y-%m-%d')
                 
@@ -69,15 +66,17 @@ async def generate_available_summaries():
                     dates_data[date_key] = {}
                     
                 # 读取消息数据
-                try:
-                    with open(file, 'r', encoding='utf-8') as f:
-                        messages = json.load(f)
-                        dates_data[date_key][chat_id] = {
-                            'messages': messages,
-                            'chat_title': messages[0]['chat_title'] if messages else 'Unknown'
-                        }
-                except Exception as e:
-                    print(f"⚠️ 读取文件 {file.name} 失败: {e}")
+                messages = []
+                for filepath in index.get_segment_paths(chat_id, date_str, MESSAGE_FILE_EXTENSIONS):
+                    try:
+                        messages.extend(load_messages_file(filepath))
+                    except Exception as e:
+                        print(f"⚠️ 读取文件 {os.path.basename(filepath)} 失败: {e}")
+                if messages:
+                    dates_data[date_key][chat_id] = {
+                        'messages': messages,
+                        'chat_title': messages[0]['chat_title'] if messages else 'Unknown'
+                    }
         
         # 按日期排序（最新的在前）
         sorted_dates = sorted(dates_data.keys(), reverse=True)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+将已有的 JSON 数组格式日文件转换为 JSON Lines 格式
+
+用法:
+    python scripts/migrate_json_to_jsonl.py            # 转换并把原文件重命名为 .json.bak
+    python scripts/migrate_json_to_jsonl.py --delete   # 转换后删除原文件
+    python scripts/migrate_json_to_jsonl.py --dry-run  # 只列出将要转换的文件
+
+迁移前请先停止 Bot，避免与正在写入的 JSONL 文件冲突。
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from config.config import Config
+from storage import load_messages_file
+
+
+def migrate_file(json_path: str, delete: bool = False) -> int:
+    """转换单个 JSON 文件，返回转换的消息数量"""
+    messages = load_messages_file(json_path)
+    jsonl_path = os.path.splitext(json_path)[0] + '.jsonl'
+
+    # 如果同一天已经存在 JSONL 文件（切换格式当天），合并后按时间排序
+    if os.path.exists(jsonl_path):
+        messages.extend(load_messages_file(jsonl_path))
+        messages.sort(key=lambda x: x.get('timestamp', ''))
+
+    tmp_path = jsonl_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for msg in messages:
+            f.write(json.dumps(msg, ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, jsonl_path)
+
+    if delete:
+        os.remove(json_path)
+    else:
+        os.replace(json_path, json_path + '.bak')
+
+    return len(messages)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='将 chat_*.json 日文件转换为 JSON Lines 格式')
+    parser.add_argument('--data-dir', default=Config.DATA_DIR, help='数据目录')
+    parser.add_argument('--delete', action='store_true', help='转换成功后删除原 JSON 文件')
+    parser.add_argument('--dry-run', action='store_true', help='只列出文件，不做转换')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.data_dir):
+        print(f"❌ 数据目录不存在: {args.data_dir}")
+        return 1
+
+    json_files = sorted(
+        f for f in os.listdir(args.data_dir)
+        if f.startswith('chat_') and f.endswith('.json')
+    )
+
+    print(f"📁 找到 {len(json_files)} 个 JSON 日文件")
+
+    migrated = 0
+    total_messages = 0
+    for filename in json_files:
+        filepath = os.path.join(args.data_dir, filename)
+        if args.dry_run:
+            print(f"   - {filename}")
+            continue
+
+        try:
+            count = migrate_file(filepath, delete=args.delete)
+            migrated += 1
+            total_messages += count
+            print(f"✅ {filename} -> {os.path.splitext(filename)[0]}.jsonl ({count} 条消息)")
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"⚠️ 转换 {filename} 失败: {e}")
+
+    if not args.dry_run:
+        print(f"\n🎉 完成: 转换 {migrated} 个文件，共 {total_messages} 条消息")
+        print("💡 请在 .env 中设置 STORAGE_FORMAT=jsonl 后重启 Bot")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
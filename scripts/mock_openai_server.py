@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+本地 OpenAI 兼容接口模拟服务器
+用于在不访问真实 API 的情况下测试和压测 AI 总结流程
+
+支持固定延迟 + 随机抖动、按 token 速率限速输出、按比例随机返回 429 / 500，
+以及 stream=true 时的 SSE 流式响应（与 OpenAI 的 chat.completion.chunk 格式一致）。
+
+用法:
+    python scripts/mock_openai_server.py [--port 8765] [--latency 0.5] [--jitter 0.2]
+                                         [--tokens-per-second 50] [--completion-tokens 300]
+                                         [--error-rate 0.05] [--error-statuses 429,500]
+
+然后设置 OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+# 模拟服务器按每 2 个字符 1 个 token 计算
+CHARS_PER_TOKEN = 2
+
+# 流式响应每个 chunk 包含的 token 数
+STREAM_TOKENS_PER_CHUNK = 4
+
+ERROR_TYPES = {
+    429: 'rate_limit_exceeded',
+    500: 'server_error',
+    503: 'service_unavailable',
+}
+
+
+class MockOpenAIServer:
+    """模拟 /v1/chat/completions 接口
+
+    每个请求返回一段固定格式的"总结"，并记录收到的提示词和并发峰值，
+    便于测试断言分块数量和并发限制。inject_error() 可以让接下来的请求返回错误（如 429）。
+
+    latency: 首个 token 之前的固定延迟（秒），jitter: 额外的 0-jitter 秒随机延迟
+    tokens_per_second: 输出速率，0 表示立即返回全部内容
+    completion_tokens: 输出内容补齐到的 token 数，0 表示只返回一行短总结
+    error_rate: 随机返回 error_statuses 中某个错误的概率（0-1）
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, tokens_per_second: float = 0.0, completion_tokens: int = 0,
+                 error_rate: float = 0.0, error_statuses: Sequence[int] = (429, 500),
+                 retry_after: Optional[float] = None, seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after = retry_after
+        self.prompts: List[str] = []
+        self.errors_returned = 0
+        self.streamed_requests = 0
+        self._pending_errors: List[Tuple[int, Dict[str, str]]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._rng = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        """OpenAI 兼容的 base_url"""
+        return f'http://{self.host}:{self.port}/v1'
+
+    @property
+    def request_count(self) -> int:
+        """已收到的请求数"""
+        return len(self.prompts)
+
+    def inject_error(self, status: int = 429, retry_after: Optional[float] = None, count: int = 1):
+        """让接下来的 count 个请求返回错误状态码"""
+        headers = {'Retry-After': str(retry_after)} if retry_after is not None else {}
+        self._pending_errors.extend([(status, headers)] * count)
+
+    def _next_error(self) -> Optional[Tuple[int, Dict[str, str]]]:
+        """注入的错误优先，其次按 error_rate 随机返回错误"""
+        if self._pending_errors:
+            return self._pending_errors.pop(0)
+        if self.error_rate and self.error_statuses and self._rng.random() < self.error_rate:
+            status = self._rng.choice(self.error_statuses)
+            headers = {}
+            if status == 429 and self.retry_after is not None:
+                headers['Retry-After'] = str(self.retry_after)
+            return status, headers
+        return None
+
+    def _first_token_delay(self) -> float:
+        """首个 token 之前的延迟"""
+        return self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def _content(self, prompt: str) -> str:
+        """生成输出内容，按 completion_tokens 补齐长度"""
+        content = f"- 模拟总结 #{len(self.prompts)}（提示词 {len(prompt)} 字符）"
+        target = self.completion_tokens * CHARS_PER_TOKEN
+        if len(content) < target:
+            filler = '\n- 讨论要点：项目进度、问题和下一步计划'
+            content += (filler * (target // len(filler) + 1))[:target - len(content)]
+        return content
+
+    async def _handle_completions(self, request: web.Request) -> web.StreamResponse:
+        """处理 chat/completions 请求"""
+        body = await request.json()
+        error = self._next_error()
+        if error:
+            status, headers = error
+            self.errors_returned += 1
+            return web.json_response(
+                {'error': {'message': 'mock error', 'type': ERROR_TYPES.get(status, 'api_error')}},
+                status=status, headers=headers
+            )
+        prompt = body['messages'][-1]['content']
+        self.prompts.append(prompt)
+        model = body.get('model', 'mock')
+        content = self._content(prompt)
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delay = self._first_token_delay()
+            if body.get('stream'):
+                if delay:
+                    await asyncio.sleep(delay)
+                return await self._stream(request, model, content)
+            if self.tokens_per_second:
+                delay += len(content) / CHARS_PER_TOKEN / self.tokens_per_second
+            if delay:
+                await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+
+        return web.json_response(self._completion(model, content, prompt))
+
+    async def _stream(self, request: web.Request, model: str, content: str) -> web.StreamResponse:
+        """以 SSE 逐块返回内容，按 tokens_per_second 控制输出速度"""
+        self.streamed_requests += 1
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+        })
+        await response.prepare(request)
+
+        completion_id = f'chatcmpl-mock-{int(time.time() * 1000)}'
+        created = int(time.time())
+
+        def event(delta: Dict, finish_reason: Optional[str] = None) -> bytes:
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }
+            return f'data: {json.dumps(chunk, ensure_ascii=False)}\n\n'.encode('utf-8')
+
+        await response.write(event({'role': 'assistant', 'content': ''}))
+        step = STREAM_TOKENS_PER_CHUNK * CHARS_PER_TOKEN
+        start = time.monotonic()
+        for offset in range(0, len(content), step):
+            if self.tokens_per_second:
+                # 按累计输出量计算应到达的时间，避免 sleep 误差累积
+                due = start + offset / CHARS_PER_TOKEN / self.tokens_per_second
+                wait = due - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            await response.write(event({'content': content[offset:offset + step]}))
+        await response.write(event({}, 'stop'))
+        await response.write(b'data: [DONE]\n\n')
+        await response.write_eof()
+        return response
+
+    @staticmethod
+    def _completion(model: str, content: str, prompt: str) -> Dict:
+        """构造与 OpenAI 格式一致的响应"""
+        return {
+            'id': f'chatcmpl-mock-{int(time.time() * 1000)}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {
+                'prompt_tokens': len(prompt) // CHARS_PER_TOKEN,
+                'completion_tokens': len(content) // CHARS_PER_TOKEN,
+                'total_tokens': (len(prompt) + len(content)) // CHARS_PER_TOKEN
+            }
+        }
+
+    async def start(self):
+        """启动服务器（port=0 时自动分配端口）"""
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post('/v1/chat/completions', self._handle_completions)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if not self.port:
+            self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """停止服务器"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def _serve(args):
+    server = MockOpenAIServer(
+        args.host, args.port, args.latency,
+        jitter=args.jitter,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        error_statuses=[int(status) for status in args.error_statuses.split(',') if status.strip()],
+        retry_after=args.retry_after
+    )
+    await server.start()
+    print(f"🤖 模拟 OpenAI 服务器已启动: {server.base_url}")
+    if server.error_rate:
+        print(f"⚠️ 随机错误: {server.error_rate:.0%} ({', '.join(map(str, server.error_statuses))})")
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 OpenAI 兼容接口模拟服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的模拟延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='额外的随机延迟上限（秒）')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help='输出速率（0 表示不限速）')
+    parser.add_argument('--completion-tokens', type=int, default=0, help='输出内容补齐到的 token 数')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='随机返回错误的概率（0-1）')
+    parser.add_argument('--error-statuses', default='429,500', help='随机错误使用的状态码（逗号分隔）')
+    parser.add_argument('--retry-after', type=float, help='429 响应的 Retry-After（秒）')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        print("\n👋 已停止")
+
+
+if __name__ == '__main__':
+    main()
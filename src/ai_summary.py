@@ -3,81 +3,300 @@ AI 总结功能模块
 支持多种 AI 服务提供商进行聊天记录的智能总结
 """
 
+import hashlib
 import json
 import os
 import sys
+import tempfile
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Any, Tuple
 import asyncio
 import aiohttp
 
 # 添加项目根目录到 Python 路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from config.config import Config
+from storage import (
+    MESSAGE_COLUMNS, MESSAGE_FILE_EXTENSIONS, TS_SCHEMA_VERSION, decode_message_row,
+    get_schema_version, iter_messages_in_range, timestamp_to_epoch
+)
+from sqlite_pool import get_connection_manager
+from segment_index import get_segment_index
+from rate_limiter import AIRateLimitError, RateLimiter
+from summary_cache import SummaryCache, make_cache_key
+from async_storage import run_blocking
+from metrics import AI_PROMPT_TOKENS, AI_REQUEST_FAILURES, AI_REQUEST_SECONDS
 
 
-class AIProvider:
-    """AI 服务提供商基类"""
-    
-    async def generate_summary(self, messages: List[Dict], chat_title: str) -> str:
-        """生成总结"""
-        raise NotImplementedError
+# 单次请求的最大输出 token 数
+MAX_COMPLETION_TOKENS = 2000
 
+SELECT_MESSAGES_IN_RANGE_SQL = f'''
+    SELECT {MESSAGE_COLUMNS} FROM messages 
+    WHERE chat_id = ? AND ts BETWEEN ? AND ?
+    ORDER BY ts ASC
+'''
 
-class OpenAIProvider(AIProvider):
-    """OpenAI API 提供商"""
+# 数据库迁移到版本 2 之前使用的查询
+LEGACY_SELECT_MESSAGES_IN_RANGE_SQL = f'''
+    SELECT {MESSAGE_COLUMNS} FROM messages 
+    WHERE chat_id = ? AND timestamp BETWEEN ? AND ?
+    ORDER BY timestamp ASC
+'''
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数
+
+    中日韩等非 ASCII 字符大约每个字符一个 token，ASCII 文本大约每 4 个字符一个 token。
+    """
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii) // 4 + 1
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数或 HTTP 日期）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - datetime.now().timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def format_message(msg: Dict) -> str:
+    """把一条消息格式化为提示词中的聊天记录行"""
+    timestamp = msg.get('timestamp', '')
+    user = f"{msg.get('first_name') or ''} {msg.get('last_name') or ''}".strip()
+    if msg.get('username'):
+        user += f" (@{msg['username']})"
+    text = msg.get('message_text') or ''
+    return f"[{timestamp}] {user}: {text}"
+
+
+def fit_line(line: str, token_budget: int) -> Tuple[str, int]:
+    """单行超出预算时按比例截断，返回 (行, token 数)"""
+    tokens = estimate_tokens(line)
+    if tokens > token_budget:
+        line = line[:max(1, len(line) * token_budget // tokens)]
+        tokens = estimate_tokens(line)
+    return line, tokens
+
+
+def chunk_lines(lines: List[str], token_budget: int) -> List[List[str]]:
+    """按 token 预算把行切分成若干块，单行超出预算时截断"""
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    for line in lines:
+        # 按比例截断超长消息，保证每块都不超过预算
+        line, tokens = fit_line(line, token_budget)
+        if current and current_tokens + tokens > token_budget:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class PromptSpool:
+    """按 token 预算分块暂存格式化后的聊天记录
+
+    逐条消费消息流，内存中只保留正在填充的分块；spill=True 时出现第二个分块后，
+    已完成的分块依次写入临时文件，map 阶段再通过 read_chunk() 逐块读回。
+    因此读取一天的消息时峰值内存约为一个分块，总结时约为 SUMMARY_MAP_CONCURRENCY 个分块，
+    与当天的消息量无关。同时记录消息数、群组标题和内容摘要（用于总结缓存的键）。
+    """
+
+    def __init__(self, token_budget: int, spill: bool = True):
+        self.token_budget = token_budget
+        self.spill = spill
+        self.count = 0
+        self.chat_title: Optional[str] = None
+        self.digest = hashlib.sha256()
+        self._current: List[str] = []
+        self._current_tokens = 0
+        # spill=False 或只有一个分块时，分块保存在内存中
+        self._chunks: List[List[str]] = []
+        self._file = None
+        # 临时文件中每个分块的 (起始偏移, 字节数)；map 阶段在多个线程中并发读取
+        self._offsets: List[Tuple[int, int]] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._offsets) if self._file else len(self._chunks)
+
+    def __enter__(self) -> 'PromptSpool':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_message(self, msg: Dict):
+        """追加一条消息"""
+        if self.chat_title is None:
+            self.chat_title = msg.get('chat_title')
+        self.count += 1
+        line = format_message(msg)
+        self.digest.update(line.encode('utf-8') + b'\n')
+        line, tokens = fit_line(line, self.token_budget)
+        if self._current and self._current_tokens + tokens > self.token_budget:
+            self._push(self._current)
+            self._current, self._current_tokens = [], 0
+        self._current.append(line)
+        self._current_tokens += tokens
+
+    def finish(self):
+        """消息流结束，保存最后一个分块"""
+        if self._current:
+            self._push(self._current)
+            self._current, self._current_tokens = [], 0
+
+    def _push(self, chunk: List[str]):
+        """保存一个已完成的分块，第二个分块出现时开始写入临时文件"""
+        if self.spill and self._file is None and self._chunks:
+            self._file = tempfile.TemporaryFile()
+            for pending in self._chunks:
+                self._write(pending)
+            self._chunks = []
+        if self._file is None:
+            self._chunks.append(chunk)
+        else:
+            self._write(chunk)
+
+    def _write(self, chunk: List[str]):
+        """把分块追加到临时文件（每行一个 JSON 字符串，消息中的换行被转义）"""
+        data = ''.join(json.dumps(line, ensure_ascii=False) + '\n' for line in chunk).encode('utf-8')
+        offset = self._file.seek(0, os.SEEK_END)
+        self._file.write(data)
+        self._offsets.append((offset, len(data)))
+
+    def read_chunk(self, index: int) -> List[str]:
+        """读取第 index 个分块（从 0 开始）"""
+        if self._file is None:
+            return self._chunks[index]
+        offset, size = self._offsets[index]
+        with self._lock:
+            self._file.seek(offset)
+            data = self._file.read(size).decode('utf-8')
+        return [json.loads(line) for line in data.split('\n') if line]
+
+    def close(self):
+        """删除临时文件"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self._chunks = []
+        self._offsets = []
+
+
+class AIProvider:
+    """AI 服务提供商基类
+
+    子类实现 _complete() 即可获得分层总结：消息总量超过 SUMMARY_CHUNK_TOKENS 时，
+    先按 token 预算分块并发总结（map），再把分块总结合并成最终总结（reduce）。
+    所有请求都经过 RPM / TPM 限流，服务端限流（AIRateLimitError）时按 Retry-After 暂停并重试。
+    """
+    
+    language_prompts = {
+        'zh': '请用中文总结',
+        'en': 'Please summarize in English',
+        'ja': '日本語で要約してください',
+    }
+    
+    length_prompts = {
+        'short': '简短总结（100-200字）',
+        'medium': '中等长度总结（200-500字）',
+        'long': '详细总结（500-1000字）'
+    }
+    
+    style_prompts = {
+        'bullet': '请使用要点列表格式',
+        'paragraph': '请使用段落格式',
+        'structured': '请使用结构化格式（包含主要话题、重要决定、行动项等）'
+    }
     
     def __init__(self):
-        self.api_key = Config.OPENAI_API_KEY
-        self.model = Config.OPENAI_MODEL
-        self.base_url = Config.OPENAI_BASE_URL
+        self.rate_limiter = RateLimiter(Config.AI_RATE_LIMIT_RPM, Config.AI_RATE_LIMIT_TPM)
+    
+    async def start(self):
+        """打开提供商持有的长期资源（如 HTTP 连接池）"""
+    
+    async def close(self):
+        """释放 start() 打开的资源"""
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取提供商运行统计"""
+        return {}
+    
+    async def _complete(self, prompt: str) -> str:
+        """发送单个提示词并返回模型输出"""
+        raise NotImplementedError
+    
+    async def _request(self, prompt: str) -> str:
+        """经过限流发送请求，服务端限流时等待后重试"""
+        prompt_tokens = estimate_tokens(prompt)
+        tokens = prompt_tokens + MAX_COMPLETION_TOKENS
+        provider = Config.AI_PROVIDER
+        for attempt in range(Config.AI_MAX_RETRIES + 1):
+            await self.rate_limiter.acquire(tokens)
+            AI_PROMPT_TOKENS.inc(prompt_tokens, provider=provider)
+            started = time.perf_counter()
+            try:
+                return await self._complete(prompt)
+            except AIRateLimitError as e:
+                AI_REQUEST_FAILURES.inc(provider=provider, reason='rate_limited')
+                if attempt >= Config.AI_MAX_RETRIES:
+                    raise
+                # 没有 Retry-After 时指数退避
+                delay = e.retry_after if e.retry_after is not None else min(60, 2 ** attempt)
+                self.rate_limiter.pause(delay)
+            except Exception:
+                AI_REQUEST_FAILURES.inc(provider=provider, reason='error')
+                raise
+            finally:
+                AI_REQUEST_SECONDS.observe(time.perf_counter() - started, provider=provider)
+    
+    def _format_messages(self, messages: List[Dict]) -> List[str]:
+        """把消息格式化为提示词中的聊天记录行"""
+        return [format_message(msg) for msg in messages]
+    
+    def _requirements(self) -> str:
+        """总结要求（语言、长度、风格）"""
+        lang_prompt = self.language_prompts.get(Config.SUMMARY_LANGUAGE, self.language_prompts['zh'])
+        length_prompt = self.length_prompts.get(Config.SUMMARY_LENGTH, self.length_prompts['medium'])
+        style_prompt = self.style_prompts.get(Config.SUMMARY_STYLE, self.style_prompts['bullet'])
+        return f"""- {lang_prompt}
+- {length_prompt}
+- {style_prompt}
+- 保持客观和准确
+- 提取最重要的信息和关键点"""
     
     def _build_prompt(self, messages: List[Dict], chat_title: str) -> str:
         """构建提示词"""
-        language_prompts = {
-            'zh': '请用中文总结',
-            'en': 'Please summarize in English',
-            'ja': '日本語で要約してください',
-        }
-        
-        length_prompts = {
-            'short': '简短总结（100-200字）',
-            'medium': '中等长度总结（200-500字）',
-            'long': '详细总结（500-1000字）'
-        }
-        
-        style_prompts = {
-            'bullet': '请使用要点列表格式',
-            'paragraph': '请使用段落格式',
-            'structured': '请使用结构化格式（包含主要话题、重要决定、行动项等）'
-        }
-        
-        lang_prompt = language_prompts.get(Config.SUMMARY_LANGUAGE, language_prompts['zh'])
-        length_prompt = length_prompts.get(Config.SUMMARY_LENGTH, length_prompts['medium'])
-        style_prompt = style_prompts.get(Config.SUMMARY_STYLE, style_prompts['bullet'])
-        
-        # 格式化消息
-        formatted_messages = []
-        for msg in messages:
-            timestamp = msg.get('timestamp', '')
-            user = f"{msg.get('first_name', '')} {msg.get('last_name', '')}".strip()
-            if msg.get('username'):
-                user += f" (@{msg['username']})"
-            text = msg.get('message_text', '')
-            
-            formatted_messages.append(f"[{timestamp}] {user}: {text}")
-        
-        messages_text = '\n'.join(formatted_messages)
+        return self._build_prompt_from_lines(self._format_messages(messages), chat_title)
+    
+    def _build_prompt_from_lines(self, lines: List[str], chat_title: str) -> str:
+        """用已格式化的聊天记录构建单次总结提示词"""
+        messages_text = '\n'.join(lines)
         
         return f"""
 你是一个专业的会议和聊天记录总结助手。请分析以下来自Telegram群组"{chat_title}"的聊天记录，并生成总结。
 
 总结要求：
-- {lang_prompt}
-- {length_prompt}
-- {style_prompt}
-- 保持客观和准确
-- 提取最重要的信息和关键点
+{self._requirements()}
 
 请按照以下格式生成总结：
 
@@ -90,13 +309,196 @@ class OpenAIProvider(AIProvider):
 请生成总结：
 """
     
+    def _build_map_prompt(self, lines: List[str], chat_title: str, part: int, total: int) -> str:
+        """构建分块总结提示词（map 阶段）"""
+        messages_text = '\n'.join(lines)
+        
+        return f"""
+你是一个专业的会议和聊天记录总结助手。以下是Telegram群组"{chat_title}"当天聊天记录的第 {part}/{total} 部分。
+请提取这一部分的主要话题、重要信息、关键决定和行动项，保留时间和发言人等关键细节，
+结果将与其他部分的总结合并，无需写开头和结尾。
+
+- {self.language_prompts.get(Config.SUMMARY_LANGUAGE, self.language_prompts['zh'])}
+- 请使用要点列表格式
+
+聊天记录：
+{messages_text}
+
+请生成这一部分的要点：
+"""
+    
+    def _build_reduce_prompt(self, partials: List[str], chat_title: str) -> str:
+        """构建合并总结提示词（reduce 阶段）"""
+        sections = '\n\n'.join(
+            f"### 第 {i}/{len(partials)} 部分\n{partial}" for i, partial in enumerate(partials, 1)
+        )
+        
+        return f"""
+你是一个专业的会议和聊天记录总结助手。以下是Telegram群组"{chat_title}"当天聊天记录按时间顺序分段总结的结果，
+请把它们合并为一份完整的总结，去除重复内容。
+
+总结要求：
+{self._requirements()}
+
+请按照以下格式生成总结：
+
+**核心内容**
+- 列出主要讨论的话题、重要信息和关键决定
+
+分段总结：
+{sections}
+
+请生成总结：
+"""
+    
+    def _check_ready(self):
+        """发送请求前检查配置（如 API Key），不可用时抛出异常"""
+    
     async def generate_summary(self, messages: List[Dict], chat_title: str) -> str:
-        """使用 OpenAI API 生成总结"""
+        """生成总结（超出 token 预算时自动分层总结）"""
+        with PromptSpool(Config.SUMMARY_CHUNK_TOKENS, spill=False) as spool:
+            for msg in messages:
+                spool.add_message(msg)
+            spool.finish()
+            return await self.summarize_spool(spool, chat_title)
+    
+    async def summarize_spool(self, spool: PromptSpool, chat_title: str) -> str:
+        """总结已分块暂存的聊天记录，多个分块时先分块总结再合并
+        
+        分块在拿到并发名额后才从暂存文件读回（在存储线程池中读取），
+        同时在内存中的分块不超过 SUMMARY_MAP_CONCURRENCY 个。
+        """
+        self._check_ready()
+        total = len(spool)
+        if total <= 1:
+            lines = spool.read_chunk(0) if total else []
+            return await self._request(self._build_prompt_from_lines(lines, chat_title))
+        
+        semaphore = asyncio.Semaphore(max(1, Config.SUMMARY_MAP_CONCURRENCY))
+        
+        async def summarize_chunk(index: int) -> str:
+            async with semaphore:
+                chunk = await run_blocking(spool.read_chunk, index)
+                return await self._request(self._build_map_prompt(chunk, chat_title, index + 1, total))
+        
+        tasks = [asyncio.ensure_future(summarize_chunk(index)) for index in range(total)]
+        try:
+            partials = await asyncio.gather(*tasks)
+        except BaseException:
+            # 某个分块失败时取消其余分块，调用方随后会关闭暂存文件
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return await self._reduce(list(partials), chat_title, semaphore)
+    
+    async def _reduce(self, partials: List[str], chat_title: str, semaphore: asyncio.Semaphore) -> str:
+        """合并分块总结，分块总结本身超出预算时逐层合并"""
+        budget = Config.SUMMARY_CHUNK_TOKENS
+        while len(partials) > 1 and sum(estimate_tokens(partial) for partial in partials) > budget:
+            # 按预算分组，每组至少两个分块总结，保证层数收敛
+            groups: List[List[str]] = []
+            current: List[str] = []
+            current_tokens = 0
+            for partial in partials:
+                tokens = estimate_tokens(partial)
+                if len(current) >= 2 and current_tokens + tokens > budget:
+                    groups.append(current)
+                    current, current_tokens = [], 0
+                current.append(partial)
+                current_tokens += tokens
+            groups.append(current)
+            
+            async def reduce_group(group: List[str]) -> str:
+                if len(group) == 1:
+                    return group[0]
+                async with semaphore:
+                    return await self._request(self._build_reduce_prompt(group, chat_title))
+            
+            partials = list(await asyncio.gather(*(reduce_group(group) for group in groups)))
+        
+        if len(partials) == 1:
+            return partials[0]
+        return await self._request(self._build_reduce_prompt(partials, chat_title))
+
+
+class OpenAIProvider(AIProvider):
+    """OpenAI API 提供商
+    
+    start() 之后所有请求共用一个带连接池的 ClientSession（keep-alive + DNS 缓存），
+    未调用 start() 的脚本仍然为每次请求创建临时会话。
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.api_key = Config.OPENAI_API_KEY
+        self.model = Config.OPENAI_MODEL
+        self.base_url = Config.OPENAI_BASE_URL
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stats = {
+            'requests': 0,
+            'connections_created': 0,
+            'connections_reused': 0,
+            'dns_cache_hits': 0,
+            'dns_cache_misses': 0,
+        }
+    
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        """统计连接创建与复用"""
+        trace_config = aiohttp.TraceConfig()
+        
+        def counter(key: str):
+            async def on_event(session, context, params):
+                self._stats[key] += 1
+            return on_event
+        
+        trace_config.on_request_start.append(counter('requests'))
+        trace_config.on_connection_create_end.append(counter('connections_created'))
+        trace_config.on_connection_reuseconn.append(counter('connections_reused'))
+        trace_config.on_dns_cache_hit.append(counter('dns_cache_hits'))
+        trace_config.on_dns_cache_miss.append(counter('dns_cache_misses'))
+        return trace_config
+    
+    def _create_session(self, shared: bool) -> aiohttp.ClientSession:
+        """创建 HTTP 会话"""
+        connector = aiohttp.TCPConnector(
+            limit=Config.AI_HTTP_POOL_SIZE,
+            limit_per_host=Config.AI_HTTP_POOL_PER_HOST,
+            ttl_dns_cache=Config.AI_HTTP_DNS_TTL,
+            keepalive_timeout=Config.AI_HTTP_KEEPALIVE if shared else None,
+            force_close=not shared
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=Config.AI_HTTP_TIMEOUT),
+            trace_configs=[self._trace_config()]
+        )
+    
+    async def start(self):
+        """打开共享的 HTTP 连接池"""
+        if self._session is None or self._session.closed:
+            self._session = self._create_session(shared=True)
+    
+    async def close(self):
+        """关闭共享的 HTTP 连接池"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取 HTTP 连接复用统计"""
+        stats = dict(self._stats)
+        stats['shared_session'] = self._session is not None and not self._session.closed
+        stats.update(self.rate_limiter.get_stats())
+        return stats
+    
+    def _check_ready(self):
+        """检查 OpenAI API Key"""
         if not self.api_key:
             raise ValueError("OpenAI API Key 未设置")
-        
-        prompt = self._build_prompt(messages, chat_title)
-        
+    
+    async def _complete(self, prompt: str) -> str:
+        """调用 Chat Completions 接口"""
         headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json',
@@ -113,37 +515,52 @@ class OpenAIProvider(AIProvider):
         # 根据模型类型添加token限制参数
         if 'gpt-5' in self.model.lower():
             # GPT-5只使用确认可用的参数
-            data['max_completion_tokens'] = 2000
+            data['max_completion_tokens'] = MAX_COMPLETION_TOKENS
         else:
             # 传统GPT模型参数
             data.update({
-                'max_tokens': 2000,
+                'max_tokens': MAX_COMPLETION_TOKENS,
                 'temperature': 0.3
             })
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f'{self.base_url}/chat/completions',
-                headers=headers,
-                json=data
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"OpenAI API 错误: {response.status} - {error_text}")
-                
-                result = await response.json()
-                return result['choices'][0]['message']['content'].strip()
+        if self._session is not None and not self._session.closed:
+            return await self._post(self._session, headers, data)
+        
+        # 未启动共享连接池时使用临时会话
+        async with self._create_session(shared=False) as session:
+            return await self._post(session, headers, data)
+    
+    async def _post(self, session: aiohttp.ClientSession, headers: Dict[str, str], data: Dict) -> str:
+        """发送请求并解析响应"""
+        async with session.post(
+            f'{self.base_url}/chat/completions',
+            headers=headers,
+            json=data
+        ) as response:
+            if response.status in (429, 503):
+                error_text = await response.text()
+                raise AIRateLimitError(
+                    f"OpenAI API 限流: {response.status} - {error_text}",
+                    parse_retry_after(response.headers.get('Retry-After'))
+                )
+            if response.status != 200:
+                error_text = await response.text()
+                raise Exception(f"OpenAI API 错误: {response.status} - {error_text}")
+            
+            result = await response.json()
+            return result['choices'][0]['message']['content'].strip()
 
 
 class ClaudeProvider(AIProvider):
     """Anthropic Claude API 提供商"""
     
     def __init__(self):
+        super().__init__()
         self.api_key = Config.ANTHROPIC_API_KEY
         self.model = Config.ANTHROPIC_MODEL
     
-    async def generate_summary(self, messages: List[Dict], chat_title: str) -> str:
-        """使用 Claude API 生成总结"""
+    def _check_ready(self):
+        """检查 Claude API 配置（API 调用尚未实现）"""
         if not self.api_key:
             raise ValueError("Anthropic API Key 未设置")
         
@@ -156,11 +573,12 @@ class LocalProvider(AIProvider):
     """本地 AI 模型提供商（如 Ollama）"""
     
     def __init__(self):
+        super().__init__()
         self.base_url = os.getenv('LOCAL_AI_URL', 'http://localhost:11434')
         self.model = os.getenv('LOCAL_AI_MODEL', 'llama2')
     
-    async def generate_summary(self, messages: List[Dict], chat_title: str) -> str:
-        """使用本地 AI 模型生成总结"""
+    def _check_ready(self):
+        """检查本地 AI 模型配置（调用尚未实现）"""
         # 这里可以实现本地 AI 调用
         # 目前作为占位符
         raise NotImplementedError("本地 AI 模型支持开发中")
@@ -173,6 +591,7 @@ class AISummarizer:
         self.config = Config()
         self.provider = self._get_provider()
         self.logger = self._setup_logger()
+        self.cache = SummaryCache() if self.config.SUMMARY_CACHE_ENABLED else None
     
     def _get_provider(self) -> AIProvider:
         """获取 AI 服务提供商"""
@@ -188,6 +607,20 @@ class AISummarizer:
         
         return provider_class()
     
+    async def start(self):
+        """打开 AI 提供商的连接池（在 bot 启动时调用）"""
+        await self.provider.start()
+    
+    async def close(self):
+        """关闭 AI 提供商的连接池（在 bot 关闭时调用）"""
+        await self.provider.close()
+        if self.cache:
+            await run_blocking(self.cache.flush)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取 AI 提供商运行统计"""
+        return self.provider.get_stats()
+    
     def _setup_logger(self):
         """设置日志"""
         import logging
@@ -196,136 +629,109 @@ class AISummarizer:
     
     def get_messages_for_date(self, chat_id: int, target_date: datetime) -> List[Dict]:
         """获取指定日期的消息"""
-        messages = []
-        
-        if self.config.STORAGE_FORMAT == 'sqlite':
-            messages = self._get_messages_from_sqlite(chat_id, target_date)
-        elif self.config.STORAGE_FORMAT == 'json':
-            messages = self._get_messages_from_json(chat_id, target_date)
-        
-        return messages
+        return list(self.iter_messages_for_date(chat_id, target_date))
     
     def get_messages_for_24h(self, chat_id: int) -> List[Dict]:
         """获取过去24小时的消息"""
-        messages = []
-        
-        if self.config.STORAGE_FORMAT == 'sqlite':
-            messages = self._get_messages_24h_from_sqlite(chat_id)
-        elif self.config.STORAGE_FORMAT == 'json':
-            messages = self._get_messages_24h_from_json(chat_id)
-        
-        return messages
+        return list(self.iter_messages_for_24h(chat_id))
     
-    def _get_messages_from_sqlite(self, chat_id: int, target_date: datetime) -> List[Dict]:
-        """从 SQLite 获取消息"""
-        import sqlite3
-        
-        db_path = os.path.join(self.config.DATA_DIR, 'messages.db')
-        if not os.path.exists(db_path):
-            return []
-        
-        start_date = target_date.strftime('%Y-%m-%d 00:00:00')
-        end_date = target_date.strftime('%Y-%m-%d 23:59:59')
-        
-        with sqlite3.connect(db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT * FROM messages 
-                WHERE chat_id = ? AND timestamp BETWEEN ? AND ?
-                ORDER BY timestamp ASC
-            ''', (chat_id, start_date, end_date))
-            
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+    def iter_messages_for_date(self, chat_id: int, target_date: datetime) -> Iterator[Dict]:
+        """按时间顺序流式读取指定日期的消息"""
+        start_ts = target_date.strftime('%Y-%m-%d 00:00:00')
+        end_ts = target_date.strftime('%Y-%m-%d 23:59:59')
+        return self._iter_messages(chat_id, start_ts, end_ts, [target_date.date()])
     
-    def _get_messages_24h_from_sqlite(self, chat_id: int) -> List[Dict]:
-        """从 SQLite 获取过去24小时的消息"""
-        import sqlite3
-        
-        db_path = os.path.join(self.config.DATA_DIR, 'messages.db')
-        if not os.path.exists(db_path):
-            return []
-        
+    def iter_messages_for_24h(self, chat_id: int) -> Iterator[Dict]:
+        """按时间顺序流式读取过去24小时的消息"""
         # 计算过去24小时的时间范围
         end_time = datetime.now()
         start_time = end_time - timedelta(hours=24)
         
-        start_date = start_time.strftime('%Y-%m-%d %H:%M:%S')
-        end_date = end_time.strftime('%Y-%m-%d %H:%M:%S')
-        
-        with sqlite3.connect(db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT * FROM messages 
-                WHERE chat_id = ? AND timestamp BETWEEN ? AND ?
-                ORDER BY timestamp ASC
-            ''', (chat_id, start_date, end_date))
-            
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
-    
-    def _get_messages_from_json(self, chat_id: int, target_date: datetime) -> List[Dict]:
-        """从 JSON 文件获取消息"""
-        messages = []
-        date_str = target_date.strftime(self.config.FILENAME_TIME_FORMAT)
-        pattern = f"chat_{abs(chat_id)}_{date_str}"
-        
-        for filename in os.listdir(self.config.DATA_DIR):
-            if filename.startswith(pattern) and filename.endswith('.json'):
-                filepath = os.path.join(self.config.DATA_DIR, filename)
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        file_messages = json.load(f)
-                        # 过滤指定日期的消息
-                        for msg in file_messages:
-                            msg_date = datetime.strptime(
-                                msg['timestamp'].split(' ')[0], 
-                                '%Y-%m-%d'
-                            ).date()
-                            if msg_date == target_date.date():
-                                messages.append(msg)
-                except (json.JSONDecodeError, FileNotFoundError, KeyError):
-                    continue
-        
-        return sorted(messages, key=lambda x: x.get('timestamp', ''))
-    
-    def _get_messages_24h_from_json(self, chat_id: int) -> List[Dict]:
-        """从 JSON 文件获取过去24小时的消息"""
-        messages = []
-        
-        # 计算过去24小时的时间范围
-        end_time = datetime.now()
-        start_time = end_time - timedelta(hours=24)
+        start_ts = start_time.strftime(self.config.TIME_FORMAT)
+        end_ts = end_time.strftime(self.config.TIME_FORMAT)
         
         # 需要检查可能涉及的日期文件（昨天和今天）
-        dates_to_check = [start_time.date(), end_time.date()]
-        
-        for check_date in set(dates_to_check):  # 去重
-            date_str = check_date.strftime(self.config.FILENAME_TIME_FORMAT)
-            pattern = f"chat_{abs(chat_id)}_{date_str}"
-            
-            for filename in os.listdir(self.config.DATA_DIR):
-                if filename.startswith(pattern) and filename.endswith('.json'):
-                    filepath = os.path.join(self.config.DATA_DIR, filename)
-                    try:
-                        with open(filepath, 'r', encoding='utf-8') as f:
-                            file_messages = json.load(f)
-                            # 过滤过去24小时的消息
-                            for msg in file_messages:
-                                try:
-                                    msg_time = datetime.strptime(msg['timestamp'], self.config.TIME_FORMAT)
-                                    if start_time <= msg_time <= end_time:
-                                        messages.append(msg)
-                                except (ValueError, KeyError):
-                                    continue
-                    except (json.JSONDecodeError, FileNotFoundError):
-                        continue
-        
-        return sorted(messages, key=lambda x: x.get('timestamp', ''))
+        dates_to_check = sorted({start_time.date(), end_time.date()})
+        return self._iter_messages(chat_id, start_ts, end_ts, dates_to_check)
+    
+    def _iter_messages(self, chat_id: int, start_ts: str, end_ts: str, dates: List) -> Iterator[Dict]:
+        """根据存储格式流式读取时间范围内的消息"""
+        if self.config.STORAGE_FORMAT == 'sqlite':
+            return self._iter_messages_from_sqlite(chat_id, start_ts, end_ts)
+        elif self.config.STORAGE_FORMAT in ('json', 'jsonl'):
+            return self._iter_messages_from_json(chat_id, start_ts, end_ts, dates)
+        return iter(())
+    
+    def _iter_messages_from_sqlite(self, chat_id: int, start_ts: str, end_ts: str) -> Iterator[Dict]:
+        """从 SQLite 分批读取消息"""
+        db_path = os.path.join(self.config.DATA_DIR, 'messages.db')
+        if not os.path.exists(db_path):
+            return
+        
+        with get_connection_manager(db_path).reader() as conn:
+            if get_schema_version(conn) >= TS_SCHEMA_VERSION:
+                cursor = conn.execute(
+                    SELECT_MESSAGES_IN_RANGE_SQL,
+                    (chat_id, timestamp_to_epoch(start_ts), timestamp_to_epoch(end_ts))
+                )
+            else:
+                cursor = conn.execute(LEGACY_SELECT_MESSAGES_IN_RANGE_SQL, (chat_id, start_ts, end_ts))
+            while True:
+                rows = cursor.fetchmany(500)
+                if not rows:
+                    break
+                for row in rows:
+                    yield decode_message_row(row)
+    
+    def _iter_messages_from_json(self, chat_id: int, start_ts: str, end_ts: str, dates: List) -> Iterator[Dict]:
+        """从 JSON / JSONL 分段文件流式读取消息
+
+        生成器在第一次迭代时才加载分段索引，由 run_blocking 在存储线程池中消费，
+        首次加载或扫描索引不会阻塞事件循环。
+        """
+        index = get_segment_index(self.config.DATA_DIR)
+        filepaths = [
+            filepath
+            for date in dates
+            for filepath in index.get_segment_paths(
+                chat_id, date.strftime(self.config.FILENAME_TIME_FORMAT), MESSAGE_FILE_EXTENSIONS
+            )
+        ]
+        yield from iter_messages_in_range(filepaths, start_ts, end_ts)
+    
+    def _spool_messages(self, messages: Iterable[Dict]) -> PromptSpool:
+        """消费消息流，格式化后按 token 预算分块暂存（在存储线程池中执行）
+
+        消息流只读取一遍，读完即释放文件句柄或 SQLite 连接，不会在 AI 请求期间占用；
+        整天的消息不会同时留在内存中，见 PromptSpool。
+        """
+        spool = PromptSpool(self.config.SUMMARY_CHUNK_TOKENS)
+        try:
+            for msg in messages:
+                spool.add_message(msg)
+            spool.finish()
+        except BaseException:
+            spool.close()
+            raise
+        return spool
+    
+    async def _summarize(self, chat_id: int, spool: PromptSpool, chat_title: str) -> Optional[str]:
+        """生成总结，消息内容和生成参数都没有变化时复用缓存"""
+        if not self.cache:
+            return await self.provider.summarize_spool(spool, chat_title)
+        
+        key = make_cache_key(
+            chat_id, spool.digest.hexdigest(),
+            title=chat_title,
+            provider=self.config.AI_PROVIDER,
+            model=getattr(self.provider, 'model', ''),
+            language=self.config.SUMMARY_LANGUAGE,
+            length=self.config.SUMMARY_LENGTH,
+            style=self.config.SUMMARY_STYLE
+        )
+        return await self.cache.get_or_compute(
+            key, lambda: self.provider.summarize_spool(spool, chat_title)
+        )
     
     async def generate_daily_summary(self, chat_id: int, date: Optional[datetime] = None) -> Optional[str]:
         """生成每日总结"""
@@ -336,31 +742,30 @@ class AISummarizer:
         if date is None:
             date = datetime.now() - timedelta(days=1)  # 默认总结昨天
         
-        # 获取消息
-        messages = self.get_messages_for_date(chat_id, date)
-        
-        self.logger.info(f"获取到消息数量: {len(messages)}, 需要: {self.config.MIN_MESSAGES_FOR_SUMMARY}, 日期: {date.strftime('%Y-%m-%d')}")
-        
-        if len(messages) < self.config.MIN_MESSAGES_FOR_SUMMARY:
-            self.logger.info(f"消息数量不足 ({len(messages)} < {self.config.MIN_MESSAGES_FOR_SUMMARY})，跳过总结")
-            return None
-        
-        # 获取群组标题
-        chat_title = messages[0].get('chat_title', f'Chat {abs(chat_id)}') if messages else f'Chat {abs(chat_id)}'
-        
-        try:
-            # 生成总结
-            summary = await self.provider.generate_summary(messages, chat_title)
+        # 流式读取消息并分块暂存（在存储线程池中读取，不阻塞事件循环）
+        with await run_blocking(self._spool_messages, self.iter_messages_for_date(chat_id, date)) as spool:
+            self.logger.info(f"获取到消息数量: {spool.count}, 需要: {self.config.MIN_MESSAGES_FOR_SUMMARY}, 日期: {date.strftime('%Y-%m-%d')}")
             
-            # 保存总结
-            self._save_summary(chat_id, date, summary, len(messages))
+            if spool.count < self.config.MIN_MESSAGES_FOR_SUMMARY:
+                self.logger.info(f"消息数量不足 ({spool.count} < {self.config.MIN_MESSAGES_FOR_SUMMARY})，跳过总结")
+                return None
             
-            self.logger.info(f"成功生成总结: {chat_title} - {date.strftime('%Y-%m-%d')}")
-            return summary
-        
-        except Exception as e:
-            self.logger.error(f"生成总结失败: {e}")
-            return None
+            # 获取群组标题
+            chat_title = spool.chat_title or f'Chat {abs(chat_id)}'
+            
+            try:
+                # 生成总结
+                summary = await self._summarize(chat_id, spool, chat_title)
+                
+                # 保存总结
+                await run_blocking(self._save_summary, chat_id, date, summary, spool.count)
+                
+                self.logger.info(f"成功生成总结: {chat_title} - {date.strftime('%Y-%m-%d')}")
+                return summary
+            
+            except Exception as e:
+                self.logger.error(f"生成总结失败: {e}")
+                return None
     
     async def generate_today_summary(self, chat_id: int) -> Optional[str]:
         """生成今日总结（过去24小时的消息，保存为今天的文件）"""
@@ -370,39 +775,39 @@ class AISummarizer:
         
         # 获取过去24小时的消息
         self.logger.info(f"开始获取过去24小时的消息 - 群组: {chat_id}")
-        messages = self.get_messages_for_24h(chat_id)
-        self.logger.info(f"获取到过去24小时消息数量: {len(messages)}")
-        
-        if len(messages) < self.config.MIN_MESSAGES_FOR_SUMMARY:
-            self.logger.info(f"消息数量不足 ({len(messages)} < {self.config.MIN_MESSAGES_FOR_SUMMARY})，跳过总结")
-            return None
-        
-        # 获取群组标题
-        chat_title = messages[0].get('chat_title', f'Chat {abs(chat_id)}') if messages else f'Chat {abs(chat_id)}'
-        self.logger.info(f"群组标题: {chat_title}, 消息数: {len(messages)}")
-        
-        try:
-            # 生成总结
-            self.logger.info(f"开始调用AI生成总结...")
-            summary = await self.provider.generate_summary(messages, chat_title)
-            self.logger.info(f"AI返回结果: {'成功' if summary else '失败(None)'}, 长度: {len(summary) if summary else 0}")
+        with await run_blocking(self._spool_messages, self.iter_messages_for_24h(chat_id)) as spool:
+            self.logger.info(f"获取到过去24小时消息数量: {spool.count}")
             
-            if not summary:
-                self.logger.warning("AI返回了空总结")
+            if spool.count < self.config.MIN_MESSAGES_FOR_SUMMARY:
+                self.logger.info(f"消息数量不足 ({spool.count} < {self.config.MIN_MESSAGES_FOR_SUMMARY})，跳过总结")
                 return None
             
-            # 保存总结（使用今天的日期作为文件名）
-            today = datetime.now()
-            self._save_summary(chat_id, today, summary, len(messages))
+            # 获取群组标题
+            chat_title = spool.chat_title or f'Chat {abs(chat_id)}'
+            self.logger.info(f"群组标题: {chat_title}, 消息数: {spool.count}")
             
-            self.logger.info(f"成功生成今日总结: {chat_title} - {today.strftime('%Y-%m-%d')}")
-            return summary
-        
-        except Exception as e:
-            self.logger.error(f"生成今日总结失败: {e}")
-            import traceback
-            self.logger.error(f"错误堆栈: {traceback.format_exc()}")
-            return None
+            try:
+                # 生成总结
+                self.logger.info(f"开始调用AI生成总结...")
+                summary = await self._summarize(chat_id, spool, chat_title)
+                self.logger.info(f"AI返回结果: {'成功' if summary else '失败(None)'}, 长度: {len(summary) if summary else 0}")
+                
+                if not summary:
+                    self.logger.warning("AI返回了空总结")
+                    return None
+                
+                # 保存总结（使用今天的日期作为文件名）
+                today = datetime.now()
+                await run_blocking(self._save_summary, chat_id, today, summary, spool.count)
+                
+                self.logger.info(f"成功生成今日总结: {chat_title} - {today.strftime('%Y-%m-%d')}")
+                return summary
+            
+            except Exception as e:
+                self.logger.error(f"生成今日总结失败: {e}")
+                import traceback
+                self.logger.error(f"错误堆栈: {traceback.format_exc()}")
+                return None
     
     def _save_summary(self, chat_id: int, date: datetime, summary: str, message_count: int):
         """保存总结"""
@@ -0,0 +1,204 @@
+"""
+冷归档模块
+把超过 ARCHIVE_AFTER_DAYS 天的 JSON / JSONL 日文件压缩进按 群组+月份 划分的 gzip 归档。
+每天是归档中一个独立的 gzip 成员，归档旁的索引记录 日期 -> (偏移, 长度)，
+读取某一天时只需 seek 并解压这一段；整个归档仍是合法的 gzip 文件，可直接用 zcat 查看。
+"""
+import gzip
+import json
+import logging
+import os
+import re
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import Config
+
+ARCHIVE_DIRNAME = 'archive'
+ARCHIVE_INDEX_SUFFIX = '.idx.json'
+
+# 归档文件名: archive/chat_<abs_chat_id>_<YYYYMM>.jsonl.gz
+ARCHIVE_FILENAME_RE = re.compile(r'^chat_(\d+)_(\d{6})\.jsonl\.gz$')
+
+# 归档成员路径: <归档文件>#<偏移>:<长度>，可以像普通分段文件路径一样传给读取函数
+MEMBER_PATH_RE = re.compile(r'^(.*\.jsonl\.gz)#(\d+):(\d+)$')
+
+
+def archive_filename(chat_id: int, date_str: str) -> str:
+    """群组某天所属的归档文件（相对 DATA_DIR 的路径）"""
+    return f"{ARCHIVE_DIRNAME}/chat_{abs(chat_id)}_{date_str[:6]}.jsonl.gz"
+
+
+def member_path(archive_path: str, offset: int, length: int) -> str:
+    """构造归档成员路径"""
+    return f"{archive_path}#{offset}:{length}"
+
+
+def is_archive_member(path: str) -> bool:
+    """是否为归档成员路径"""
+    return MEMBER_PATH_RE.match(path) is not None
+
+
+def read_archive_member(path: str) -> bytes:
+    """读取并解压一个归档成员"""
+    match = MEMBER_PATH_RE.match(path)
+    if not match:
+        raise ValueError(f"不是归档成员路径: {path}")
+    archive_path, offset, length = match.group(1), int(match.group(2)), int(match.group(3))
+    with open(archive_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(length)
+    if len(data) != length:
+        raise IOError(f"归档成员不完整: {path}")
+    return gzip.decompress(data)
+
+
+def iter_archive_member(path: str) -> Iterator[Dict[str, Any]]:
+    """逐条读取归档成员中的消息"""
+    for line in read_archive_member(path).decode('utf-8').splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+
+def load_archive_index(archive_path: str) -> Dict[str, Dict[str, Any]]:
+    """读取归档索引: 日期 -> {offset, length, count, min_ts, max_ts, chat_id, title, raw_bytes}"""
+    index_path = archive_path + ARCHIVE_INDEX_SUFFIX
+    if not os.path.exists(index_path):
+        return {}
+    with open(index_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_archive_indexes(data_dir: str) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """遍历所有归档索引，产出 (归档相对路径, 日期, 索引条目)"""
+    archive_dir = os.path.join(data_dir, ARCHIVE_DIRNAME)
+    if not os.path.isdir(archive_dir):
+        return
+    for filename in sorted(os.listdir(archive_dir)):
+        if not ARCHIVE_FILENAME_RE.match(filename):
+            continue
+        rel_path = f"{ARCHIVE_DIRNAME}/{filename}"
+        try:
+            entries = load_archive_index(os.path.join(data_dir, rel_path))
+        except (json.JSONDecodeError, OSError):
+            continue
+        for date_str, entry in entries.items():
+            yield rel_path, date_str, entry
+
+
+class Archiver:
+    """把旧的日文件压缩进归档，并更新分段索引
+
+    分段索引中归档日的条目带有 archive / offset / length 字段，
+    SegmentIndex.get_segment_paths() 返回成员路径，读取方无需区分归档与否。
+    顺序保证崩溃安全：先追加归档并写入归档索引，再更新分段索引，最后删除原文件；
+    中途退出时原文件保留，下次运行时按归档索引清理。
+    """
+
+    def __init__(self, data_dir: Optional[str] = None, compression_level: Optional[int] = None):
+        self.data_dir = data_dir or Config.DATA_DIR
+        self.compression_level = compression_level or Config.ARCHIVE_COMPRESSION_LEVEL
+        self.logger = logging.getLogger('telegram_notetaker.archive')
+
+    def archive_before(self, cutoff_date_str: str) -> Dict[str, int]:
+        """归档日期早于 cutoff_date_str（YYYYMMDD）的所有日文件，返回统计"""
+        from segment_index import get_segment_index
+        from storage import MESSAGE_FILE_EXTENSIONS
+
+        index = get_segment_index(self.data_dir)
+        stats = {'days': 0, 'files': 0, 'bytes_before': 0, 'bytes_after': 0}
+        stats['files'] += self._remove_leftovers(index)
+
+        for chat_id in list(index.get_chats()):
+            # 同一个月的多天一起写入，归档索引和分段索引每个月只保存一次
+            months: Dict[str, List[Tuple[str, List[Dict[str, Any]]]]] = {}
+            for date_str in index.get_chat_dates(chat_id):
+                if date_str >= cutoff_date_str or index.is_archived(chat_id, date_str):
+                    continue
+                segments = [
+                    seg for seg in index.get_segments(chat_id, date_str)
+                    if seg['file'].endswith(MESSAGE_FILE_EXTENSIONS)
+                ]
+                if segments:
+                    months.setdefault(date_str[:6], []).append((date_str, segments))
+
+            for days in months.values():
+                month_stats = self._archive_month(index, chat_id, days)
+                for key, value in month_stats.items():
+                    stats[key] += value
+
+        if stats['days']:
+            self.logger.info(
+                f"已归档 {stats['days']} 天 / {stats['files']} 个文件，"
+                f"{stats['bytes_before'] / 1024 / 1024:.1f} MB -> {stats['bytes_after'] / 1024 / 1024:.1f} MB"
+            )
+        return stats
+
+    def _archive_month(self, index, chat_id: int, days: List[Tuple[str, List[Dict[str, Any]]]]) -> Dict[str, int]:
+        """把同一个群组同一个月的若干天追加到归档"""
+        from storage import iter_messages_file
+
+        rel_path = archive_filename(chat_id, days[0][0])
+        archive_path = os.path.join(self.data_dir, rel_path)
+        os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+        archive_index = load_archive_index(archive_path)
+
+        stats = {'days': 0, 'files': 0, 'bytes_before': 0, 'bytes_after': 0}
+        source_files = []
+        with open(archive_path, 'ab') as f:
+            f.seek(0, os.SEEK_END)
+            for date_str, segments in days:
+                paths = [os.path.join(self.data_dir, seg['file']) for seg in segments]
+                messages = [msg for path in paths for msg in iter_messages_file(path)]
+                payload = ''.join(
+                    json.dumps(msg, ensure_ascii=False, separators=(',', ':')) + '\n' for msg in messages
+                ).encode('utf-8')
+                member = gzip.compress(payload, compresslevel=self.compression_level)
+
+                offset = f.tell()
+                f.write(member)
+                timestamps = [msg['timestamp'] for msg in messages if msg.get('timestamp')]
+                archive_index[date_str] = {
+                    'offset': offset,
+                    'length': len(member),
+                    'count': len(messages),
+                    'min_ts': min(timestamps) if timestamps else None,
+                    'max_ts': max(timestamps) if timestamps else None,
+                    'chat_id': chat_id,
+                    'title': messages[-1].get('chat_title') if messages else None,
+                    'raw_bytes': len(payload)
+                }
+                source_files.extend(paths)
+                stats['days'] += 1
+                stats['bytes_before'] += sum(os.path.getsize(path) for path in paths)
+                stats['bytes_after'] += len(member)
+            f.flush()
+            os.fsync(f.fileno())
+
+        tmp_path = archive_path + ARCHIVE_INDEX_SUFFIX + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(archive_index, f, ensure_ascii=False)
+        os.replace(tmp_path, archive_path + ARCHIVE_INDEX_SUFFIX)
+
+        for date_str, _ in days:
+            index.mark_archived(chat_id, date_str, rel_path, archive_index[date_str])
+        index.save()
+
+        for path in source_files:
+            os.remove(path)
+        stats['files'] = len(source_files)
+        return stats
+
+    def _remove_leftovers(self, index) -> int:
+        """删除上次中断时已归档但未删除的原文件"""
+        from segment_index import SEGMENT_FILENAME_RE
+
+        removed = 0
+        for filename in os.listdir(self.data_dir):
+            match = SEGMENT_FILENAME_RE.match(filename)
+            if match and match.group(3) != 'txt' and index.is_archived(-int(match.group(1)), match.group(2)):
+                os.remove(os.path.join(self.data_dir, filename))
+                removed += 1
+        return removed
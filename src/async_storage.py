@@ -0,0 +1,117 @@
+"""
+异步存储门面模块
+异步处理器中的阻塞读写（统计、搜索、按日期读取消息、读取历史总结等）统一交给
+专用线程池执行，并为每次调用设置超时，避免读文件时整个机器人停止响应。
+
+线程池大小由 STORAGE_EXECUTOR_WORKERS 决定，与默认线程池分开，
+归档这类长时间任务不会占满它；超时只是不再等待结果，线程中的操作仍会执行完。
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import Config
+
+logger = logging.getLogger('telegram_notetaker.async_storage')
+
+
+class StorageTimeoutError(TimeoutError):
+    """存储操作超过超时时间仍未完成"""
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_stats = {'calls': 0, 'timeouts': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+
+
+def get_storage_executor() -> ThreadPoolExecutor:
+    """获取（必要时创建）存储专用线程池"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, Config.STORAGE_EXECUTOR_WORKERS),
+                thread_name_prefix='storage'
+            )
+        return _executor
+
+
+def shutdown_storage_executor(wait: bool = True):
+    """关闭存储线程池（下次调用时重新创建）"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor:
+        executor.shutdown(wait=wait)
+
+
+def _timed(func: Callable, args: tuple, kwargs: dict) -> Any:
+    """在线程中执行并记录耗时"""
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        _stats['total_seconds'] += elapsed
+        _stats['max_seconds'] = max(_stats['max_seconds'], elapsed)
+
+
+async def run_blocking(func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """在存储线程池中执行阻塞函数，超时抛出 StorageTimeoutError
+
+    timeout 为 None 时使用 STORAGE_CALL_TIMEOUT，0 表示不限制
+    """
+    if timeout is None:
+        timeout = Config.STORAGE_CALL_TIMEOUT
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(get_storage_executor(), _timed, func, args, kwargs)
+    _stats['calls'] += 1
+    try:
+        return await asyncio.wait_for(future, timeout or None)
+    except asyncio.TimeoutError:
+        _stats['timeouts'] += 1
+        name = getattr(func, '__qualname__', repr(func))
+        logger.error(f"存储操作 {name} 超过 {timeout} 秒未完成")
+        raise StorageTimeoutError(f"存储操作超过 {timeout} 秒未完成，请稍后重试") from None
+    except Exception:
+        _stats['errors'] += 1
+        raise
+
+
+def get_executor_stats() -> Dict[str, Any]:
+    """获取线程池调用统计"""
+    calls = _stats['calls']
+    return {
+        'calls': calls,
+        'timeouts': _stats['timeouts'],
+        'errors': _stats['errors'],
+        'avg_ms': round(_stats['total_seconds'] / calls * 1000, 1) if calls else 0.0,
+        'max_ms': round(_stats['max_seconds'] * 1000, 1),
+    }
+
+
+class AsyncStorage:
+    """MessageStorage 的异步门面，方法与 MessageStorage 同名，在存储线程池中执行"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    async def save_message(self, message_data: Dict[str, Any]):
+        """保存一条消息（未启用写入队列时使用）"""
+        await run_blocking(self.storage.save_message, message_data)
+
+    async def get_chat_stats(self, chat_id: int) -> Dict[str, Any]:
+        """获取群组统计信息"""
+        return await run_blocking(self.storage.get_chat_stats, chat_id)
+
+    async def search_messages(self, query: str, chat_id: Optional[int] = None,
+                              limit: int = 10, offset: int = 0):
+        """全文搜索消息"""
+        return await run_blocking(self.storage.search_messages, query, chat_id, limit, offset)
@@ -1,23 +1,75 @@
 """
 Telegram Note Taker Bot 主程序
 """
-import logging
+import asyncio
+import json
 import os
+import secrets
+import signal
 import sys
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 
 from telegram import Update, Message, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand
-from telegram.ext import Application, MessageHandler, CommandHandler, ContextTypes, filters, CallbackQueryHandler
+from telegram.ext import (
+    Application, BaseUpdateProcessor, MessageHandler, CommandHandler, ContextTypes, filters, CallbackQueryHandler
+)
 from telegram.error import TelegramError
 
 # 添加项目根目录到 Python 路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.config import Config
-from storage import MessageStorage
+from storage import MessageStorage, MESSAGE_FILE_EXTENSIONS, load_messages_file
 from scheduler import TaskScheduler
+from write_queue import MessageWriteQueue
+from segment_index import get_segment_index
+from group_registry import GroupRegistry
 from ai_summary import create_ai_summarizer
+from webhook_server import WebhookServer
+from update_processor import MAX_PENDING_UPDATES, ChatOrderedDispatcher
+from async_storage import (
+    AsyncStorage, StorageTimeoutError, get_executor_stats, run_blocking, shutdown_storage_executor
+)
+from loop_monitor import LoopLagMonitor
+from log_pipeline import EventLog, get_dropped_count, setup_logging, stop_logging
+from profiler import SamplingProfiler
+from metrics import (
+    HANDLER_SECONDS, MESSAGES_SAVED, UPDATE_ERRORS, UPDATES_FILTERED, UPDATES_RECEIVED,
+    REGISTRY, MetricsServer
+)
+
+# /search 每页显示的结果数
+SEARCH_PAGE_SIZE = 5
+
+# 会调用 AI 生成总结的按钮回调，走单独的重任务通道
+HEAVY_CALLBACK_PREFIXES = ('group_', 'sum_')
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Application 的更新处理器：不同群组并发处理，同一群组按顺序处理，生成总结的回调单独限流"""
+    
+    def __init__(self, dispatcher: ChatOrderedDispatcher):
+        # 基类的信号量只限制等待调度的数量，真正的并发上限由 dispatcher 控制
+        super().__init__(MAX_PENDING_UPDATES)
+        self.dispatcher = dispatcher
+    
+    async def do_process_update(self, update, coroutine):
+        key = None
+        heavy = False
+        if isinstance(update, Update):
+            if update.callback_query and (update.callback_query.data or '').startswith(HEAVY_CALLBACK_PREFIXES):
+                heavy = True
+            elif update.effective_chat:
+                key = update.effective_chat.id
+        await self.dispatcher.run(key, coroutine, heavy=heavy)
+    
+    async def initialize(self):
+        pass
+    
+    async def shutdown(self):
+        pass
 
 class TelegramNoteTaker:
     """Telegram 笔记记录器主类"""
@@ -25,9 +77,24 @@ class TelegramNoteTaker:
     def __init__(self):
         self.config = Config()
         self.storage = MessageStorage()
-        self.logger = self._setup_logging()
+        self.async_storage = AsyncStorage(self.storage)
+        self.logger = setup_logging()
+        self.events = EventLog.from_config(self.logger)
+        self.write_queue = MessageWriteQueue(self.storage) if self.config.WRITE_QUEUE_ENABLED else None
+        self.group_registry = GroupRegistry()
         self.scheduler = None
         self.ai_summarizer = None
+        self.dispatcher = ChatOrderedDispatcher(
+            self.config.MAX_CONCURRENT_UPDATES, self.config.HEAVY_UPDATE_CONCURRENCY
+        )
+        self.loop_monitor = None
+        self._config_watch_task = None
+        self._registry_flush_task: Optional[asyncio.Task] = None
+        if self.config.LOOP_LAG_THRESHOLD > 0:
+            self.loop_monitor = LoopLagMonitor(self.config.LOOP_LAG_THRESHOLD, self.config.LOOP_MONITOR_INTERVAL)
+        self.metrics_server = None
+        self._profile_task: Optional[asyncio.Task] = None
+        self._register_metrics()
         
         # 验证配置
         if not self.config.validate():
@@ -41,48 +108,13 @@ class TelegramNoteTaker:
             else:
                 self.logger.warning("AI 总结功能启用失败")
     
-    def _setup_logging(self) -> logging.Logger:
-        """设置日志"""
-        logger = logging.getLogger('telegram_notetaker')
-        logger.setLevel(getattr(logging, self.config.LOG_LEVEL))
-        
-        # 创建文件处理器
-        log_file = os.path.join(self.config.LOG_DIR, 'telegram_notetaker.log')
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
-        file_handler.setLevel(logging.INFO)
-        
-        # 创建控制台处理器
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        
-        # 设置格式
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-        file_handler.setFormatter(formatter)
-        console_handler.setFormatter(formatter)
-        
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
-        
-        return logger
-    
     def _is_allowed_chat(self, chat_id: int) -> bool:
-        """检查是否允许记录此群组"""
-        allowed_groups = self.config.get_allowed_groups()
-        # 默认允许所有群组，只有明确配置了限制才检查
-        if not allowed_groups:
-            print(f"✅ 允许所有群组，当前群组 ID: {chat_id}", flush=True)
-            return True
-        
-        # 如果配置了限制，则检查
-        is_allowed = chat_id in allowed_groups
-        print(f"🔍 群组权限检查: {chat_id} - {'允许' if is_allowed else '拒绝'}", flush=True)
-        return is_allowed
+        """检查是否允许记录此群组（默认允许所有群组，只有明确配置了限制才检查）"""
+        return self.config.snapshot().is_allowed_chat(chat_id)
     
     def _is_admin(self, user_id: int) -> bool:
         """检查是否为管理员"""
-        return user_id in self.config.get_admin_ids()
+        return self.config.snapshot().is_admin(user_id)
     
     def _extract_message_data(self, message: Message) -> Optional[Dict[str, Any]]:
         """提取消息数据"""
@@ -174,58 +206,88 @@ class TelegramNoteTaker:
             'media_info': media_info
         }
     
+    def _register_metrics(self):
+        """注册抓取 /metrics 时才取值的运行状态指标"""
+        REGISTRY.gauge('notetaker_dispatch_in_flight', '正在处理的 Update 数').set_function(
+            lambda: self.dispatcher.in_flight
+        )
+        REGISTRY.gauge('notetaker_log_dropped', '日志队列满时丢弃的日志条数').set_function(get_dropped_count)
+        if self.write_queue:
+            REGISTRY.gauge('notetaker_write_queue_pending', '写入队列中等待落盘的消息数').set_function(
+                lambda: self.write_queue.get_stats()['pending']
+            )
+        if self.loop_monitor:
+            REGISTRY.gauge('notetaker_loop_lag_max_seconds', '事件循环最大阻塞时间（秒）').set_function(
+                lambda: self.loop_monitor.max_lag
+            )
+    
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """处理接收到的消息"""
         message = update.message
         if not message:
             return
         
-        # 打印收到的消息基本信息
-        chat_info = f"群组: {message.chat.title}" if message.chat.title else f"Chat ID: {message.chat.id}"
-        user_info = f"{message.from_user.first_name}"
-        if message.from_user.username:
-            user_info += f" (@{message.from_user.username})"
-        
-        print(f"📨 收到消息 - {chat_info} | {user_info}", flush=True)
-        if message.text:
-            print(f"💬 内容: {message.text}", flush=True)
-        else:
-            print(f"🎵 消息类型: {self._get_message_type_description(message)}", flush=True)
-        print("-" * 50, flush=True)
-        
-        # 同时记录到日志
-        self.logger.info(f"收到消息 - {chat_info} | {user_info} | 类型: {message.chat.type}")
+        started = time.perf_counter()
+        UPDATES_RECEIVED.inc()
+        try:
+            await self._handle_message(message)
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started)
+    
+    async def _handle_message(self, message: Message):
+        """记录一条消息（handle_message 的主体）"""
+        # 每条消息都会经过这里，日志按事件级别和采样率输出，未启用时不构造内容
+        if self.events.enabled('message_received'):
+            self.events.log(
+                'message_received',
+                chat_id=message.chat.id,
+                user_id=message.from_user.id if message.from_user else None,
+                type=self._get_message_type_description(message),
+                chat_type=message.chat.type
+            )
         
-        # 如果是私聊消息，显示但不记录
+        # 私聊消息不记录
         if message.chat.type not in ['group', 'supergroup']:
-            print(f"💭 私聊消息（不记录到文件）", flush=True)
-            # 对于调试，我们仍然继续处理，但不保存
-            print(f"🔍 调试：这是一条私聊消息", flush=True)
+            self.events.log('message_private', chat_id=message.chat.id)
+            UPDATES_FILTERED.inc(reason='private')
             return
         
         # 检查是否允许记录此群组
         if not self._is_allowed_chat(message.chat.id):
-            print(f"🚫 群组不在允许列表中: {message.chat.id}", flush=True)
+            self.events.log('chat_denied', chat_id=message.chat.id)
+            UPDATES_FILTERED.inc(reason='denied')
             return
         
         try:
             # 提取消息数据
             message_data = self._extract_message_data(message)
             if message_data:
-                # 保存消息
-                self.storage.save_message(message_data)
-                
-                print(f"✅ 消息已保存: {message_data['chat_title']} - {message_data['first_name']}", flush=True)
-                
-                self.logger.info(
-                    f"记录消息: {message_data['chat_title']} - "
-                    f"{message_data['first_name']}: {message_data['message_text'][:50]}"
+                # 保存消息（启用写入队列时只入队，由后台线程批量落盘）
+                if self.write_queue:
+                    if not await self.write_queue.put(message_data):
+                        self.events.log(
+                            'message_dropped',
+                            chat_id=message_data['chat_id'],
+                            message_id=message_data['message_id']
+                        )
+                        UPDATES_FILTERED.inc(reason='dropped')
+                        return
+                else:
+                    await self.async_storage.save_message(message_data)
+                self.group_registry.record(message_data)
+                MESSAGES_SAVED.inc(type=message_data['message_type'])
+                self.events.log(
+                    'message_saved',
+                    chat_id=message_data['chat_id'],
+                    message_id=message_data['message_id'],
+                    type=message_data['message_type']
                 )
             else:
-                print(f"⚠️ 消息被过滤，未保存", flush=True)
+                self.events.log('message_filtered', chat_id=message.chat.id, message_id=message.message_id)
+                UPDATES_FILTERED.inc(reason='empty')
         
         except Exception as e:
-            print(f"❌ 处理消息时发生错误: {e}", flush=True)
+            UPDATE_ERRORS.inc()
             self.logger.error(f"处理消息时发生错误: {e}")
     
     def _get_message_type_description(self, message: Message) -> str:
@@ -276,6 +338,9 @@ class TelegramNoteTaker:
             keyboard = [
                 [
                     InlineKeyboardButton("� 生成今日总结", callback_data="generate_today")
+                ],
+                [
+                    InlineKeyboardButton("🔍 搜索消息", callback_data="search_help")
                 ]
                 # 其他功能按钮保留在代码中，以后可以启用
                 # [
@@ -343,6 +408,8 @@ AI总结功能未启用。请检查配置文件。
 🔹 **管理员专用**
 /stats - 查看当前群组的统计信息
 /status - 查看机器人运行状态
+/profile 秒数 - 采样分析性能热点（默认 10 秒）
+/search 关键词 - 搜索聊天记录（在群组中使用时只搜索当前群组）
 
 **🔒 隐私说明**
 • 只记录配置的群组消息
@@ -412,30 +479,46 @@ AI总结功能未启用。请检查配置文件。
             return
         
         try:
-            stats = self.storage.get_chat_stats(message.chat.id)
-            
-            if self.config.STORAGE_FORMAT == 'sqlite':
-                stats_text = f"""
+            stats = await self.async_storage.get_chat_stats(message.chat.id)
+            if 'total_messages' not in stats:
+                # TXT 格式没有统计汇总，只展示记录文件
+                await message.reply_text(f"""
+📊 群组统计信息
+
+📁 记录文件数: {stats['total_files']}
+📄 文件列表: {', '.join(stats['files'][:5])}
+""")
+                return
+            stats_text = f"""
 📊 群组统计信息
 
 💬 总消息数: {stats['total_messages']}
 📅 记录时间范围: {stats['date_range'][0] or '无'} ~ {stats['date_range'][1] or '无'}
-
-👥 最活跃用户 (Top 5):
+🗓 有消息的天数: {stats['active_days']}
 """
-                for i, (username, first_name, count) in enumerate(stats['top_users'][:5], 1):
-                    user_display = first_name
-                    if username:
-                        user_display += f" (@{username})"
-                    stats_text += f"{i}. {user_display}: {count} 条消息\n"
+            if 'total_files' in stats:
+                stats_text += f"📁 记录文件数: {stats['total_files']}\n"
             
-            else:
-                stats_text = f"""
-📊 群组统计信息
-
-📁 记录文件数: {stats['total_files']}
-📄 文件列表: {', '.join(stats['files'][:5])}
-"""
+            if stats['daily']:
+                stats_text += "\n📈 最近每日消息数:\n"
+                for day, count in stats['daily']:
+                    stats_text += f"{day}: {count} 条\n"
+            
+            if stats['total_messages']:
+                peak_hours = sorted(range(24), key=lambda hour: stats['hourly'][hour], reverse=True)[:3]
+                stats_text += "\n⏰ 最活跃时段: " + ', '.join(
+                    f"{hour:02d}:00 ({stats['hourly'][hour]} 条)" for hour in peak_hours if stats['hourly'][hour]
+                ) + "\n"
+                stats_text += "🗂 消息类型: " + ', '.join(
+                    f"{message_type} {count}" for message_type, count in stats['message_types']
+                ) + "\n"
+            
+            stats_text += "\n👥 最活跃用户 (Top 5):\n"
+            for i, (username, first_name, count) in enumerate(stats['top_users'][:5], 1):
+                user_display = first_name or '未知用户'
+                if username:
+                    user_display += f" (@{username})"
+                stats_text += f"{i}. {user_display}: {count} 条消息\n"
             
             await message.reply_text(stats_text)
         
@@ -460,6 +543,7 @@ AI总结功能未启用。请检查配置文件。
 ✅ 运行正常
 📊 存储格式: {self.config.STORAGE_FORMAT}
 📁 数据目录: {self.config.DATA_DIR}
+📡 接收方式: {self.config.BOT_MODE}
 🎵 记录媒体: {'是' if self.config.LOG_MEDIA else '否'}
 💾 下载媒体: {'是' if self.config.DOWNLOAD_MEDIA else '否'}
 
@@ -478,8 +562,167 @@ AI总结功能未启用。请检查配置文件。
             status_text += f"- 自动总结时间: {summary_stats['auto_summary_time']}\n"
             status_text += f"- 已生成总结数: {summary_stats['total_summaries']}\n"
         
+        if self.ai_summarizer:
+            http_stats = self.ai_summarizer.get_stats()
+            if http_stats:
+                status_text += (
+                    f"- AI 请求数: {http_stats['requests']} "
+                    f"(新建连接 {http_stats['connections_created']}, 复用 {http_stats['connections_reused']})\n"
+                    f"- 限流等待: {http_stats['throttled']} 次 / {http_stats['wait_seconds']} 秒, "
+                    f"服务端限流: {http_stats['rate_limited']} 次\n"
+                )
+            if self.ai_summarizer.cache:
+                cache_stats = self.ai_summarizer.cache.get_stats()
+                status_text += (
+                    f"- 总结缓存: 命中 {cache_stats['hits']} 次, 合并 {cache_stats['coalesced']} 次, "
+                    f"未命中 {cache_stats['misses']} 次\n"
+                )
+        
+        dispatch_stats = self.dispatcher.get_stats()
+        status_text += (
+            f"\n📡 更新处理 ({self.config.BOT_MODE}):\n"
+            f"- 处理中: {dispatch_stats['in_flight']}/{self.dispatcher.max_in_flight}, "
+            f"总结回调 {dispatch_stats['heavy_in_flight']}/{self.dispatcher.heavy_concurrency}\n"
+            f"- 已处理: {dispatch_stats['processed']} 条, 总结回调 {dispatch_stats['heavy_processed']} 次\n"
+        )
+        executor_stats = get_executor_stats()
+        status_text += (
+            f"- 存储线程池: {executor_stats['calls']} 次调用, 平均 {executor_stats['avg_ms']} ms, "
+            f"最长 {executor_stats['max_ms']} ms, 超时 {executor_stats['timeouts']} 次\n"
+        )
+        if self.loop_monitor:
+            loop_stats = self.loop_monitor.get_stats()
+            status_text += (
+                f"- 事件循环阻塞: {loop_stats['stalls']} 次, 最长 {loop_stats['max_lag_ms']} ms\n"
+            )
+        if get_dropped_count():
+            status_text += f"- 日志队列已满丢弃: {get_dropped_count()} 条\n"
+        
         await message.reply_text(status_text)
     
+    async def profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """处理 /profile 命令 - 在线采样分析性能热点"""
+        message = update.message
+        if not message:
+            return
+        
+        # 检查是否为管理员
+        if not self._is_admin(message.from_user.id):
+            await message.reply_text("⚠️ 只有管理员可以使用此命令")
+            return
+        
+        try:
+            seconds = int(context.args[0]) if context.args else 10
+        except ValueError:
+            await message.reply_text(f"用法: /profile [秒数]，例如: /profile 30（最长 {self.config.PROFILE_MAX_SECONDS} 秒）")
+            return
+        seconds = max(1, min(seconds, self.config.PROFILE_MAX_SECONDS))
+        
+        if self._profile_task and not self._profile_task.done():
+            await message.reply_text("⏳ 已有采样分析正在进行，请等待结束后再试")
+            return
+        
+        await message.reply_text(f"🔬 开始采样分析 {seconds} 秒...")
+        # 在后台等待采样结束，不占用当前对话的处理顺序
+        self._profile_task = asyncio.create_task(self._run_profile(message, seconds))
+    
+    async def _run_profile(self, message: Message, seconds: int):
+        """采样指定秒数，回复热点报告并保存 collapsed stack 文件"""
+        profiler = SamplingProfiler(self.config.PROFILE_SAMPLE_INTERVAL, self.config.PROFILE_MAX_STACKS)
+        try:
+            profiler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.stop()
+            
+            filename = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.collapsed"
+            path = await run_blocking(profiler.write_collapsed, os.path.join(self.config.LOG_DIR, filename))
+            self.logger.info(f"采样分析完成: {profiler.samples} 次采样，已保存到 {path}")
+            
+            report = profiler.format_report(self.config.PROFILE_TOP_N)
+            await message.reply_text(f"{report}\n\n💾 调用栈文件: {path}")
+        except Exception as e:
+            self.logger.error(f"采样分析失败: {e}")
+            await message.reply_text(f"❌ 采样分析失败: {e}")
+    
+    async def search_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """处理 /search 命令 - 搜索聊天记录"""
+        message = update.message
+        if not message:
+            return
+        
+        # 检查是否为管理员
+        if not self._is_admin(message.from_user.id):
+            await message.reply_text("⚠️ 只有管理员可以使用此命令")
+            return
+        
+        query_text = ' '.join(context.args or []).strip()
+        if not query_text:
+            await message.reply_text("用法: /search 关键词 [关键词...]\n多个关键词需同时出现，例如: /search 项目 进度")
+            return
+        
+        # 在群组中搜索时只搜索当前群组
+        context.user_data['search_query'] = query_text
+        context.user_data['search_chat_id'] = message.chat.id if message.chat.type in ['group', 'supergroup'] else None
+        await self._show_search_results(message, context, 0)
+    
+    async def _show_search_help(self, query, context: ContextTypes.DEFAULT_TYPE):
+        """显示搜索说明（有上次搜索时可以直接返回结果）"""
+        text = (
+            "🔍 搜索消息\n\n"
+            "发送 /search 关键词 搜索所有群组的聊天记录，\n"
+            "多个关键词用空格分隔，需同时出现。\n"
+            "在群组中使用时只搜索当前群组。"
+        )
+        keyboard = []
+        last_query = context.user_data.get('search_query')
+        if last_query:
+            keyboard.append([InlineKeyboardButton(f"🔁 上次搜索: {last_query[:20]}", callback_data="srch_0")])
+        keyboard.append([InlineKeyboardButton("🔙 返回主菜单", callback_data="back_main")])
+        await self._safe_send_text(query, text, reply_markup=InlineKeyboardMarkup(keyboard))
+    
+    async def _show_search_results(self, message_or_query, context: ContextTypes.DEFAULT_TYPE, page: int):
+        """显示一页搜索结果"""
+        query_text = context.user_data.get('search_query')
+        if not query_text:
+            await self._safe_send_text(message_or_query, "⚠️ 搜索已过期，请重新发送 /search 关键词")
+            return
+        chat_id = context.user_data.get('search_chat_id')
+        
+        # 数据库查询在存储线程池中执行，不阻塞事件循环
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results, has_more = await self.async_storage.search_messages(
+            query_text, chat_id, SEARCH_PAGE_SIZE, page * SEARCH_PAGE_SIZE
+        )
+        elapsed_ms = (loop.time() - started) * 1000
+        
+        if not results:
+            text = f"🔍 没有找到包含「{query_text}」的消息" if page == 0 else "🔍 没有更多结果了"
+        else:
+            lines = [f"🔍 「{query_text}」第 {page + 1} 页（{elapsed_ms:.0f} ms）\n"]
+            for msg in results:
+                user = f"{msg.get('first_name') or ''} {msg.get('last_name') or ''}".strip()
+                if msg.get('username'):
+                    user += f" (@{msg['username']})"
+                snippet = (msg.get('message_text') or '').replace('\n', ' ')
+                if len(snippet) > 200:
+                    snippet = snippet[:200] + '…'
+                group = msg.get('chat_title') or self._get_group_name(msg['chat_id'])
+                lines.append(f"🕐 {msg.get('timestamp', '')} · {group}\n👤 {user}: {snippet}\n")
+            text = '\n'.join(lines)
+        
+        buttons = []
+        if page > 0:
+            buttons.append(InlineKeyboardButton("⬅️ 上一页", callback_data=f"srch_{page - 1}"))
+        if has_more:
+            buttons.append(InlineKeyboardButton("下一页 ➡️", callback_data=f"srch_{page + 1}"))
+        keyboard = [buttons] if buttons else []
+        keyboard.append([InlineKeyboardButton("❌ 关闭", callback_data="close_menu")])
+        
+        await self._safe_send_text(message_or_query, text, reply_markup=InlineKeyboardMarkup(keyboard))
+    
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """处理按钮回调"""
         query = update.callback_query
@@ -540,6 +783,11 @@ AI总结功能未启用。请检查配置文件。
             if len(parts) >= 2:
                 chat_id = int(parts[1])
                 await self._handle_history_request(query, chat_id)
+        elif data == "search_help":
+            await self._show_search_help(query, context)
+        elif data.startswith("srch_"):
+            # 搜索结果翻页
+            await self._show_search_results(query, context, int(data.split("_")[1]))
         elif data == "cancel":
             await query.edit_message_text("❌ 操作已取消")
         elif data.startswith("sumdate_"):
@@ -631,7 +879,7 @@ AI总结功能未启用。请检查配置文件。
                 start_date = end_date - timedelta(days=3)
             
             # 获取消息数据
-            messages = self._get_messages_in_range(chat_id, start_date, end_date)
+            messages = await run_blocking(self._get_messages_in_range, chat_id, start_date, end_date)
             
             if not messages:
                 await query.edit_message_text(f"❌ 在{period_text}内没有找到消息记录")
@@ -728,45 +976,13 @@ AI总结功能未启用。请检查配置文件。
     
     def _get_available_groups(self) -> Dict[int, Dict[str, Any]]:
         """获取有消息记录的群组"""
-        try:
-            groups = {}
-            data_dir = self.config.DATA_DIR
-            
-            if not os.path.exists(data_dir):
-                return groups
-            
-            # 扫描数据文件
-            for filename in os.listdir(data_dir):
-                if filename.startswith('chat_') and filename.endswith('.json'):
-                    try:
-                        parts = filename.split('_')
-                        if len(parts) >= 3:
-                            chat_id = int(parts[1])
-                            
-                            # 尝试读取文件获取群组信息
-                            filepath = os.path.join(data_dir, filename)
-                            with open(filepath, 'r', encoding='utf-8') as f:
-                                import json
-                                messages = json.load(f)
-                                if messages:
-                                    groups[chat_id] = {
-                                        'title': messages[0].get('chat_title', f'群组 {chat_id}'),
-                                        'message_count': len(messages)
-                                    }
-                    except (ValueError, json.JSONDecodeError, IOError):
-                        continue
-            
-            return groups
-            
-        except Exception as e:
-            self.logger.error(f"获取群组信息时出错: {e}")
-            return {}
+        return self.group_registry.get_groups()
     
     def _get_messages_in_range(self, chat_id: int, start_date: datetime, end_date: datetime):
         """获取指定时间范围内的消息"""
         try:
             all_messages = []
-            data_dir = self.config.DATA_DIR
+            index = get_segment_index(self.config.DATA_DIR)
             
             # 遍历日期范围内的所有日期
             current_date = start_date.date()
@@ -774,22 +990,14 @@ AI总结功能未启用。请检查配置文件。
             
             while current_date <= end_date_only:
                 date_str = current_date.strftime('%Y%m%d')
-                # 使用绝对值来匹配文件名（文件存储时使用abs(chat_id)）
-                filename = f'chat_{abs(chat_id)}_{date_str}.json'
-                filepath = os.path.join(data_dir, filename)
-                
-                self.logger.info(f"尝试读取文件: {filename}, 存在: {os.path.exists(filepath)}")
-                
-                if os.path.exists(filepath):
+                for filepath in index.get_segment_paths(chat_id, date_str, MESSAGE_FILE_EXTENSIONS):
+                    filename = os.path.basename(filepath)
                     try:
-                        with open(filepath, 'r', encoding='utf-8') as f:
-                            import json
-                            messages = json.load(f)
-                            all_messages.extend(messages)
-                            self.logger.info(f"从 {filename} 读取 {len(messages)} 条消息")
+                        messages = load_messages_file(filepath)
+                        all_messages.extend(messages)
+                        self.logger.info(f"从 {filename} 读取 {len(messages)} 条消息")
                     except (json.JSONDecodeError, IOError) as e:
                         self.logger.error(f"读取文件 {filename} 失败: {e}")
-                        pass
                 
                 current_date += timedelta(days=1)
             
@@ -802,8 +1010,7 @@ AI总结功能未启用。请检查配置文件。
     
     def _get_group_name(self, chat_id: int) -> str:
         """获取群组名称"""
-        groups = self._get_available_groups()
-        return groups.get(chat_id, {}).get('title', f'群组 {chat_id}')
+        return self.group_registry.get_title(chat_id)
     
     def _escape_markdown(self, text: str) -> str:
         """转义Markdown特殊字符"""
@@ -862,6 +1069,9 @@ AI总结功能未启用。请检查配置文件。
         keyboard = [
             [
                 InlineKeyboardButton("� 生成今日总结", callback_data="generate_today")
+            ],
+            [
+                InlineKeyboardButton("🔍 搜索消息", callback_data="search_help")
             ]
             # 其他功能按钮保留在代码中，以后可以启用
             # [
@@ -1024,7 +1234,7 @@ AI总结功能未启用。请检查配置文件。
         try:
             if self.ai_summarizer:
                 # 获取历史总结
-                summaries = self.ai_summarizer.get_summary_history(chat_id, 7)
+                summaries = await run_blocking(self.ai_summarizer.get_summary_history, chat_id, 7)
                 
                 if not summaries:
                     group_name = self._get_group_name(chat_id)
@@ -1097,6 +1307,8 @@ AI总结功能未启用。请检查配置文件。
                 commands.extend([
                     BotCommand("stats", "查看群组统计信息"),
                     BotCommand("status", "查看机器人状态"),
+                    BotCommand("profile", "采样分析性能热点"),
+                    BotCommand("search", "搜索聊天记录"),
                 ])
             
             # 设置命令菜单
@@ -1108,16 +1320,111 @@ AI总结功能未启用。请检查配置文件。
             self.logger.error(f"设置机器人命令失败: {e}")
             print(f"⚠️ 设置命令菜单失败: {e}", flush=True)
     
+    def _reload_config(self, force: bool = False):
+        """重新加载允许的群组和管理员列表（force=False 时只在 .env 修改后加载）"""
+        try:
+            if force:
+                self.config.reload()
+            elif not self.config.reload_if_changed():
+                return
+        except Exception as e:
+            self.logger.error(f"重新加载配置失败: {e}")
+            return
+        snapshot = self.config.snapshot()
+        self.logger.info(
+            f"配置已重新加载: 允许的群组 {len(snapshot.allowed_groups) or '不限'} 个, "
+            f"管理员 {len(snapshot.admin_ids)} 个"
+        )
+    
+    async def _watch_config(self):
+        """定期检查 .env 修改时间，修改后重新加载配置"""
+        while True:
+            await asyncio.sleep(self.config.CONFIG_RELOAD_INTERVAL)
+            self._reload_config()
+    
+    async def _flush_group_registry(self):
+        """定期在存储线程池中保存群组目录，不在消息处理路径上写文件"""
+        while True:
+            await asyncio.sleep(self.config.GROUP_REGISTRY_SAVE_INTERVAL)
+            try:
+                await run_blocking(self.group_registry.flush)
+            except StorageTimeoutError as e:
+                self.logger.error(f"保存群组目录超时: {e}")
+    
+    def _start_config_reload(self):
+        """注册 SIGHUP 重新加载，并启动 .env 修改检查"""
+        loop = asyncio.get_running_loop()
+        if hasattr(signal, 'SIGHUP'):
+            try:
+                loop.add_signal_handler(signal.SIGHUP, self._reload_config, True)
+            except NotImplementedError:
+                pass
+        if self.config.CONFIG_RELOAD_INTERVAL > 0:
+            self._config_watch_task = loop.create_task(self._watch_config())
+    
+    async def _run_webhook(self, application):
+        """以 webhook 模式运行：由内置 HTTP 服务器接收 Telegram 推送，手动管理 Application 生命周期"""
+        secret_token = self.config.WEBHOOK_SECRET_TOKEN or secrets.token_urlsafe(32)
+        server = WebhookServer(
+            application.update_queue,
+            lambda data: Update.de_json(data, application.bot),
+            secret_token=secret_token,
+            path=self.config.WEBHOOK_PATH,
+            host=self.config.WEBHOOK_LISTEN,
+            port=self.config.WEBHOOK_PORT,
+            metrics_path=self.config.METRICS_PATH if self.config.METRICS_ENABLED else None,
+        )
+        
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except NotImplementedError:
+                # Windows 不支持，依赖 KeyboardInterrupt
+                pass
+        
+        await application.initialize()
+        try:
+            if application.post_init:
+                await application.post_init(application)
+            await application.start()
+            await server.start()
+            webhook_url = self.config.WEBHOOK_URL.rstrip('/') + server.path
+            await application.bot.set_webhook(
+                url=webhook_url,
+                secret_token=secret_token,
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=True,
+                max_connections=self.config.WEBHOOK_MAX_CONNECTIONS
+            )
+            self.logger.info(f"Webhook 已设置: {webhook_url}")
+            print(f"🌐 Webhook 模式: {webhook_url} -> {server.host}:{server.port}", flush=True)
+            await stop_event.wait()
+        finally:
+            # 先停止接收，再处理完队列中已接收的 Update
+            await server.stop()
+            if application.running:
+                await application.stop()
+            await application.shutdown()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+    
     def run(self):
         """启动机器人"""
         self.logger.info("正在启动 Telegram Note Taker Bot...")
         
         # 创建应用程序
-        application = Application.builder().token(self.config.BOT_TOKEN).build()
+        application = (
+            Application.builder()
+            .token(self.config.BOT_TOKEN)
+            .concurrent_updates(ChatOrderedUpdateProcessor(self.dispatcher))
+            .build()
+        )
         
         # 初始化任务调度器（但不立即启动异步任务）
         if self.config.ENABLE_AI_SUMMARY:
-            self.scheduler = TaskScheduler(application)
+            self.scheduler = TaskScheduler(application, self.ai_summarizer)
             self.scheduler.start()
         
         # 添加处理器
@@ -1126,6 +1433,8 @@ AI总结功能未启用。请检查配置文件。
         application.add_handler(CommandHandler("myid", self.myid_command))
         application.add_handler(CommandHandler("stats", self.stats_command))
         application.add_handler(CommandHandler("status", self.status_command))
+        application.add_handler(CommandHandler("profile", self.profile_command))
+        application.add_handler(CommandHandler("search", self.search_command))
         
         # 添加回调查询处理器
         application.add_handler(CallbackQueryHandler(self.button_callback))
@@ -1139,32 +1448,73 @@ AI总结功能未启用。请检查配置文件。
         self.logger.info("Bot 已启动，正在监听消息...")
         print("🤖 Bot 已启动，正在监听消息...", flush=True)
         print("📋 配置信息:", flush=True)
-        allowed_groups = self.config.get_allowed_groups()
-        print(f"   - 允许的群组: {allowed_groups if allowed_groups else '所有群组'}", flush=True)
-        print(f"   - 管理员: {self.config.get_admin_ids()}", flush=True)
+        snapshot = self.config.snapshot()
+        print(f"   - 允许的群组: {sorted(snapshot.allowed_groups) if snapshot.allowed_groups else '所有群组'}", flush=True)
+        print(f"   - 管理员: {sorted(snapshot.admin_ids)}", flush=True)
+        print(f"   - 接收方式: {self.config.BOT_MODE} (并发处理 {self.config.MAX_CONCURRENT_UPDATES})", flush=True)
         print("=" * 50, flush=True)
         
         # 注册启动和关闭回调
         async def post_init(application):
+            if self.loop_monitor:
+                self.loop_monitor.start()
+            self._start_config_reload()
+            self._registry_flush_task = asyncio.create_task(self._flush_group_registry())
+            
             # 设置机器人命令菜单
             await self._setup_bot_commands(application)
             
+            if self.write_queue:
+                self.write_queue.start()
+            
+            # 打开 AI 接口共享连接池
+            if self.ai_summarizer:
+                await self.ai_summarizer.start()
+            
             if self.scheduler:
                 await self.scheduler.start_async()
+            
+            # 长轮询模式没有 Webhook 服务器，单独监听 HTTP 端口提供 /metrics
+            if self.config.METRICS_ENABLED and self.config.BOT_MODE != 'webhook':
+                self.metrics_server = MetricsServer(
+                    self.config.WEBHOOK_LISTEN, self.config.WEBHOOK_PORT, self.config.METRICS_PATH
+                )
+                await self.metrics_server.start()
         
         async def post_shutdown(application):
+            if self._profile_task:
+                self._profile_task.cancel()
+            if self._registry_flush_task:
+                self._registry_flush_task.cancel()
+            if self.metrics_server:
+                await self.metrics_server.stop()
             if self.scheduler:
                 self.scheduler.stop()
+            if self.ai_summarizer:
+                await self.ai_summarizer.close()
+            # 先写完队列中的消息，再关闭存储；都在存储线程池中执行，关闭期间不阻塞事件循环
+            if self.write_queue:
+                await run_blocking(self.write_queue.stop, timeout=0)
+            await run_blocking(self.group_registry.flush)
+            await run_blocking(self.storage.close, timeout=0)
+            shutdown_storage_executor()
+            if self.loop_monitor:
+                await self.loop_monitor.stop()
+            if self._config_watch_task:
+                self._config_watch_task.cancel()
         
         application.post_init = post_init
         application.post_shutdown = post_shutdown
         
         try:
             # 启动机器人
-            application.run_polling(
-                allowed_updates=Update.ALL_TYPES,
-                drop_pending_updates=True
-            )
+            if self.config.BOT_MODE == 'webhook':
+                asyncio.run(self._run_webhook(application))
+            else:
+                application.run_polling(
+                    allowed_updates=Update.ALL_TYPES,
+                    drop_pending_updates=True
+                )
         finally:
             # 停止调度器
             if self.scheduler:
@@ -1180,6 +1530,9 @@ def main():
     except Exception as e:
         bot.logger.error(f"运行时发生错误: {e}")
         sys.exit(1)
+    finally:
+        # 写完日志队列中剩余的日志
+        stop_logging()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,254 @@
+"""
+Parquet 导出模块
+从当前 STORAGE_FORMAT 对应的存储后端流式读取消息，按 群组 / 月份 分区写入 Parquet 文件，
+供 pandas / DuckDB / Spark 等工具直接分析。每次只导出上次水位线之后的新消息，内存占用与历史总量无关。
+
+输出目录结构（Hive 分区）:
+    <EXPORT_DIR>/chat=<群组ID>/month=<YYYY-MM>/part-<运行时间>-<随机串>-<序号>.parquet
+    <EXPORT_DIR>/_watermark.json
+"""
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config.config import Config
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    # 可选依赖，只有导出时需要
+    pa = None
+
+WATERMARK_FILENAME = '_watermark.json'
+INPROGRESS_SUFFIX = '.inprogress'
+
+# 导出的列（media_info 为紧凑 JSON 字符串）
+EXPORT_COLUMNS = (
+    'message_id', 'chat_id', 'chat_title', 'user_id', 'username', 'first_name',
+    'last_name', 'message_text', 'message_type', 'timestamp', 'media_info'
+)
+
+
+def export_schema():
+    """Parquet 文件的列类型，timestamp 为本地时间（秒精度）"""
+    return pa.schema([
+        ('message_id', pa.int64()),
+        ('chat_id', pa.int64()),
+        ('chat_title', pa.string()),
+        ('user_id', pa.int64()),
+        ('username', pa.string()),
+        ('first_name', pa.string()),
+        ('last_name', pa.string()),
+        ('message_text', pa.string()),
+        ('message_type', pa.string()),
+        ('timestamp', pa.timestamp('s')),
+        ('media_info', pa.string()),
+    ])
+
+
+class ParquetExporter:
+    """增量 Parquet 导出器
+
+    消息按读取顺序进入各分区的行缓冲，缓冲总行数达到 batch_rows 时写出一个 row group，
+    同时打开的分区文件数不超过 max_open_files（最久未写入的先关闭），因此内存占用有上界。
+    本次写出的文件先以 .inprogress 结尾，全部写完后再改名并更新水位线；
+    中途退出时下次运行会删除这些未完成的文件并从原水位线重新导出。
+
+    水位线:
+        sqlite: 已导出的最大 messages.id
+        json / jsonl: 每个群组 {'date': 最后导出的日期, 'count': 该日期已导出的条数}
+    TXT 格式没有结构化字段，不支持导出。
+    """
+
+    def __init__(self, export_dir: Optional[str] = None, batch_rows: Optional[int] = None,
+                 max_open_files: Optional[int] = None):
+        if pa is None:
+            raise RuntimeError("导出 Parquet 需要安装 pyarrow: pip install pyarrow")
+        self.config = Config()
+        self.export_dir = export_dir or self.config.EXPORT_DIR
+        self.batch_rows = batch_rows or self.config.EXPORT_BATCH_ROWS
+        self.max_open_files = max_open_files or self.config.EXPORT_MAX_OPEN_FILES
+        self.logger = logging.getLogger('telegram_notetaker.exporter')
+        self.schema = export_schema()
+        self.watermark_path = os.path.join(self.export_dir, WATERMARK_FILENAME)
+
+        # 同一秒内多次导出也不能覆盖之前的文件
+        self._run_id = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self._buffers: Dict[Tuple[int, str], Dict[str, List[Any]]] = {}
+        self._buffered = 0
+        self._writers: 'OrderedDict[Tuple[int, str], Any]' = OrderedDict()
+        self._part_seq = 0
+        self._written_files: List[str] = []
+
+    # ---------- 水位线 ----------
+
+    def load_watermark(self) -> Dict[str, Any]:
+        """读取水位线，不存在时从头导出"""
+        if not os.path.exists(self.watermark_path):
+            return {}
+        with open(self.watermark_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_watermark(self, watermark: Dict[str, Any]):
+        """保存水位线（原子写入）"""
+        tmp_path = self.watermark_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(watermark, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.watermark_path)
+
+    # ---------- 导出 ----------
+
+    def export(self, full: bool = False) -> Dict[str, Any]:
+        """导出水位线之后的新消息，full=True 时忽略水位线从头导出"""
+        if self.config.STORAGE_FORMAT == 'txt':
+            raise RuntimeError("TXT 存储格式没有结构化字段，不支持导出")
+        os.makedirs(self.export_dir, exist_ok=True)
+        self._remove_inprogress()
+
+        watermark = {} if full else self.load_watermark()
+        if watermark.get('storage_format') not in (None, self.config.STORAGE_FORMAT):
+            self.logger.warning(
+                f"存储格式已从 {watermark['storage_format']} 变为 {self.config.STORAGE_FORMAT}，将从头导出"
+            )
+            watermark = {}
+        watermark['storage_format'] = self.config.STORAGE_FORMAT
+        start = time.perf_counter()
+        rows = 0
+        try:
+            if self.config.STORAGE_FORMAT == 'sqlite':
+                source = self._iter_sqlite(watermark)
+            else:
+                source = self._iter_files(watermark)
+            for message in source:
+                self._append(message)
+                rows += 1
+                if self._buffered >= self.batch_rows:
+                    self._flush_buffers()
+            self._flush_buffers()
+        finally:
+            for writer in self._writers.values():
+                writer.close()
+            self._writers.clear()
+
+        # 所有文件写完后再改名并推进水位线
+        for path in self._written_files:
+            os.replace(path, path[:-len(INPROGRESS_SUFFIX)])
+        watermark['exported_at'] = datetime.now().strftime(self.config.TIME_FORMAT)
+        self._save_watermark(watermark)
+
+        elapsed = time.perf_counter() - start
+        self.logger.info(f"已导出 {rows} 条消息到 {len(self._written_files)} 个文件，耗时 {elapsed:.1f} 秒")
+        return {'rows': rows, 'files': len(self._written_files), 'seconds': elapsed}
+
+    def _iter_sqlite(self, watermark: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """按 id 顺序分批读取 SQLite 中水位线之后的消息"""
+        from sqlite_pool import get_connection_manager
+        from storage import MESSAGE_COLUMNS
+
+        db_path = os.path.join(self.config.DATA_DIR, 'messages.db')
+        if not os.path.exists(db_path):
+            return
+        last_id = watermark.get('last_id', 0)
+        sql = f'SELECT id, {MESSAGE_COLUMNS} FROM messages WHERE id > ? ORDER BY id LIMIT ?'
+        while True:
+            # 每批单独获取读连接，长时间导出不会一直占用连接池
+            with get_connection_manager(db_path).reader() as conn:
+                rows = conn.execute(sql, (last_id, self.batch_rows)).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                message = {column: row[column] for column in EXPORT_COLUMNS}
+                if message['media_info'] == 'null':
+                    message['media_info'] = None
+                yield message
+            last_id = rows[-1]['id']
+            watermark['last_id'] = last_id
+
+    def _iter_files(self, watermark: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """按群组、日期顺序流式读取分段文件（含已归档的日期）中水位线之后的消息"""
+        from segment_index import get_segment_index
+        from storage import MESSAGE_FILE_EXTENSIONS, iter_messages_file
+
+        index = get_segment_index(self.config.DATA_DIR)
+        chats = watermark.setdefault('chats', {})
+        for chat_id in sorted(index.get_chats()):
+            mark = chats.get(str(chat_id), {'date': '', 'count': 0})
+            for date_str in index.get_chat_dates(chat_id):
+                if date_str < mark['date']:
+                    continue
+                # 只有水位线当天需要跳过已导出的消息，之后的日期从头导出
+                skip = mark['count'] if date_str == mark['date'] else 0
+                count = 0
+                for path in index.get_segment_paths(chat_id, date_str, MESSAGE_FILE_EXTENSIONS):
+                    for message in iter_messages_file(path):
+                        count += 1
+                        if count <= skip:
+                            continue
+                        media_info = message.get('media_info')
+                        if media_info is not None:
+                            message['media_info'] = json.dumps(media_info, ensure_ascii=False, separators=(',', ':'))
+                        yield message
+                if count:
+                    mark = {'date': date_str, 'count': max(count, skip)}
+                    chats[str(chat_id)] = mark
+
+    def _append(self, message: Dict[str, Any]):
+        """把一条消息放入所属分区的行缓冲"""
+        key = (message['chat_id'], (message.get('timestamp') or '')[:7] or 'unknown')
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = {column: [] for column in EXPORT_COLUMNS}
+        for column in EXPORT_COLUMNS:
+            buffer[column].append(message.get(column))
+        self._buffered += 1
+
+    def _flush_buffers(self):
+        """把所有分区的行缓冲各写成一个 row group"""
+        for key, buffer in self._buffers.items():
+            columns = dict(buffer)
+            columns['timestamp'] = pc.strptime(
+                pa.array(columns['timestamp'], pa.string()), format=self.config.TIME_FORMAT, unit='s'
+            )
+            table = pa.Table.from_pydict(columns, schema=self.schema)
+            self._get_writer(key).write_table(table)
+        self._buffers.clear()
+        self._buffered = 0
+
+    def _get_writer(self, key: Tuple[int, str]):
+        """获取分区的写入器，超出打开文件数上限时关闭最久未写入的分区文件"""
+        writer = self._writers.get(key)
+        if writer is not None:
+            self._writers.move_to_end(key)
+            return writer
+
+        while len(self._writers) >= self.max_open_files:
+            _, oldest = self._writers.popitem(last=False)
+            oldest.close()
+
+        chat_id, month = key
+        partition_dir = os.path.join(self.export_dir, f'chat={chat_id}', f'month={month}')
+        os.makedirs(partition_dir, exist_ok=True)
+        self._part_seq += 1
+        path = os.path.join(partition_dir, f'part-{self._run_id}-{self._part_seq:05d}.parquet{INPROGRESS_SUFFIX}')
+        writer = pq.ParquetWriter(path, self.schema, compression=self.config.EXPORT_COMPRESSION)
+        self._writers[key] = writer
+        self._written_files.append(path)
+        return writer
+
+    def _remove_inprogress(self):
+        """删除上次中断时未完成的文件"""
+        for root, _, files in os.walk(self.export_dir):
+            for name in files:
+                if name.endswith(INPROGRESS_SUFFIX):
+                    os.remove(os.path.join(root, name))
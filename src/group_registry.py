@@ -0,0 +1,132 @@
+"""
+群组目录模块
+在内存中维护 chat_id -> 标题、最后活跃时间、消息数，并持久化到小型 sidecar 文件
+"""
+import json
+import logging
+import os
+import sys
+import threading
+from typing import Any, Dict, Optional
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import Config
+
+REGISTRY_FILENAME = 'groups.json'
+
+
+class GroupRegistry:
+    """群组目录
+
+    由 handle_message 增量维护，菜单渲染直接读取内存中的目录，
+    不再随消息归档的大小扫描或解析任何文件。record() 只修改内存，
+    由 bot 按 GROUP_REGISTRY_SAVE_INTERVAL 在存储线程池中调用 flush() 落盘。
+    """
+
+    def __init__(self, data_dir: Optional[str] = None):
+        self.data_dir = data_dir or Config.DATA_DIR
+        self.path = os.path.join(self.data_dir, REGISTRY_FILENAME)
+        self.logger = logging.getLogger('telegram_notetaker.group_registry')
+        self._lock = threading.Lock()
+        self._groups: Dict[int, Dict[str, Any]] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        """加载 sidecar 文件，不存在时从已有数据初始化"""
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self._groups = {int(chat_id): info for chat_id, info in data.items()}
+                return
+            except (json.JSONDecodeError, OSError, ValueError) as e:
+                self.logger.warning(f"群组目录文件损坏，将重建: {e}")
+
+        self._groups = self._bootstrap()
+        if self._groups:
+            self.logger.info(f"已从历史数据初始化群组目录，共 {len(self._groups)} 个群组")
+            self._dirty = True
+            self.flush()
+
+    def _bootstrap(self) -> Dict[int, Dict[str, Any]]:
+        """从存储后端一次性汇总群组信息"""
+        groups = {}
+        if Config.STORAGE_FORMAT == 'sqlite':
+            db_path = os.path.join(self.data_dir, 'messages.db')
+            if not os.path.exists(db_path):
+                return groups
+            from sqlite_pool import get_connection_manager
+            with get_connection_manager(db_path).reader() as conn:
+                cursor = conn.execute('''
+                    SELECT chat_id, MAX(chat_title), COUNT(*), MAX(timestamp)
+                    FROM messages
+                    GROUP BY chat_id
+                ''')
+                for chat_id, title, count, last_ts in cursor.fetchall():
+                    groups[chat_id] = {
+                        'title': title or f'群组 {chat_id}',
+                        'last_seen': last_ts,
+                        'message_count': count
+                    }
+        else:
+            from segment_index import get_segment_index
+            for chat_id, info in get_segment_index(self.data_dir).get_chats().items():
+                if info['message_count']:
+                    groups[chat_id] = {
+                        'title': info['title'],
+                        'last_seen': info['last_ts'],
+                        'message_count': info['message_count']
+                    }
+        return groups
+
+    def record(self, message_data: Dict[str, Any]):
+        """记录一条已保存的消息（只修改内存）"""
+        chat_id = message_data['chat_id']
+        with self._lock:
+            group = self._groups.get(chat_id)
+            if group is None:
+                group = {'title': None, 'last_seen': None, 'message_count': 0}
+                self._groups[chat_id] = group
+            group['title'] = message_data.get('chat_title') or group['title'] or f'群组 {chat_id}'
+            group['last_seen'] = message_data.get('timestamp')
+            group['message_count'] += 1
+            self._dirty = True
+
+    def get_groups(self) -> Dict[int, Dict[str, Any]]:
+        """获取群组目录快照（按最后活跃时间倒序）"""
+        with self._lock:
+            items = sorted(
+                self._groups.items(),
+                key=lambda item: item[1].get('last_seen') or '',
+                reverse=True
+            )
+            return {chat_id: dict(info) for chat_id, info in items}
+
+    def get_title(self, chat_id: int) -> str:
+        """获取群组标题"""
+        with self._lock:
+            group = self._groups.get(chat_id)
+        return group['title'] if group and group.get('title') else f'群组 {chat_id}'
+
+    def save(self):
+        """保存 sidecar 文件（原子写入）"""
+        with self._lock:
+            data = {str(chat_id): dict(info) for chat_id, info in self._groups.items()}
+            self._dirty = False
+        os.makedirs(self.data_dir, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def flush(self):
+        """有未保存的变更时立即保存，写入失败只记录日志，下次重试"""
+        if not self._dirty:
+            return
+        try:
+            self.save()
+        except OSError as e:
+            self._dirty = True
+            self.logger.error(f"保存群组目录失败: {e}")
@@ -0,0 +1,172 @@
+"""
+日志管道模块
+所有 telegram_notetaker.* 日志先进入内存队列（QueueHandler），由后台线程（QueueListener）
+写入文件和控制台，处理消息的协程不再等待磁盘和终端 I/O。
+
+高频事件（每条消息一次）通过 EventLog 记录：每种事件可以单独设置级别和采样率，
+未启用时不会构造日志内容。事件格式为 "事件名 key=value ..."，便于 grep 和解析。
+"""
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from typing import Any, Dict, Optional
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import Config
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_FILENAME = 'telegram_notetaker.log'
+
+# 高频事件的默认级别（日志级别为 INFO 时默认不输出）
+DEFAULT_EVENT_LEVELS = {
+    'message_received': logging.DEBUG,
+    'message_saved': logging.DEBUG,
+    'message_filtered': logging.DEBUG,
+    'message_private': logging.DEBUG,
+    'chat_denied': logging.INFO,
+}
+
+
+def parse_event_setting(value: str) -> Dict[str, str]:
+    """解析 "事件=值,事件=值" 格式的配置"""
+    settings = {}
+    for item in value.split(','):
+        if '=' in item:
+            key, val = item.split('=', 1)
+            if key.strip() and val.strip():
+                settings[key.strip()] = val.strip()
+    return settings
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃日志并计数，不阻塞调用方"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    """停止时队列可能是满的，等待后台线程腾出位置再放入结束标记"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class EventLog:
+    """按事件类型设置级别和采样率的结构化日志
+
+    sample_rates 中的采样率为 0-1，按计数取样（0.01 表示每 100 条记录 1 条）。
+    """
+
+    def __init__(self, logger: logging.Logger, levels: Optional[Dict[str, int]] = None,
+                 sample_rates: Optional[Dict[str, float]] = None):
+        self.logger = logger
+        self.levels = dict(DEFAULT_EVENT_LEVELS)
+        self.levels.update(levels or {})
+        self._every = {
+            event: max(1, round(1 / rate)) if rate > 0 else 0
+            for event, rate in (sample_rates or {}).items()
+        }
+        self._counts: Dict[str, int] = {}
+
+    @classmethod
+    def from_config(cls, logger: logging.Logger) -> 'EventLog':
+        """从 LOG_EVENT_LEVELS / LOG_SAMPLE_RATES 配置创建"""
+        levels = {
+            event: logging.getLevelName(level.upper())
+            for event, level in parse_event_setting(Config.LOG_EVENT_LEVELS).items()
+        }
+        sample_rates = {
+            event: float(rate) for event, rate in parse_event_setting(Config.LOG_SAMPLE_RATES).items()
+        }
+        return cls(logger, {k: v for k, v in levels.items() if isinstance(v, int)}, sample_rates)
+
+    def enabled(self, event: str) -> bool:
+        """事件是否需要记录（级别和采样都满足）"""
+        if not self.logger.isEnabledFor(self.levels.get(event, logging.INFO)):
+            return False
+        every = self._every.get(event)
+        if every is None:
+            return True
+        if every == 0:
+            return False
+        count = self._counts.get(event, 0) + 1
+        self._counts[event] = count
+        return (count - 1) % every == 0
+
+    def log(self, event: str, **fields: Any):
+        """记录一个事件"""
+        if not self.enabled(event):
+            return
+        text = ' '.join(f'{key}={value}' for key, value in fields.items())
+        self.logger.log(self.levels.get(event, logging.INFO), f'{event} {text}')
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+_listener_lock = threading.Lock()
+
+
+def setup_logging(name: str = 'telegram_notetaker', log_dir: Optional[str] = None,
+                  level: Optional[str] = None, console: Optional[bool] = None) -> logging.Logger:
+    """配置日志：logger 只挂 QueueHandler，文件和控制台输出由后台线程完成"""
+    global _listener, _queue_handler
+    log_dir = log_dir or Config.LOG_DIR
+    level = (level or Config.LOG_LEVEL).upper()
+    console = Config.LOG_CONSOLE if console is None else console
+
+    logger = logging.getLogger(name)
+    logger.setLevel(getattr(logging, level, logging.INFO))
+
+    with _listener_lock:
+        if _listener is not None:
+            return logger
+
+        formatter = logging.Formatter(LOG_FORMAT)
+        os.makedirs(log_dir, exist_ok=True)
+        handlers = [logging.FileHandler(os.path.join(log_dir, LOG_FILENAME), encoding='utf-8')]
+        if console:
+            handlers.append(logging.StreamHandler())
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue: queue.Queue = queue.Queue(maxsize=Config.LOG_QUEUE_MAXSIZE)
+        _queue_handler = DroppingQueueHandler(log_queue)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(_queue_handler)
+        logger.propagate = False
+
+        _listener = _QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    return logger
+
+
+def stop_logging(name: str = 'telegram_notetaker'):
+    """写完队列中的日志并停止后台线程"""
+    global _listener, _queue_handler
+    with _listener_lock:
+        listener, _listener = _listener, None
+        handler, _queue_handler = _queue_handler, None
+    if listener is None:
+        return
+    listener.stop()
+    for target in listener.handlers:
+        target.close()
+    logging.getLogger(name).removeHandler(handler)
+
+
+def get_dropped_count() -> int:
+    """队列满时丢弃的日志条数"""
+    return _queue_handler.dropped if _queue_handler else 0
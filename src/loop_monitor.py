@@ -0,0 +1,103 @@
+"""
+事件循环延迟监控模块
+事件循环中定时运行心跳协程，后台看门狗线程检查心跳是否按时到达：
+心跳迟到超过阈值说明有回调在阻塞事件循环，看门狗此时抓取事件循环线程的调用栈写入日志，
+直接指出是哪段代码在阻塞；阻塞结束后再记录一次总时长。
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, Optional
+
+
+class LoopLagMonitor:
+    """事件循环阻塞监控
+
+    threshold: 心跳迟到多少秒视为阻塞
+    interval: 心跳间隔（秒）
+    """
+
+    def __init__(self, threshold: float = 0.25, interval: float = 0.1):
+        self.threshold = threshold
+        self.interval = interval
+        self.logger = logging.getLogger('telegram_notetaker.loop_monitor')
+
+        self.stalls = 0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """在事件循环中启动心跳和看门狗线程"""
+        if self._task:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop_event.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name='loop-monitor', daemon=True)
+        self._thread.start()
+        self.logger.info(f"事件循环监控已启动 (阈值 {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self):
+        """停止监控"""
+        self._stop_event.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    async def _heartbeat(self):
+        """按固定间隔醒来，迟到的时间就是事件循环被阻塞的时间"""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._last_beat = time.monotonic()
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.threshold:
+                self.stalls += 1
+                self.logger.warning(f"事件循环阻塞了 {lag * 1000:.0f} ms")
+
+    def _watch(self):
+        """看门狗线程：心跳超时时记录事件循环线程的调用栈（每次阻塞只记录一次）"""
+        reported = False
+        check_interval = min(self.interval, self.threshold / 2) or self.interval
+        while not self._stop_event.wait(check_interval):
+            blocked = time.monotonic() - self._last_beat - self.interval
+            if blocked <= self.threshold:
+                reported = False
+                continue
+            if reported:
+                continue
+            reported = True
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = ''.join(traceback.format_stack(frame))
+            self.logger.warning(
+                f"事件循环已阻塞 {blocked * 1000:.0f} ms，当前执行位置:\n{stack}"
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取监控统计"""
+        return {
+            'stalls': self.stalls,
+            'max_lag_ms': round(self.max_lag * 1000, 1),
+            'last_lag_ms': round(self.last_lag * 1000, 1),
+        }
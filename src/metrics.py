@@ -0,0 +1,320 @@
+"""
+运行指标模块
+进程内的轻量指标注册表（计数器 / 仪表 / 直方图），以 Prometheus 文本格式输出。
+热路径上每次记录只是一次加锁的加法（直方图再加一次二分查找），不做任何 I/O；
+抓取时才生成文本。
+
+Webhook 模式下 /metrics 挂在 Webhook 服务器上；长轮询模式下由 MetricsServer
+单独监听同一个 HTTP 端口（Dockerfile 中 EXPOSE 的 8080）。
+"""
+import bisect
+import logging
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_PATH = '/metrics'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 默认直方图分桶（秒），覆盖亚毫秒级的存储写入到分钟级的 AI 请求
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class _Metric:
+    """指标基类，按标签值保存各个序列"""
+
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，收到 {tuple(labels)}")
+        if not labels:
+            return ()
+        try:
+            return tuple([str(labels[name]) for name in self.labelnames])
+        except KeyError:
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，收到 {tuple(labels)}") from None
+
+    def _samples(self) -> Iterable[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        """(后缀, 标签名, 标签值, 数值)"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        for suffix, names, values, value in self._samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for values, value in items:
+            yield '', self.labelnames, values, value
+
+
+class Gauge(_Metric):
+    """可增可减的仪表；set_function 设置的回调在抓取时取值"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._values.get(self._key(labels), 0)
+
+    def set_function(self, function: Optional[Callable[[], float]]):
+        """抓取时调用 function 取值（仅用于无标签的仪表）"""
+        self._function = function
+
+    def _samples(self):
+        if self._function is not None:
+            try:
+                yield '', (), (), float(self._function())
+            except Exception:
+                pass
+            return
+        with self._lock:
+            items = list(self._values.items())
+        for values, value in items:
+            yield '', self.labelnames, values, value
+
+
+class Histogram(_Metric):
+    """直方图：累计分桶计数 + 总和 + 次数"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [各分桶计数..., +Inf 计数, 总和]
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, **labels) -> '_Timer':
+        """with metric.time(): ... 记录代码块耗时"""
+        return _Timer(self, labels)
+
+    def get_count(self, **labels) -> int:
+        series = self._values.get(self._key(labels))
+        return sum(series[:-1]) if series else 0
+
+    def get_sum(self, **labels) -> float:
+        series = self._values.get(self._key(labels))
+        return series[-1] if series else 0.0
+
+    def _samples(self):
+        with self._lock:
+            items = [(values, list(series)) for values, series in self._values.items()]
+        names = self.labelnames + ('le',)
+        for values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                yield '_bucket', names, values + (_format_value(float(bound)),), cumulative
+            yield '_sum', self.labelnames, values, series[-1]
+            yield '_count', self.labelnames, values, cumulative
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, object]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class MetricsRegistry:
+    """指标注册表，同名指标只创建一次"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"指标 {name} 已以不同的类型或标签注册")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """生成 Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+# 消息接收
+UPDATES_RECEIVED = REGISTRY.counter('notetaker_updates_received_total', '收到的消息 Update 数')
+UPDATES_FILTERED = REGISTRY.counter(
+    'notetaker_updates_filtered_total', '未记录的消息数（private/denied/empty/dropped）', ('reason',)
+)
+MESSAGES_SAVED = REGISTRY.counter('notetaker_messages_saved_total', '已记录的消息数', ('type',))
+UPDATE_ERRORS = REGISTRY.counter('notetaker_update_errors_total', '处理消息时发生的错误数')
+HANDLER_SECONDS = REGISTRY.histogram('notetaker_handle_message_seconds', 'handle_message 耗时（秒）')
+
+# 存储
+STORAGE_WRITE_SECONDS = REGISTRY.histogram(
+    'notetaker_storage_write_seconds', '每批消息的写入耗时（秒）', ('backend',)
+)
+STORAGE_MESSAGES_WRITTEN = REGISTRY.counter(
+    'notetaker_storage_messages_written_total', '写入存储的消息数', ('backend',)
+)
+STORAGE_BYTES_WRITTEN = REGISTRY.counter(
+    'notetaker_storage_bytes_written_total', '写入存储的字节数（SQLite 为行数据大小）', ('backend',)
+)
+
+# AI 总结
+AI_PROMPT_TOKENS = REGISTRY.counter('notetaker_ai_prompt_tokens_total', '发送的提示词 token 数（估算）', ('provider',))
+AI_REQUEST_SECONDS = REGISTRY.histogram('notetaker_ai_request_seconds', 'AI 接口单次请求耗时（秒）', ('provider',))
+AI_REQUEST_FAILURES = REGISTRY.counter(
+    'notetaker_ai_request_failures_total', 'AI 接口请求失败数（rate_limited/error）', ('provider', 'reason')
+)
+SUMMARY_CACHE_LOOKUPS = REGISTRY.counter(
+    'notetaker_summary_cache_lookups_total', '总结缓存查询次数（hit/miss/coalesced）', ('result',)
+)
+
+# 定时任务
+SCHEDULER_RUN_SECONDS = REGISTRY.histogram('notetaker_scheduler_run_seconds', '每日自动总结的总耗时（秒）')
+SCHEDULER_LAST_RUN = REGISTRY.gauge(
+    'notetaker_scheduler_last_run_timestamp_seconds', '上次每日自动总结完成的时间（Unix 时间戳）'
+)
+SCHEDULER_CHAT_RESULTS = REGISTRY.counter(
+    'notetaker_scheduler_chat_results_total', '每日自动总结各群组的结果（summarized/empty/failed）', ('result',)
+)
+
+
+def render_metrics() -> str:
+    """当前所有指标的 Prometheus 文本"""
+    return REGISTRY.render()
+
+
+async def handle_metrics(request):
+    """/metrics 请求处理函数，可挂到任意 aiohttp 应用上"""
+    # 存储等模块只记录指标，不需要加载 aiohttp
+    from aiohttp import web
+    return web.Response(body=render_metrics().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+
+class MetricsServer:
+    """单独提供 /metrics 的 HTTP 服务器（长轮询模式使用）"""
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 8080, path: str = METRICS_PATH):
+        self.host = host
+        self.port = port
+        self.path = path if path.startswith('/') else '/' + path
+        self.logger = logging.getLogger('telegram_notetaker.metrics')
+        self._runner = None
+
+    async def start(self):
+        """启动服务器（port=0 时自动分配端口）"""
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get(self.path, handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if not self.port:
+            self.port = site._server.sockets[0].getsockname()[1]
+        self.logger.info(f"指标服务已启动: http://{self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        """停止服务器"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
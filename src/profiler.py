@@ -0,0 +1,152 @@
+"""
+采样性能分析模块
+后台线程按固定间隔读取所有线程的调用栈（sys._current_frames），统计各函数出现的次数，
+不需要重启进程或挂 py-spy 即可在线找出热点；关闭时没有任何开销。
+
+结果可以输出为热点报告（自身 / 累计采样数最多的函数），也可以保存为 collapsed stack 格式
+（每行 "线程;函数;函数 次数"），直接交给 flamegraph.pl 或 speedscope 生成火焰图。
+"""
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# 线程空闲等待时所在的函数（文件名, 函数名），默认不计入热点
+IDLE_FRAMES = {
+    ('selectors.py', 'select'),
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+}
+
+# 超出 max_stacks 的新调用栈合并到这一项
+TRUNCATED_STACK = ('[其他调用栈]',)
+
+
+class SamplingProfiler:
+    """采样分析器
+
+    interval: 采样间隔（秒）
+    max_stacks: 最多保存的不同调用栈数量，超出后新的调用栈只计数不保存，内存有上限
+    include_idle: 是否统计空闲等待中的线程（事件循环等待 I/O、线程池等待任务等）
+    """
+
+    def __init__(self, interval: float = 0.005, max_stacks: int = 20000, include_idle: bool = False):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.include_idle = include_idle
+
+        self.samples = 0
+        self.idle = 0
+        self.truncated = 0
+        self.started_at: Optional[float] = None
+        self.elapsed = 0.0
+        self._stacks: Dict[Tuple[str, ...], int] = {}
+        self._labels: Dict[object, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        """开始采样"""
+        if self._thread:
+            return
+        self._stop_event.clear()
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止采样"""
+        if not self._thread:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self.elapsed = time.monotonic() - self.started_at
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._sample()
+
+    def _label(self, code) -> str:
+        """函数的显示名称：函数名 (文件名:定义行号)"""
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (
+                f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            )
+        return label
+
+    def _sample(self):
+        """记录一次所有线程的调用栈"""
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            code = frame.f_code
+            if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                self.idle += 1
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f'thread-{ident}'))
+            stack.reverse()
+            key = tuple(stack)
+            if key in self._stacks:
+                self._stacks[key] += 1
+            elif len(self._stacks) < self.max_stacks:
+                self._stacks[key] = 1
+            else:
+                self.truncated += 1
+                self._stacks[TRUNCATED_STACK] = self._stacks.get(TRUNCATED_STACK, 0) + 1
+        self.samples += 1
+
+    def top_functions(self, limit: int = 15) -> List[Tuple[str, int, int]]:
+        """按自身采样数排序的热点函数 [(函数, 自身采样数, 累计采样数)]"""
+        own: Dict[str, int] = {}
+        total: Dict[str, int] = {}
+        for stack, count in list(self._stacks.items()):
+            frames = stack[1:] or stack
+            own[frames[-1]] = own.get(frames[-1], 0) + count
+            # 递归调用在同一个调用栈中只计一次
+            for label in set(frames):
+                total[label] = total.get(label, 0) + count
+        ranked = sorted(own.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(label, count, total[label]) for label, count in ranked]
+
+    def format_report(self, limit: int = 15) -> str:
+        """热点报告文本"""
+        busy = sum(self._stacks.values())
+        lines = [
+            f"🔬 采样分析 {self.elapsed:.1f} 秒，{self.samples} 次采样"
+            f"（间隔 {self.interval * 1000:.0f} ms），活跃调用栈 {busy} 个，空闲 {self.idle} 个",
+        ]
+        if not busy:
+            lines.append("没有采集到活跃的调用栈（进程基本空闲）")
+            return '\n'.join(lines)
+        lines.append(f"\n🔥 热点函数 Top {limit}（自身% / 累计%）:")
+        for i, (label, own, total) in enumerate(self.top_functions(limit), 1):
+            lines.append(f"{i}. {own / busy * 100:5.1f}% / {total / busy * 100:5.1f}%  {label}")
+        if self.truncated:
+            lines.append(f"\n⚠️ 不同调用栈超过 {self.max_stacks} 个，{self.truncated} 个未单独保存")
+        return '\n'.join(lines)
+
+    def write_collapsed(self, path: str) -> str:
+        """保存 collapsed stack 文件（flamegraph.pl / speedscope 格式），返回文件路径"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self._stacks.items(), key=lambda item: item[1], reverse=True):
+                # 分号是调用栈的分隔符
+                f.write(f"{';'.join(frame.replace(';', ':') for frame in stack)} {count}\n")
+        os.replace(tmp_path, path)
+        return path
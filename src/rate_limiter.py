@@ -0,0 +1,84 @@
+"""
+AI 接口限流模块
+按每分钟请求数（RPM）和每分钟 token 数（TPM）对 AI 请求进行令牌桶限流，
+并在服务端返回 429 / Retry-After 时暂停所有请求
+"""
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+
+class AIRateLimitError(Exception):
+    """AI 服务端限流（429 等），retry_after 为服务端建议的等待秒数"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """令牌桶
+
+    容量为一分钟的配额，按 per_minute / 60 的速率补充。acquire() 采用预约方式：
+    令牌可以透支为负数，调用方按透支量计算需要等待的时间，
+    因此等待顺序与调用顺序一致，也不需要在 await 期间持有锁。
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        """预约 amount 个令牌，返回需要等待的秒数"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        # 单次请求超过整桶容量时按整桶计算，避免永远等待
+        self._tokens -= min(amount, self.capacity)
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class RateLimiter:
+    """RPM + TPM 组合限流器（per_minute 为 0 表示不限制该维度）"""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float = 0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._paused_until = 0.0
+
+        # 运行统计
+        self.acquired = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+        self.rate_limited = 0
+
+    async def acquire(self, tokens: int = 0) -> float:
+        """等待直到可以发送一个消耗 tokens 个 token 的请求，返回等待秒数"""
+        wait = max(0.0, self._paused_until - time.monotonic())
+        if self.requests:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+
+        self.acquired += 1
+        if wait > 0:
+            self.throttled += 1
+            self.wait_seconds += wait
+            await asyncio.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float):
+        """服务端限流时暂停所有后续请求"""
+        self.rate_limited += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限流统计"""
+        return {
+            'acquired': self.acquired,
+            'throttled': self.throttled,
+            'wait_seconds': round(self.wait_seconds, 2),
+            'rate_limited': self.rate_limited
+        }
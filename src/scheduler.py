@@ -14,15 +14,39 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config.config import Config
 from ai_summary import create_ai_summarizer
+from sqlite_pool import get_connection_manager
+from segment_index import get_segment_index
+from storage import TS_SCHEMA_VERSION, get_schema_version, timestamp_to_epoch
+from archive import Archiver
+from async_storage import run_blocking
+from metrics import SCHEDULER_CHAT_RESULTS, SCHEDULER_LAST_RUN, SCHEDULER_RUN_SECONDS
+
+# 指定时间范围内消息数达到阈值的群组（版本 2 使用 (ts, chat_id) 覆盖索引）
+ACTIVE_CHATS_SQL = '''
+    SELECT chat_id, COUNT(*) as message_count
+    FROM messages 
+    WHERE ts BETWEEN ? AND ?
+    GROUP BY chat_id
+    HAVING message_count >= ?
+'''
+
+LEGACY_ACTIVE_CHATS_SQL = '''
+    SELECT DISTINCT chat_id, COUNT(*) as message_count
+    FROM messages 
+    WHERE timestamp BETWEEN ? AND ?
+    GROUP BY chat_id
+    HAVING message_count >= ?
+'''
 
 class TaskScheduler:
     """任务调度器"""
     
-    def __init__(self, telegram_app=None):
+    def __init__(self, telegram_app=None, ai_summarizer=None):
         self.config = Config()
         self.logger = logging.getLogger('telegram_notetaker.scheduler')
         self.telegram_app = telegram_app
-        self.ai_summarizer = create_ai_summarizer()
+        # 复用 bot 的总结器，共享同一个 AI 连接池
+        self.ai_summarizer = ai_summarizer or create_ai_summarizer()
         self.running = False
         self._tasks: Set[asyncio.Task] = set()
         
@@ -60,6 +84,13 @@ class TaskScheduler:
             self._tasks.add(task)
             task.add_done_callback(self._tasks.discard)
             self.logger.info("AI 总结定时任务已启动")
+        
+        # 文件格式下定期把旧的日文件压缩归档
+        if self.config.STORAGE_FORMAT in ('json', 'jsonl') and self.config.ARCHIVE_AFTER_DAYS > 0:
+            task = asyncio.create_task(self._archive_scheduler())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            self.logger.info("冷归档定时任务已启动")
     
     def stop(self):
         """停止调度器"""
@@ -112,6 +143,24 @@ class TaskScheduler:
                 # 发生错误时等待1小时后重试
                 await asyncio.sleep(3600)
     
+    async def _archive_scheduler(self):
+        """冷归档调度器：启动时执行一次，之后按 ARCHIVE_CHECK_INTERVAL 间隔执行"""
+        while self.running:
+            try:
+                # 在存储线程池中执行（不限时），计入存储线程池统计，不占用默认线程池
+                await run_blocking(self.run_archive, timeout=0)
+                await asyncio.sleep(self.config.ARCHIVE_CHECK_INTERVAL)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                self.logger.error(f"冷归档任务错误: {e}")
+                await asyncio.sleep(3600)
+    
+    def run_archive(self) -> dict:
+        """归档 ARCHIVE_AFTER_DAYS 天之前的日文件（在存储线程池中执行，不阻塞事件循环）"""
+        cutoff = datetime.now() - timedelta(days=self.config.ARCHIVE_AFTER_DAYS)
+        return Archiver(self.config.DATA_DIR).archive_before(cutoff.strftime(self.config.FILENAME_TIME_FORMAT))
+    
     async def _execute_daily_summary(self):
         """执行每日总结"""
         self.logger.info("开始执行每日自动总结...")
@@ -126,37 +175,49 @@ class TaskScheduler:
         # 获取需要总结的群组列表
         chat_ids = await self._get_active_chats(yesterday)
         
-        summary_count = 0
+        # 并发处理各群组，实际请求速率由 AI 提供商的限流器控制
+        semaphore = asyncio.Semaphore(max(1, self.config.SUMMARY_CONCURRENCY))
+        started = datetime.now()
+        
+        results = await asyncio.gather(*(
+            self._summarize_chat(chat_id, yesterday, semaphore) for chat_id in chat_ids
+        ))
+        summary_count = sum(1 for ok in results if ok)
         
-        for chat_id in chat_ids:
+        elapsed = (datetime.now() - started).total_seconds()
+        SCHEDULER_RUN_SECONDS.observe(elapsed)
+        SCHEDULER_LAST_RUN.set(datetime.now().timestamp())
+        self.logger.info(f"每日自动总结完成，共处理 {summary_count}/{len(chat_ids)} 个群组，耗时 {elapsed:.1f} 秒")
+    
+    async def _summarize_chat(self, chat_id: int, date: datetime, semaphore: asyncio.Semaphore) -> bool:
+        """生成并发送单个群组的每日总结"""
+        async with semaphore:
             try:
-                summary = await self.ai_summarizer.generate_daily_summary(chat_id, yesterday)
+                summary = await self.ai_summarizer.generate_daily_summary(chat_id, date)
                 
                 if summary:
-                    summary_count += 1
                     self.logger.info(f"群组 {chat_id} 总结完成")
                     
                     # 如果配置了发送到群组，则发送总结
                     if self.config.SEND_SUMMARY_TO_CHAT and self.telegram_app:
-                        await self._send_summary_to_chat(chat_id, summary, yesterday)
-                
-                # 避免 API 限制，稍微延迟
-                await asyncio.sleep(2)
+                        await self._send_summary_to_chat(chat_id, summary, date)
+                    SCHEDULER_CHAT_RESULTS.inc(result='summarized')
+                    return True
+                SCHEDULER_CHAT_RESULTS.inc(result='empty')
                 
             except Exception as e:
+                SCHEDULER_CHAT_RESULTS.inc(result='failed')
                 self.logger.error(f"群组 {chat_id} 总结失败: {e}")
-                continue
-        
-        self.logger.info(f"每日自动总结完成，共处理 {summary_count} 个群组")
+            return False
     
     async def _get_active_chats(self, target_date: datetime) -> List[int]:
         """获取指定日期有活动的群组列表"""
         chat_ids = []
         
         if self.config.STORAGE_FORMAT == 'sqlite':
-            chat_ids = self._get_active_chats_from_sqlite(target_date)
-        elif self.config.STORAGE_FORMAT == 'json':
-            chat_ids = self._get_active_chats_from_json(target_date)
+            chat_ids = await run_blocking(self._get_active_chats_from_sqlite, target_date)
+        elif self.config.STORAGE_FORMAT in ('json', 'jsonl'):
+            chat_ids = await run_blocking(self._get_active_chats_from_json, target_date)
         
         # 如果配置了允许的群组列表，则过滤
         if self.config.ALLOWED_GROUPS:
@@ -166,8 +227,6 @@ class TaskScheduler:
     
     def _get_active_chats_from_sqlite(self, target_date: datetime) -> List[int]:
         """从 SQLite 获取活跃群组"""
-        import sqlite3
-        
         db_path = os.path.join(self.config.DATA_DIR, 'messages.db')
         if not os.path.exists(db_path):
             return []
@@ -175,35 +234,23 @@ class TaskScheduler:
         start_date = target_date.strftime('%Y-%m-%d 00:00:00')
         end_date = target_date.strftime('%Y-%m-%d 23:59:59')
         
-        with sqlite3.connect(db_path) as conn:
+        with get_connection_manager(db_path).reader() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT DISTINCT chat_id, COUNT(*) as message_count
-                FROM messages 
-                WHERE timestamp BETWEEN ? AND ?
-                GROUP BY chat_id
-                HAVING message_count >= ?
-            ''', (start_date, end_date, self.config.MIN_MESSAGES_FOR_SUMMARY))
+            if get_schema_version(conn) >= TS_SCHEMA_VERSION:
+                cursor.execute(ACTIVE_CHATS_SQL, (
+                    timestamp_to_epoch(start_date), timestamp_to_epoch(end_date),
+                    self.config.MIN_MESSAGES_FOR_SUMMARY
+                ))
+            else:
+                cursor.execute(LEGACY_ACTIVE_CHATS_SQL, (start_date, end_date, self.config.MIN_MESSAGES_FOR_SUMMARY))
             
             return [row[0] for row in cursor.fetchall()]
     
     def _get_active_chats_from_json(self, target_date: datetime) -> List[int]:
         """从 JSON 文件获取活跃群组"""
-        chat_ids = set()
         date_str = target_date.strftime(self.config.FILENAME_TIME_FORMAT)
-        
-        for filename in os.listdir(self.config.DATA_DIR):
-            if filename.endswith('.json') and date_str in filename:
-                # 从文件名提取 chat_id
-                try:
-                    parts = filename.replace('.json', '').split('_')
-                    if len(parts) >= 3 and parts[0] == 'chat':
-                        chat_id = -int(parts[1])  # 群组 ID 是负数
-                        chat_ids.add(chat_id)
-                except (ValueError, IndexError):
-                    continue
-        
-        return list(chat_ids)
+        index = get_segment_index(self.config.DATA_DIR)
+        return index.get_chats_for_date(date_str, self.config.MIN_MESSAGES_FOR_SUMMARY)
     
     async def _send_summary_to_chat(self, chat_id: int, summary: str, date: datetime):
         """发送总结到群组"""
@@ -212,7 +259,7 @@ class TaskScheduler:
         
         try:
             # 获取群组标题（从最近的消息中）
-            messages = self.ai_summarizer.get_messages_for_date(chat_id, date)
+            messages = await run_blocking(self.ai_summarizer.get_messages_for_date, chat_id, date)
             chat_title = messages[0].get('chat_title', f'Chat {abs(chat_id)}') if messages else f'Chat {abs(chat_id)}'
             
             # 格式化总结
@@ -221,7 +268,7 @@ class TaskScheduler:
             )
             
             # 确定发送目标：优先使用配置的报告群组，否则发送到原群组
-            target_chat_id = self.config.get_summary_report_chat_id()
+            target_chat_id = self.config.snapshot().summary_report_chat_id
             if target_chat_id == 0:
                 target_chat_id = chat_id
             
@@ -0,0 +1,363 @@
+"""
+消息分段文件目录模块
+维护 (chat_id, 日期) -> 分段文件 的持久化索引，避免每次查询都扫描整个 DATA_DIR
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config.config import Config
+from archive import iter_archive_indexes, member_path
+
+# 分段文件名: chat_<abs_chat_id>_<YYYYMMDD>[_<6 位分片序号>].<json|jsonl|txt>（旧版本的分片以 HHMMSS 命名）
+SEGMENT_FILENAME_RE = re.compile(r'^chat_(\d+)_(\d{8})(?:_\d{6})?\.(json|jsonl|txt)$')
+
+INDEX_FILENAME = 'segment_index.json'
+INDEX_VERSION = 1
+
+
+class SegmentIndex:
+    """分段文件目录
+
+    索引结构（按群组绝对 ID 分组）:
+        chats[abs_id] = {
+            'chat_id': 真实群组 ID,
+            'title': 最近的群组标题,
+            'days': {'YYYYMMDD': [{'file', 'count', 'min_ts', 'max_ts'}, ...]}
+        }
+    已归档的日期只有一个分段，额外带有 archive（归档文件）、offset、length 字段。
+    另外维护 日期 -> 群组 的反向映射，用于查找某天的活跃群组。
+    """
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self.path = os.path.join(data_dir, INDEX_FILENAME)
+        self.logger = logging.getLogger('telegram_notetaker.segment_index')
+        self._lock = threading.RLock()
+        self._chats: Dict[str, Dict[str, Any]] = {}
+        self._by_date: Dict[str, set] = {}
+        self._dirty = False
+        self._last_save = 0.0
+        self._load()
+
+    # ---------- 加载与持久化 ----------
+
+    def _load(self):
+        """加载索引，并与磁盘上最近变化的文件对账"""
+        saved_at = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == INDEX_VERSION:
+                    self._chats = data.get('chats', {})
+                    saved_at = data.get('saved_at')
+            except (json.JSONDecodeError, OSError) as e:
+                self.logger.warning(f"分段索引损坏，将重建: {e}")
+                self._chats = {}
+
+        for abs_id, chat in self._chats.items():
+            for date_str in chat['days']:
+                self._by_date.setdefault(date_str, set()).add(abs_id)
+
+        self._reconcile(saved_at)
+
+    def _reconcile(self, saved_at: Optional[float]):
+        """扫描一次数据目录，补录索引中缺失的文件
+
+        索引是定期保存的，进程异常退出后最近的写入可能没有保存。
+        只有最近两天的文件会继续增长，因此只重新统计这些文件和索引中没有的文件。
+        """
+        if not os.path.isdir(self.data_dir):
+            return
+
+        changed = self._reconcile_archives()
+        known = {
+            seg['file']
+            for chat in self._chats.values()
+            for segments in chat['days'].values()
+            for seg in segments
+            if not seg.get('archive')
+        }
+        if saved_at:
+            recent_date = (datetime.fromtimestamp(saved_at) - timedelta(days=1)).strftime('%Y%m%d')
+        else:
+            recent_date = None
+
+        present = set()
+        for filename in os.listdir(self.data_dir):
+            match = SEGMENT_FILENAME_RE.match(filename)
+            if not match:
+                continue
+            present.add(filename)
+            # 已归档日期残留的原文件由归档任务删除，不再计入索引
+            if match.group(3) != 'txt' and self.is_archived(-int(match.group(1)), match.group(2)):
+                continue
+            if filename in known and recent_date and match.group(2) < recent_date:
+                continue
+            self.rescan_file(filename)
+            changed += 1
+
+        # 移除已被删除或迁移的文件
+        for filename in known - present:
+            self._remove_file(filename)
+            changed += 1
+
+        if changed:
+            self.logger.info(f"分段索引已对账 {changed} 个文件")
+            self.save()
+
+    def _reconcile_archives(self) -> int:
+        """按归档索引补录索引中缺失的归档日期，返回补录的天数"""
+        changed = 0
+        for rel_path, date_str, entry in iter_archive_indexes(self.data_dir):
+            segments = self._chats.get(str(abs(entry['chat_id'])), {}).get('days', {}).get(date_str, [])
+            if not any(seg.get('archive') == rel_path for seg in segments):
+                self.mark_archived(entry['chat_id'], date_str, rel_path, entry)
+                changed += 1
+        return changed
+
+    def rescan_file(self, filename: str):
+        """按磁盘上的内容重新统计单个分段文件"""
+        match = SEGMENT_FILENAME_RE.match(filename)
+        if not match:
+            return
+        abs_id, date_str, ext = match.groups()
+        filepath = os.path.join(self.data_dir, filename)
+
+        chat_id = -int(abs_id)  # 群组 ID 是负数
+        title = None
+        timestamps = []
+        try:
+            if ext == 'txt':
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.startswith('['):
+                            timestamps.append(line[1:20])
+            else:
+                from storage import load_messages_file
+                messages = load_messages_file(filepath)
+                for msg in messages:
+                    timestamps.append(msg.get('timestamp', ''))
+                if messages:
+                    chat_id = messages[-1].get('chat_id', chat_id)
+                    title = messages[-1].get('chat_title')
+        except (json.JSONDecodeError, OSError, UnicodeDecodeError) as e:
+            self.logger.warning(f"无法读取分段文件 {filename}: {e}")
+            return
+
+        timestamps = [ts for ts in timestamps if ts]
+        with self._lock:
+            segment = self._get_segment(chat_id, date_str, filename)
+            segment['count'] = len(timestamps)
+            segment['min_ts'] = min(timestamps) if timestamps else None
+            segment['max_ts'] = max(timestamps) if timestamps else None
+            if title:
+                self._chats[abs_id]['title'] = title
+            self._dirty = True
+
+    def _remove_file(self, filename: str):
+        """从索引中移除一个分段文件"""
+        match = SEGMENT_FILENAME_RE.match(filename)
+        if not match:
+            return
+        abs_id, date_str, _ = match.groups()
+        with self._lock:
+            chat = self._chats.get(abs_id)
+            if not chat or date_str not in chat['days']:
+                return
+            segments = [seg for seg in chat['days'][date_str] if seg['file'] != filename]
+            if segments:
+                chat['days'][date_str] = segments
+            else:
+                del chat['days'][date_str]
+                self._by_date.get(date_str, set()).discard(abs_id)
+            self._dirty = True
+
+    def save(self):
+        """保存索引（原子写入）"""
+        with self._lock:
+            data = {
+                'version': INDEX_VERSION,
+                'saved_at': time.time(),
+                'chats': self._chats
+            }
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+    def maybe_save(self):
+        """距离上次保存超过间隔时保存索引"""
+        if self._dirty and time.monotonic() - self._last_save >= Config.SEGMENT_INDEX_SAVE_INTERVAL:
+            self.save()
+
+    def flush(self):
+        """有未保存的变更时立即保存"""
+        if self._dirty:
+            self.save()
+
+    # ---------- 写入 ----------
+
+    def _get_segment(self, chat_id: int, date_str: str, filename: str) -> Dict[str, Any]:
+        """获取（必要时创建）分段记录，调用方需持有锁"""
+        abs_id = str(abs(chat_id))
+        chat = self._chats.setdefault(abs_id, {'chat_id': chat_id, 'title': None, 'days': {}})
+        chat['chat_id'] = chat_id
+        segments = chat['days'].setdefault(date_str, [])
+        self._by_date.setdefault(date_str, set()).add(abs_id)
+
+        for segment in segments:
+            if segment['file'] == filename:
+                return segment
+
+        segment = {'file': filename, 'count': 0, 'min_ts': None, 'max_ts': None}
+        segments.append(segment)
+        segments.sort(key=lambda x: x['file'])
+        return segment
+
+    def mark_archived(self, chat_id: int, date_str: str, archive_file: str, entry: Dict[str, Any]):
+        """把某天的分段替换为归档成员"""
+        abs_id = str(abs(chat_id))
+        with self._lock:
+            chat = self._chats.setdefault(abs_id, {'chat_id': chat_id, 'title': None, 'days': {}})
+            if entry.get('title') and not chat['title']:
+                chat['title'] = entry['title']
+            chat['days'][date_str] = [{
+                'file': f"chat_{abs_id}_{date_str}.jsonl",
+                'archive': archive_file,
+                'offset': entry['offset'],
+                'length': entry['length'],
+                'count': entry['count'],
+                'min_ts': entry['min_ts'],
+                'max_ts': entry['max_ts']
+            }]
+            self._by_date.setdefault(date_str, set()).add(abs_id)
+            self._dirty = True
+
+    def record(self, filename: str, date_str: str, messages: List[Dict[str, Any]]):
+        """记录追加到分段文件中的消息"""
+        if not messages:
+            return
+        timestamps = [m['timestamp'] for m in messages if m.get('timestamp')]
+        last = messages[-1]
+
+        with self._lock:
+            segment = self._get_segment(last['chat_id'], date_str, filename)
+            segment['count'] += len(messages)
+            if timestamps:
+                lo, hi = min(timestamps), max(timestamps)
+                segment['min_ts'] = lo if segment['min_ts'] is None else min(segment['min_ts'], lo)
+                segment['max_ts'] = hi if segment['max_ts'] is None else max(segment['max_ts'], hi)
+            if last.get('chat_title'):
+                self._chats[str(abs(last['chat_id']))]['title'] = last['chat_title']
+            self._dirty = True
+
+    # ---------- 查询 ----------
+
+    def get_segments(self, chat_id: int, date_str: str) -> List[Dict[str, Any]]:
+        """获取群组某天的分段列表（按文件名排序）"""
+        with self._lock:
+            chat = self._chats.get(str(abs(chat_id)))
+            if not chat:
+                return []
+            return [dict(seg) for seg in chat['days'].get(date_str, [])]
+
+    def segment_path(self, segment: Dict[str, Any]) -> str:
+        """分段的完整路径，已归档的分段返回归档成员路径"""
+        if segment.get('archive'):
+            return member_path(os.path.join(self.data_dir, segment['archive']), segment['offset'], segment['length'])
+        return os.path.join(self.data_dir, segment['file'])
+
+    def get_segment_paths(self, chat_id: int, date_str: str, extensions=None) -> List[str]:
+        """获取群组某天的分段文件完整路径（已归档的日期返回归档成员路径）"""
+        return [
+            self.segment_path(seg)
+            for seg in self.get_segments(chat_id, date_str)
+            if extensions is None or seg['file'].endswith(tuple(extensions))
+        ]
+
+    def is_archived(self, chat_id: int, date_str: str) -> bool:
+        """某天是否已归档"""
+        with self._lock:
+            chat = self._chats.get(str(abs(chat_id)))
+            return bool(chat) and any(seg.get('archive') for seg in chat['days'].get(date_str, []))
+
+    def get_chat_dates(self, chat_id: int) -> List[str]:
+        """获取群组有消息的日期（YYYYMMDD，升序）"""
+        with self._lock:
+            chat = self._chats.get(str(abs(chat_id)))
+            return sorted(chat['days']) if chat else []
+
+    def get_chat_segments(self, chat_id: int) -> List[Dict[str, Any]]:
+        """获取群组的全部分段（按日期排序）"""
+        with self._lock:
+            chat = self._chats.get(str(abs(chat_id)))
+            if not chat:
+                return []
+            return [
+                dict(seg)
+                for date_str in sorted(chat['days'])
+                for seg in chat['days'][date_str]
+            ]
+
+    def get_chats_for_date(self, date_str: str, min_messages: int = 0) -> List[int]:
+        """获取某天有消息的群组 ID"""
+        with self._lock:
+            chat_ids = []
+            for abs_id in self._by_date.get(date_str, ()):
+                chat = self._chats[abs_id]
+                count = sum(seg['count'] for seg in chat['days'].get(date_str, []))
+                if count >= min_messages:
+                    chat_ids.append(chat['chat_id'])
+            return chat_ids
+
+    def get_chats(self) -> Dict[int, Dict[str, Any]]:
+        """获取所有群组概况: chat_id -> {title, message_count, last_ts}"""
+        with self._lock:
+            result = {}
+            for chat in self._chats.values():
+                segments = [seg for day in chat['days'].values() for seg in day]
+                max_ts = [seg['max_ts'] for seg in segments if seg['max_ts']]
+                result[chat['chat_id']] = {
+                    'title': chat['title'] or f"群组 {chat['chat_id']}",
+                    'message_count': sum(seg['count'] for seg in segments),
+                    'last_ts': max(max_ts) if max_ts else None
+                }
+            return result
+
+
+_indexes: Dict[str, SegmentIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_segment_index(data_dir: Optional[str] = None) -> SegmentIndex:
+    """获取（必要时加载）数据目录共享的分段索引"""
+    data_dir = os.path.abspath(data_dir or Config.DATA_DIR)
+    with _indexes_lock:
+        index = _indexes.get(data_dir)
+        if index is None:
+            os.makedirs(data_dir, exist_ok=True)
+            index = SegmentIndex(data_dir)
+            _indexes[data_dir] = index
+        return index
+
+
+def close_segment_index(data_dir: Optional[str] = None):
+    """保存并移除数据目录的分段索引"""
+    data_dir = os.path.abspath(data_dir or Config.DATA_DIR)
+    with _indexes_lock:
+        index = _indexes.pop(data_dir, None)
+    if index:
+        index.flush()
@@ -0,0 +1,139 @@
+"""
+SQLite 连接管理模块
+为 messages.db 提供一个长连接写入器和一组只读连接池（WAL 模式）
+"""
+import os
+import queue
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import Config
+
+
+class SQLiteConnectionManager:
+    """SQLite 连接管理器
+
+    - 写连接只有一个，由锁串行化，避免多个写事务互相等待
+    - 读连接按需创建，最多 pool_size 个，用完归还复用
+    - 所有连接使用 WAL 日志模式，读操作不会阻塞写入
+    - sqlite3 会按 SQL 文本缓存已编译的语句，调用方复用同一 SQL 字符串即可命中
+    """
+
+    def __init__(self, db_path: str, pool_size: Optional[int] = None):
+        self.db_path = db_path
+        self.pool_size = pool_size or Config.SQLITE_READ_POOL_SIZE
+        self._writer_lock = threading.Lock()
+        self._readers: queue.LifoQueue = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
+        self._closed = False
+        self._writer = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建并调优一个新连接"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=30,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={Config.SQLITE_SYNCHRONOUS}')
+        # 负数表示以 KiB 为单位
+        conn.execute(f'PRAGMA cache_size=-{Config.SQLITE_CACHE_SIZE_MB * 1024}')
+        conn.execute(f'PRAGMA mmap_size={Config.SQLITE_MMAP_SIZE_MB * 1024 * 1024}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA busy_timeout=30000')
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """获取写连接，退出时提交事务（异常时回滚）"""
+        with self._writer_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("连接管理器已关闭")
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """从连接池借出一个只读连接"""
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            # 结束可能残留的读事务，避免长期持有 WAL 快照
+            if conn.in_transaction:
+                conn.rollback()
+            if self._closed:
+                conn.close()
+            else:
+                self._readers.put(conn)
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        """取出空闲读连接，池未满时创建新连接"""
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._reader_lock:
+            if self._reader_count < self.pool_size:
+                self._reader_count += 1
+                return self._connect()
+
+        return self._readers.get()
+
+    def close(self):
+        """关闭所有连接"""
+        if self._closed:
+            return
+        self._closed = True
+
+        with self._writer_lock:
+            self._writer.close()
+
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_managers: Dict[str, SQLiteConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_db_path() -> str:
+    """获取消息数据库路径"""
+    return os.path.join(Config.DATA_DIR, 'messages.db')
+
+
+def get_connection_manager(db_path: Optional[str] = None) -> SQLiteConnectionManager:
+    """获取（必要时创建）数据库共享的连接管理器"""
+    db_path = os.path.abspath(db_path or get_db_path())
+    with _managers_lock:
+        manager = _managers.get(db_path)
+        if manager is None:
+            manager = SQLiteConnectionManager(db_path)
+            _managers[db_path] = manager
+        return manager
+
+
+def close_connection_manager(db_path: Optional[str] = None):
+    """关闭并移除数据库的连接管理器"""
+    db_path = os.path.abspath(db_path or get_db_path())
+    with _managers_lock:
+        manager = _managers.pop(db_path, None)
+    if manager:
+        manager.close()
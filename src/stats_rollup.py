@@ -0,0 +1,263 @@
+"""
+群组统计汇总模块
+写入消息时按批次增量累加每个群组的消息数、首末时间、每日 / 每小时分布、消息类型和用户发言数，
+/stats 直接读取汇总结果，不随历史消息的增长而变慢
+"""
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import Config
+
+ROLLUP_FILENAME = 'stats_rollup.json'
+ROLLUP_VERSION = 2
+
+# /stats 展示的最近天数和活跃用户数
+RECENT_DAYS = 7
+TOP_USERS = 10
+
+
+def aggregate_messages(messages: Iterable[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """把一批消息按群组汇总为增量
+
+    返回 chat_id -> {count, first_ts, last_ts, days, hours, types, users}，
+    其中 users 为 user_id -> [username, first_name, count]（用户名取批次中最新的一条）。
+    """
+    deltas: Dict[int, Dict[str, Any]] = {}
+    for message in messages:
+        delta = deltas.get(message['chat_id'])
+        if delta is None:
+            delta = deltas[message['chat_id']] = {
+                'count': 0, 'first_ts': None, 'last_ts': None,
+                'days': Counter(), 'hours': Counter(), 'types': Counter(), 'users': {}
+            }
+        delta['count'] += 1
+
+        timestamp = message.get('timestamp')
+        if timestamp:
+            # TIME_FORMAT 为 '%Y-%m-%d %H:%M:%S'，直接切片得到日期和小时
+            if delta['first_ts'] is None or timestamp < delta['first_ts']:
+                delta['first_ts'] = timestamp
+            if delta['last_ts'] is None or timestamp > delta['last_ts']:
+                delta['last_ts'] = timestamp
+            delta['days'][timestamp[:10]] += 1
+            delta['hours'][int(timestamp[11:13])] += 1
+
+        delta['types'][message.get('message_type') or 'text'] += 1
+        # 匿名管理员等没有发送者的消息记在 user_id 0 下
+        user = delta['users'].setdefault(message.get('user_id') or 0, [None, None, 0])
+        user[0] = message.get('username')
+        user[1] = message.get('first_name')
+        user[2] += 1
+    return deltas
+
+
+def build_stats(total: int, first_ts: Optional[str], last_ts: Optional[str],
+                top_users: List[Tuple], days: Dict[str, int], hours: Dict[int, int],
+                types: Dict[str, int], active_days: int) -> Dict[str, Any]:
+    """整理为 get_chat_stats() 的返回格式（两种存储后端一致）
+
+    days 只需包含最近的日期，hours 为 小时 -> 消息数。
+    """
+    recent = sorted(days.items())[-RECENT_DAYS:]
+    return {
+        'total_messages': total,
+        'date_range': (first_ts, last_ts),
+        'top_users': top_users,
+        'active_days': active_days,
+        'daily': recent,
+        'hourly': [hours.get(hour, 0) for hour in range(24)],
+        'message_types': sorted(types.items(), key=lambda item: item[1], reverse=True)
+    }
+
+
+class StatsRollup:
+    """文件存储格式的统计汇总（sidecar 文件 data/stats_rollup.json）
+
+    由 MessageStorage.save_messages() 按批次更新，定期保存；
+    sidecar 不存在时从已有的 JSON / JSONL 分段文件重建一次。
+    另外按 (群组, 文件日期) 记录已汇总的消息数（水位），加载时与分段索引对账：
+    进程在两次保存之间退出时，补录索引中多出的消息。
+    TXT 格式没有结构化字段，写入和重建都不参与汇总（TXT 存储不创建汇总）。
+    """
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self.path = os.path.join(data_dir, ROLLUP_FILENAME)
+        self.logger = logging.getLogger('telegram_notetaker.stats_rollup')
+        self._lock = threading.Lock()
+        self._chats: Dict[str, Dict[str, Any]] = {}
+        # chat_id -> {文件日期 YYYYMMDD: 已汇总的消息数}
+        self._watermarks: Dict[str, Dict[str, int]] = {}
+        self._dirty = False
+        self._last_save = 0.0
+        self._load()
+
+    def _load(self):
+        """加载 sidecar 文件并与分段索引对账，不存在、损坏或版本不符时重建"""
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == ROLLUP_VERSION:
+                    self._chats = data.get('chats', {})
+                    self._watermarks = data.get('watermarks', {})
+                    self._reconcile()
+                    return
+            except (json.JSONDecodeError, OSError) as e:
+                self.logger.warning(f"统计汇总文件损坏，将重建: {e}")
+        self.rebuild()
+
+    def _iter_day_segments(self):
+        """遍历分段索引中每个 (群组, 文件日期) 的 JSON / JSONL 分段: (chat_id, 日期, 分段路径, 消息数)"""
+        from segment_index import get_segment_index
+        from storage import MESSAGE_FILE_EXTENSIONS
+
+        index = get_segment_index(self.data_dir)
+        for chat_id in index.get_chats():
+            for date_str in index.get_chat_dates(chat_id):
+                segments = [
+                    seg for seg in index.get_segments(chat_id, date_str)
+                    if seg['file'].endswith(MESSAGE_FILE_EXTENSIONS)
+                ]
+                if segments:
+                    paths = [index.segment_path(seg) for seg in segments]
+                    yield chat_id, date_str, paths, sum(seg['count'] for seg in segments)
+
+    def _reconcile(self):
+        """补录分段索引中比水位多出的消息
+
+        同一天的分段按文件名顺序只追加不修改，跳过已汇总的条数即为缺失的消息。
+        索引中的条数少于水位（文件被截断或替换）时无法增量修正，整体重建。
+        """
+        from storage import iter_messages_file
+
+        missing = 0
+        for chat_id, date_str, paths, count in self._iter_day_segments():
+            done = self._watermarks.get(str(chat_id), {}).get(date_str, 0)
+            if count < done:
+                self.logger.warning(f"群组 {chat_id} 在 {date_str} 的消息少于统计汇总，将重建")
+                self.rebuild()
+                return
+            if count > done:
+                messages = itertools.chain.from_iterable(iter_messages_file(path) for path in paths)
+                self.record(itertools.islice(messages, done, None), date_str)
+                missing += count - done
+        if missing:
+            self.logger.info(f"统计汇总已补录 {missing} 条未保存的消息")
+            self.save()
+
+    def rebuild(self):
+        """从分段文件重新汇总（TXT 格式没有结构化字段，不参与汇总）"""
+        from storage import iter_messages_file
+
+        with self._lock:
+            self._chats = {}
+            self._watermarks = {}
+        for chat_id, date_str, paths, _ in self._iter_day_segments():
+            for path in paths:
+                self.record(iter_messages_file(path), date_str)
+        if self._chats:
+            self.logger.info(f"已从历史数据重建统计汇总，共 {len(self._chats)} 个群组")
+        self._dirty = True
+        self.save()
+
+    def record(self, messages: Iterable[Dict[str, Any]], date_str: Optional[str] = None):
+        """累加一批已保存的消息，date_str 为消息所在分段文件的日期（用于对账的水位）"""
+        deltas = aggregate_messages(messages)
+        with self._lock:
+            for chat_id, delta in deltas.items():
+                if date_str:
+                    days = self._watermarks.setdefault(str(chat_id), {})
+                    days[date_str] = days.get(date_str, 0) + delta['count']
+                chat = self._chats.get(str(chat_id))
+                if chat is None:
+                    chat = self._chats[str(chat_id)] = {
+                        'count': 0, 'first_ts': None, 'last_ts': None,
+                        'days': {}, 'hours': [0] * 24, 'types': {}, 'users': {}
+                    }
+                chat['count'] += delta['count']
+                if delta['first_ts'] and (chat['first_ts'] is None or delta['first_ts'] < chat['first_ts']):
+                    chat['first_ts'] = delta['first_ts']
+                if delta['last_ts'] and (chat['last_ts'] is None or delta['last_ts'] > chat['last_ts']):
+                    chat['last_ts'] = delta['last_ts']
+                for day, count in delta['days'].items():
+                    chat['days'][day] = chat['days'].get(day, 0) + count
+                for hour, count in delta['hours'].items():
+                    chat['hours'][hour] += count
+                for message_type, count in delta['types'].items():
+                    chat['types'][message_type] = chat['types'].get(message_type, 0) + count
+                for user_id, (username, first_name, count) in delta['users'].items():
+                    user = chat['users'].setdefault(str(user_id), [None, None, 0])
+                    user[0], user[1] = username, first_name
+                    user[2] += count
+            if deltas:
+                self._dirty = True
+
+    def get_chat_stats(self, chat_id: int) -> Dict[str, Any]:
+        """获取群组统计（只读取汇总，不扫描消息文件）"""
+        with self._lock:
+            chat = self._chats.get(str(chat_id))
+            if chat is None:
+                return build_stats(0, None, None, [], {}, {}, {}, 0)
+            top_users = sorted(chat['users'].values(), key=lambda user: user[2], reverse=True)[:TOP_USERS]
+            recent_days = dict(sorted(chat['days'].items())[-RECENT_DAYS:])
+            return build_stats(
+                chat['count'], chat['first_ts'], chat['last_ts'],
+                [tuple(user) for user in top_users], recent_days,
+                dict(enumerate(chat['hours'])), dict(chat['types']), len(chat['days'])
+            )
+
+    def save(self):
+        """保存 sidecar 文件（原子写入）"""
+        with self._lock:
+            data = {'version': ROLLUP_VERSION, 'chats': self._chats, 'watermarks': self._watermarks}
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+    def maybe_save(self):
+        """距离上次保存超过间隔时保存"""
+        if self._dirty and time.monotonic() - self._last_save >= Config.STATS_ROLLUP_SAVE_INTERVAL:
+            self.save()
+
+    def flush(self):
+        """有未保存的变更时立即保存"""
+        if self._dirty:
+            self.save()
+
+
+_rollups: Dict[str, StatsRollup] = {}
+_rollups_lock = threading.Lock()
+
+
+def get_stats_rollup(data_dir: Optional[str] = None) -> StatsRollup:
+    """获取（必要时加载）数据目录共享的统计汇总"""
+    data_dir = os.path.abspath(data_dir or Config.DATA_DIR)
+    with _rollups_lock:
+        rollup = _rollups.get(data_dir)
+        if rollup is None:
+            os.makedirs(data_dir, exist_ok=True)
+            rollup = StatsRollup(data_dir)
+            _rollups[data_dir] = rollup
+        return rollup
+
+
+def close_stats_rollup(data_dir: Optional[str] = None):
+    """保存并移除数据目录的统计汇总"""
+    data_dir = os.path.abspath(data_dir or Config.DATA_DIR)
+    with _rollups_lock:
+        rollup = _rollups.pop(data_dir, None)
+    if rollup:
+        rollup.flush()
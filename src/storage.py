@@ -1,27 +1,461 @@
 """
 数据存储模块
-支持 JSON、文本和 SQLite 格式的消息存储
+支持 JSON、JSON Lines、文本和 SQLite 格式的消息存储
 """
+import heapq
 import json
+import logging
 import os
+import re
 import sqlite3
 import sys
+import threading
+import time
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 
 # 添加项目根目录到 Python 路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from config.config import Config
+from sqlite_pool import get_connection_manager, close_connection_manager
+from segment_index import get_segment_index, close_segment_index
+from archive import is_archive_member, iter_archive_member
+from metrics import STORAGE_BYTES_WRITTEN, STORAGE_MESSAGES_WRITTEN, STORAGE_WRITE_SECONDS
+from stats_rollup import RECENT_DAYS, TOP_USERS, aggregate_messages, build_stats, close_stats_rollup, get_stats_rollup
+
+# 插入语句保持为常量，使连接的语句缓存可以复用已编译的语句
+INSERT_MESSAGE_SQL = '''
+    INSERT INTO messages (
+        message_id, chat_id, chat_title, user_id, username,
+        first_name, last_name, message_text, message_type,
+        timestamp, media_info, ts
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# 数据库结构版本（保存在 PRAGMA user_version 中）
+#   1: timestamp 文本列 + chat_id / timestamp 单列索引
+#   2: 增加整数时间戳 ts（Unix 秒）以及 (chat_id, ts)、(ts, chat_id)、(chat_id, user_id) 复合索引
+#   3: 不再保存与各列重复的 raw_data JSON，media_info 为空时存 NULL、否则存紧凑 JSON
+SCHEMA_VERSION = 3
+
+# ts 列可用的最低版本，读取方据此选择按 ts 还是按 timestamp 查询
+TS_SCHEMA_VERSION = 2
+
+SCHEMA_V2_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_chat_ts ON messages(chat_id, ts)',
+    'CREATE INDEX IF NOT EXISTS idx_ts_chat ON messages(ts, chat_id)',
+    'CREATE INDEX IF NOT EXISTS idx_chat_user ON messages(chat_id, user_id)',
+)
+
+# 按 id 范围分批迁移旧数据，每批一个短事务，不阻塞消息写入：
+# 回填 ts，清空重复的 raw_data，把 json.dumps(None) 写入的 'null' 改为 NULL
+MIGRATE_ROWS_SQL = '''
+    UPDATE messages SET
+        ts = COALESCE(ts, CAST(strftime('%s', timestamp, 'utc') AS INTEGER)),
+        raw_data = NULL,
+        media_info = NULLIF(media_info, 'null')
+    WHERE id > ? AND id <= ?
+'''
+
+# 分片文件名末尾的 6 位序号（旧版本的分片以 HHMMSS 命名，同样按序号比较）
+SHARD_SUFFIX_RE = re.compile(r'_\d{8}_(\d{6})\.\w+$')
+
+# 消息字典的字段，也是读取消息时查询的列（顺序与保存的消息字典一致）
+MESSAGE_FIELDS = (
+    'message_id', 'chat_id', 'chat_title', 'user_id', 'username', 'first_name',
+    'last_name', 'message_text', 'message_type', 'timestamp', 'media_info'
+)
+MESSAGE_COLUMNS = ', '.join(MESSAGE_FIELDS)
+
+# 全量扫描的统计查询（/stats 改为读取汇总表，这些查询作为汇总结果的参考）
+COUNT_CHAT_MESSAGES_SQL = 'SELECT COUNT(*) FROM messages WHERE chat_id = ?'
+
+TOP_USERS_SQL = '''
+    SELECT username, first_name, COUNT(*) as count
+    FROM messages 
+    WHERE chat_id = ? 
+    GROUP BY user_id 
+    ORDER BY count DESC 
+    LIMIT 10
+'''
+
+CHAT_DATE_RANGE_SQL = '''
+    SELECT datetime(MIN(ts), 'unixepoch', 'localtime'), datetime(MAX(ts), 'unixepoch', 'localtime')
+    FROM messages 
+    WHERE chat_id = ?
+'''
+
+# 统计汇总表：写入消息时在同一事务中按批次累加，/stats 只按主键读取少量行
+ROLLUP_TABLES_SQL = (
+    '''
+    CREATE TABLE IF NOT EXISTS chat_stats (
+        chat_id INTEGER PRIMARY KEY,
+        message_count INTEGER NOT NULL,
+        first_ts TEXT,
+        last_ts TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS chat_daily_stats (
+        chat_id INTEGER, day TEXT, message_count INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, day)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS chat_hourly_stats (
+        chat_id INTEGER, hour INTEGER, message_count INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, hour)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS chat_type_stats (
+        chat_id INTEGER, message_type TEXT, message_count INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, message_type)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS chat_user_stats (
+        chat_id INTEGER, user_id INTEGER, username TEXT, first_name TEXT, message_count INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, user_id)
+    ) WITHOUT ROWID
+    ''',
+)
+
+UPSERT_CHAT_STATS_SQL = '''
+    INSERT INTO chat_stats (chat_id, message_count, first_ts, last_ts) VALUES (?, ?, ?, ?)
+    ON CONFLICT(chat_id) DO UPDATE SET
+        message_count = message_count + excluded.message_count,
+        first_ts = CASE WHEN first_ts IS NULL OR excluded.first_ts < first_ts THEN excluded.first_ts ELSE first_ts END,
+        last_ts = CASE WHEN last_ts IS NULL OR excluded.last_ts > last_ts THEN excluded.last_ts ELSE last_ts END
+'''
+
+UPSERT_DAILY_STATS_SQL = '''
+    INSERT INTO chat_daily_stats (chat_id, day, message_count) VALUES (?, ?, ?)
+    ON CONFLICT(chat_id, day) DO UPDATE SET message_count = message_count + excluded.message_count
+'''
+
+UPSERT_HOURLY_STATS_SQL = '''
+    INSERT INTO chat_hourly_stats (chat_id, hour, message_count) VALUES (?, ?, ?)
+    ON CONFLICT(chat_id, hour) DO UPDATE SET message_count = message_count + excluded.message_count
+'''
+
+UPSERT_TYPE_STATS_SQL = '''
+    INSERT INTO chat_type_stats (chat_id, message_type, message_count) VALUES (?, ?, ?)
+    ON CONFLICT(chat_id, message_type) DO UPDATE SET message_count = message_count + excluded.message_count
+'''
+
+UPSERT_USER_STATS_SQL = '''
+    INSERT INTO chat_user_stats (chat_id, user_id, username, first_name, message_count) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(chat_id, user_id) DO UPDATE SET
+        username = excluded.username,
+        first_name = excluded.first_name,
+        message_count = message_count + excluded.message_count
+'''
+
+# 汇总表首次创建时清空并从已有消息一次性汇总
+REBUILD_ROLLUPS_SQL = (
+    'DELETE FROM chat_stats',
+    'DELETE FROM chat_daily_stats',
+    'DELETE FROM chat_hourly_stats',
+    'DELETE FROM chat_type_stats',
+    'DELETE FROM chat_user_stats',
+    '''
+    INSERT INTO chat_stats (chat_id, message_count, first_ts, last_ts)
+    SELECT chat_id, COUNT(*), MIN(timestamp), MAX(timestamp) FROM messages GROUP BY chat_id
+    ''',
+    '''
+    INSERT INTO chat_daily_stats (chat_id, day, message_count)
+    SELECT chat_id, substr(timestamp, 1, 10), COUNT(*) FROM messages
+    WHERE timestamp IS NOT NULL GROUP BY chat_id, substr(timestamp, 1, 10)
+    ''',
+    '''
+    INSERT INTO chat_hourly_stats (chat_id, hour, message_count)
+    SELECT chat_id, CAST(substr(timestamp, 12, 2) AS INTEGER), COUNT(*) FROM messages
+    WHERE timestamp IS NOT NULL GROUP BY chat_id, CAST(substr(timestamp, 12, 2) AS INTEGER)
+    ''',
+    '''
+    INSERT INTO chat_type_stats (chat_id, message_type, message_count)
+    SELECT chat_id, COALESCE(message_type, 'text'), COUNT(*) FROM messages
+    GROUP BY chat_id, COALESCE(message_type, 'text')
+    ''',
+    '''
+    INSERT INTO chat_user_stats (chat_id, user_id, username, first_name, message_count)
+    SELECT chat_id, uid, username, first_name, n FROM (
+        -- 与 MAX(id) 同时查询时，用户名取自该用户最新的一条消息
+        SELECT chat_id, COALESCE(user_id, 0) AS uid, username, first_name, COUNT(*) AS n, MAX(id)
+        FROM messages GROUP BY chat_id, uid
+    )
+    ''',
+)
+
+SELECT_CHAT_STATS_SQL = 'SELECT message_count, first_ts, last_ts FROM chat_stats WHERE chat_id = ?'
+SELECT_TOP_USERS_SQL = '''
+    SELECT username, first_name, message_count FROM chat_user_stats
+    WHERE chat_id = ? ORDER BY message_count DESC LIMIT ?
+'''
+SELECT_RECENT_DAYS_SQL = '''
+    SELECT day, message_count FROM chat_daily_stats
+    WHERE chat_id = ? ORDER BY day DESC LIMIT ?
+'''
+SELECT_ACTIVE_DAYS_SQL = 'SELECT COUNT(*) FROM chat_daily_stats WHERE chat_id = ?'
+SELECT_HOURLY_STATS_SQL = 'SELECT hour, message_count FROM chat_hourly_stats WHERE chat_id = ?'
+SELECT_TYPE_STATS_SQL = 'SELECT message_type, message_count FROM chat_type_stats WHERE chat_id = ?'
+
+def timestamp_to_epoch(timestamp: Optional[str]) -> Optional[int]:
+    """把 TIME_FORMAT 格式的本地时间字符串转换为 Unix 秒"""
+    if not timestamp:
+        return None
+    try:
+        return int(datetime.strptime(timestamp, Config.TIME_FORMAT).timestamp())
+    except ValueError:
+        return None
+
+
+def get_schema_version(conn) -> int:
+    """读取数据库结构版本，ts 列回填完成前为 1"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def encode_media_info(media_info: Optional[Dict[str, Any]]) -> Optional[str]:
+    """把媒体信息编码为紧凑 JSON，没有媒体时返回 NULL"""
+    if media_info is None:
+        return None
+    return json.dumps(media_info, ensure_ascii=False, separators=(',', ':'))
+
+
+def decode_message_row(row) -> Dict[str, Any]:
+    """把按 MESSAGE_COLUMNS 查询到的行还原为保存时的消息字典"""
+    message = {field: row[field] for field in MESSAGE_FIELDS}
+    media_info = message['media_info']
+    message['media_info'] = json.loads(media_info) if media_info else None
+    return message
+
+
+# 消息文件扩展名（JSON 数组格式与 JSON Lines 格式）
+MESSAGE_FILE_EXTENSIONS = ('.json', '.jsonl')
+
+# 全文搜索索引：外部内容 FTS5 表（只保存倒排索引，正文仍在 messages 表中）。
+# trigram 分词器按 3 个字符切分，中文无需分词词典即可做子串匹配。
+FTS_TABLE_SQL = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        message_text,
+        content='messages',
+        content_rowid='id',
+        tokenize='trigram'
+    )
+'''
+
+# 触发器保持 FTS 索引与 messages 表同步
+FTS_TRIGGERS_SQL = (
+    '''
+    CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, message_text) VALUES (new.id, new.message_text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, message_text) VALUES ('delete', old.id, old.message_text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF message_text ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, message_text) VALUES ('delete', old.id, old.message_text);
+        INSERT INTO messages_fts(rowid, message_text) VALUES (new.id, new.message_text);
+    END
+    ''',
+)
+
+# trigram 索引只能匹配至少 3 个字符的关键词，更短的关键词用 LIKE 过滤
+FTS_MIN_TERM_LENGTH = 3
+
+SEARCH_COLUMNS = 'm.id, m.chat_id, m.chat_title, m.username, m.first_name, m.last_name, m.message_text, m.timestamp'
+
+
+def load_messages_file(filepath: str) -> List[Dict[str, Any]]:
+    """读取消息文件，兼容 JSON 数组、JSON Lines 格式与归档成员路径"""
+    if is_archive_member(filepath):
+        return list(iter_archive_member(filepath))
+    if filepath.endswith('.jsonl'):
+        messages = []
+        with open(filepath, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    messages.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # 进程异常退出时最后一行可能不完整，跳过即可
+                    continue
+        return messages
+    
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def repair_jsonl_tail(filepath: str, chunk_size: int = 1 << 16) -> bool:
+    """修复进程异常退出时留下的不完整末行，返回是否修改了文件
+
+    末行本身是完整的 JSON（只缺换行符）时补上换行符，否则截断到上一个换行符，
+    避免之后追加的消息和残缺的内容拼成同一行。
+    """
+    try:
+        f = open(filepath, 'r+b')
+    except FileNotFoundError:
+        return False
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        if end == 0:
+            return False
+        f.seek(end - 1)
+        if f.read(1) == b'\n':
+            return False
+
+        # 向前查找最后一个换行符
+        pos = end
+        line_start = 0
+        while pos > 0:
+            start = max(0, pos - chunk_size)
+            f.seek(start)
+            i = f.read(pos - start).rfind(b'\n')
+            if i >= 0:
+                line_start = start + i + 1
+                break
+            pos = start
+
+        f.seek(line_start)
+        try:
+            json.loads(f.read(end - line_start).decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            f.truncate(line_start)
+        else:
+            f.seek(end)
+            f.write(b'\n')
+        return True
+
+
+def iter_messages_file(filepath: str, chunk_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """流式逐条读取消息文件，兼容 JSON 数组、JSON Lines 格式与归档成员路径"""
+    if is_archive_member(filepath):
+        yield from iter_archive_member(filepath)
+        return
+    with open(filepath, 'r', encoding='utf-8') as f:
+        if filepath.endswith('.jsonl'):
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+        else:
+            yield from _iter_json_array(f, chunk_size)
+
+
+def _iter_json_array(f, chunk_size: int) -> Iterator[Dict[str, Any]]:
+    """增量解析 JSON 数组，每次只在内存中保留一个数据块"""
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+    started = False
+    
+    while True:
+        # 跳过空白和分隔符，必要时读取下一块
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buf = buf[pos:] + chunk
+            pos = 0
+        
+        if pos >= len(buf):
+            return
+        
+        if not started:
+            if buf[pos] != '[':
+                raise json.JSONDecodeError("Expecting '['", buf, pos)
+            started = True
+            pos += 1
+            continue
+        
+        if buf[pos] == ']':
+            return
+        
+        try:
+            obj, pos = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # 对象跨越了数据块边界，读入更多数据后重试
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        
+        yield obj
+        
+        if pos > chunk_size:
+            buf = buf[pos:]
+            pos = 0
+
+
+def iter_messages_in_range(filepaths: Iterable[str], start_ts: str, end_ts: str) -> Iterator[Dict[str, Any]]:
+    """按时间顺序流式读取多个分段文件中 [start_ts, end_ts] 范围内的消息
+
+    时间戳格式为 '%Y-%m-%d %H:%M:%S'，可以直接按字符串比较。
+
+    要求每个分段文件内的消息按时间戳非递减排列：读到超过 end_ts 的消息后即停止读取该文件，
+    heapq.merge 也只有在每路输入有序时才能输出有序结果。写入路径保证这一点——
+    同一群组的消息按到达顺序（Telegram 的 message.date）追加，溢出和轮转只写入更新的分段，
+    归档按分段索引顺序原样拼接。合并或重写分段的工具必须先按时间戳排序再写入，
+    否则超过 end_ts 之后的消息会被漏读。
+    """
+    def _iter_file(filepath: str) -> Iterator[Dict[str, Any]]:
+        try:
+            for msg in iter_messages_file(filepath):
+                ts = msg.get('timestamp')
+                if not ts or ts < start_ts:
+                    continue
+                if ts > end_ts:
+                    return
+                yield msg
+        except (json.JSONDecodeError, OSError):
+            return
+    
+    yield from heapq.merge(*(_iter_file(p) for p in filepaths), key=lambda m: m['timestamp'])
+
 
 class MessageStorage:
     """消息存储类"""
     
     def __init__(self):
         self.config = Config()
+        # JSONL 格式下每个群组当前打开的追加文件: chat_id -> 文件状态
+        self._jsonl_files: Dict[int, Dict[str, Any]] = {}
+        self.index = None
+        self.rollup = None
+        self.fts_enabled = False
+        self._migration_thread: Optional[threading.Thread] = None
+        self._migration_stop = threading.Event()
         self.ensure_directories()
         
         if self.config.STORAGE_FORMAT == 'sqlite':
             self.init_database()
+        else:
+            # 文件格式使用分段索引定位 (chat_id, 日期) 对应的文件
+            self.index = get_segment_index(self.config.DATA_DIR)
+            # TXT 格式没有结构化字段，写入和重建都不参与统计汇总
+            if self.config.STORAGE_FORMAT != 'txt':
+                self.rollup = get_stats_rollup(self.config.DATA_DIR)
     
     def ensure_directories(self):
         """确保存储目录存在"""
@@ -30,9 +464,13 @@ class MessageStorage:
             os.makedirs(self.config.MEDIA_DIR, exist_ok=True)
     
     def init_database(self):
-        """初始化 SQLite 数据库"""
-        db_path = os.path.join(self.config.DATA_DIR, 'messages.db')
-        with sqlite3.connect(db_path) as conn:
+        """初始化 SQLite 数据库，旧版本数据库在后台在线迁移"""
+        with get_connection_manager().writer() as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages'"
+            ).fetchone()
+            version = get_schema_version(conn)
+            
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS messages (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -47,82 +485,349 @@ class MessageStorage:
                     message_type TEXT,
                     timestamp DATETIME,
                     media_info TEXT,
-                    raw_data TEXT
+                    ts INTEGER
                 )
             ''')
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_id ON messages(chat_id)')
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON messages(timestamp)')
+            
+            if not exists:
+                for index_sql in SCHEMA_V2_INDEXES:
+                    conn.execute(index_sql)
+                conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+                version = SCHEMA_VERSION
+            elif version < SCHEMA_VERSION:
+                # 新增列是常数时间操作，新写入的消息从现在起直接带 ts
+                columns = {row[1] for row in conn.execute('PRAGMA table_info(messages)')}
+                if 'ts' not in columns:
+                    conn.execute('ALTER TABLE messages ADD COLUMN ts INTEGER')
+                if version < TS_SCHEMA_VERSION:
+                    conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_id ON messages(chat_id)')
+                    conn.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON messages(timestamp)')
+                migrate_up_to = conn.execute('SELECT COALESCE(MAX(id), 0) FROM messages').fetchone()[0]
+            
+            self.fts_enabled = self._init_fts(conn)
+            self._init_rollups(conn)
+        
+        if version < SCHEMA_VERSION:
+            self._start_migration(migrate_up_to, version)
+    
+    def _start_migration(self, max_id: int, from_version: int):
+        """启动后台线程把数据库迁移到当前版本"""
+        self._migration_thread = threading.Thread(
+            target=self._migrate, args=(max_id, from_version), name='sqlite-migration', daemon=True
+        )
+        self._migration_thread.start()
+    
+    def _migrate(self, max_id: int, from_version: int):
+        """分批迁移旧数据，完成后创建复合索引并删除旧索引
+
+        迁移期间读取方通过 get_schema_version() 判断，版本 2 之前继续使用 timestamp 列的旧查询。
+        raw_data 列只清空不删除：DROP COLUMN 会在写锁下重写整张表，
+        释放的页会被新消息复用，需要缩小文件时可离线执行 VACUUM。
+        """
+        logger = logging.getLogger('telegram_notetaker.storage')
+        manager = get_connection_manager()
+        batch_size = self.config.SQLITE_MIGRATION_BATCH_SIZE
+        logger.info(f"开始把数据库从版本 {from_version} 迁移到 {SCHEMA_VERSION}，共 {max_id} 条消息")
+        
+        last_id = 0
+        while last_id < max_id:
+            if self._migration_stop.is_set():
+                logger.info(f"数据库迁移已暂停于 id {last_id}，下次启动时继续")
+                return
+            with manager.writer() as conn:
+                conn.execute(MIGRATE_ROWS_SQL, (last_id, last_id + batch_size))
+            last_id += batch_size
+            # 让出写连接，消息写入可以穿插在批次之间
+            time.sleep(0.01)
+        
+        with manager.writer() as conn:
+            if from_version < TS_SCHEMA_VERSION:
+                for index_sql in SCHEMA_V2_INDEXES:
+                    conn.execute(index_sql)
+                conn.execute('DROP INDEX IF EXISTS idx_chat_id')
+                conn.execute('DROP INDEX IF EXISTS idx_timestamp')
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        logger.info(f"数据库已迁移到版本 {SCHEMA_VERSION}")
+    
+    def wait_for_migration(self, timeout: Optional[float] = None) -> bool:
+        """等待后台迁移完成，返回是否已完成"""
+        if self._migration_thread:
+            self._migration_thread.join(timeout)
+            return not self._migration_thread.is_alive()
+        return True
+    
+    def _init_fts(self, conn) -> bool:
+        """创建全文搜索索引，首次创建时为已有消息建立索引"""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        ).fetchone()
+        try:
+            conn.execute(FTS_TABLE_SQL)
+        except sqlite3.OperationalError as e:
+            # SQLite 未编译 FTS5 或版本低于 3.34（没有 trigram 分词器）
+            logging.getLogger('telegram_notetaker.storage').warning(
+                f"无法创建全文搜索索引，搜索将使用 LIKE 扫描: {e}"
+            )
+            return False
+        
+        for trigger_sql in FTS_TRIGGERS_SQL:
+            conn.execute(trigger_sql)
+        
+        if not exists and conn.execute('SELECT 1 FROM messages LIMIT 1').fetchone():
+            logging.getLogger('telegram_notetaker.storage').info("正在为已有消息建立全文搜索索引...")
+            conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+        return True
+    
+    def _init_rollups(self, conn):
+        """创建统计汇总表，首次创建时汇总已有消息"""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_stats'"
+        ).fetchone()
+        for table_sql in ROLLUP_TABLES_SQL:
+            conn.execute(table_sql)
+        
+        if not exists and conn.execute('SELECT 1 FROM messages LIMIT 1').fetchone():
+            logging.getLogger('telegram_notetaker.storage').info("正在为已有消息生成统计汇总...")
+            for rebuild_sql in REBUILD_ROLLUPS_SQL:
+                conn.execute(rebuild_sql)
     
     def save_message(self, message_data: Dict[str, Any]):
         """保存消息"""
-        if self.config.STORAGE_FORMAT == 'json':
-            self._save_to_json(message_data)
-        elif self.config.STORAGE_FORMAT == 'txt':
-            self._save_to_txt(message_data)
-        elif self.config.STORAGE_FORMAT == 'sqlite':
-            self._save_to_sqlite(message_data)
-    
-    def _save_to_json(self, message_data: Dict[str, Any]):
-        """保存到 JSON 文件"""
-        chat_id = message_data['chat_id']
+        self.save_messages([message_data])
+    
+    def save_messages(self, messages: List[Dict[str, Any]]):
+        """批量保存消息（每个文件/事务只写一次）"""
+        if not messages:
+            return
+        
+        backend = self.config.STORAGE_FORMAT
+        started = time.perf_counter()
+        written = 0
+        # 文件格式按写入日期分文件，整批使用同一个日期
         date_str = datetime.now().strftime(self.config.FILENAME_TIME_FORMAT)
-        filename = f"chat_{abs(chat_id)}_{date_str}.json"
-        filepath = os.path.join(self.config.DATA_DIR, filename)
+        if backend == 'json':
+            written = self._save_to_json(messages, date_str)
+        elif backend == 'jsonl':
+            written = self._save_to_jsonl(messages, date_str)
+        elif backend == 'txt':
+            written = self._save_to_txt(messages, date_str)
+        elif backend == 'sqlite':
+            written = self._save_to_sqlite(messages)
+        STORAGE_WRITE_SECONDS.observe(time.perf_counter() - started, backend=backend)
+        STORAGE_MESSAGES_WRITTEN.inc(len(messages), backend=backend)
+        STORAGE_BYTES_WRITTEN.inc(written, backend=backend)
         
-        # 读取现有数据
-        messages = []
-        if os.path.exists(filepath):
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    messages = json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError):
-                messages = []
-        
-        # 添加新消息
-        messages.append(message_data)
-        
-        # 检查是否需要分割文件
-        if len(messages) > self.config.MAX_MESSAGES_PER_FILE:
-            # 创建新的文件
-            timestamp = datetime.now().strftime("%H%M%S")
-            filename = f"chat_{abs(chat_id)}_{date_str}_{timestamp}.json"
-            filepath = os.path.join(self.config.DATA_DIR, filename)
-            messages = [message_data]
+        if self.index:
+            self.index.maybe_save()
+        if self.rollup:
+            self.rollup.record(messages, date_str)
+            self.rollup.maybe_save()
+    
+    def _group_by_chat(self, messages: List[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+        """按群组分组，保持组内消息顺序"""
+        groups: Dict[int, List[Dict[str, Any]]] = {}
+        for message_data in messages:
+            groups.setdefault(message_data['chat_id'], []).append(message_data)
+        return groups
+    
+    def _save_to_json(self, messages: List[Dict[str, Any]], date_str: str) -> int:
+        """保存到 JSON 文件，返回写入的字节数（每次重写整个文件）"""
+        written = 0
+        
+        for chat_id, chat_messages in self._group_by_chat(messages).items():
+            # 续写当天最新的分片文件（基础文件名排序在分片文件之前）
+            existing = self.index.get_segment_paths(chat_id, date_str, ['.json'])
+            if existing:
+                filepath = existing[-1]
+            else:
+                filepath = os.path.join(self.config.DATA_DIR, f"chat_{abs(chat_id)}_{date_str}.json")
+            
+            # 读取现有数据
+            file_messages = []
+            if os.path.exists(filepath):
+                try:
+                    file_messages = load_messages_file(filepath)
+                except (json.JSONDecodeError, FileNotFoundError):
+                    file_messages = []
+            
+            # 检查是否需要分割文件：当前文件写满后，剩余消息写入新的分片
+            room = max(self.config.MAX_MESSAGES_PER_FILE - len(file_messages), 0)
+            if chat_messages[:room]:
+                written += self._write_json_file(filepath, file_messages + chat_messages[:room])
+                self.index.record(os.path.basename(filepath), date_str, chat_messages[:room])
+            
+            overflow = chat_messages[room:]
+            for start in range(0, len(overflow), self.config.MAX_MESSAGES_PER_FILE):
+                shard = overflow[start:start + self.config.MAX_MESSAGES_PER_FILE]
+                filename = self._next_shard_filename(chat_id, date_str, '.json')
+                written += self._write_json_file(os.path.join(self.config.DATA_DIR, filename), shard)
+                self.index.record(filename, date_str, shard)
+        return written
+    
+    def _next_shard_filename(self, chat_id: int, date_str: str, extension: str) -> str:
+        """群组当天下一个分片的文件名
         
-        # 保存数据
-        with open(filepath, 'w', encoding='utf-8') as f:
+        序号为当天已有分片的最大序号加一，按 6 位补零，文件名顺序与写入顺序一致，
+        同一秒内多次分割也不会重名。新分片写入后需立即记入索引。
+        """
+        last = 0
+        for seg in self.index.get_segments(chat_id, date_str):
+            match = SHARD_SUFFIX_RE.search(seg['file'])
+            if match:
+                last = max(last, int(match.group(1)))
+        return f"chat_{abs(chat_id)}_{date_str}_{last + 1:06d}{extension}"
+    
+    def _write_json_file(self, filepath: str, messages: List[Dict[str, Any]]) -> int:
+        """原子地写入 JSON 文件，避免读取方看到写了一半的文件；返回文件大小"""
+        tmp_path = filepath + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(messages, f, ensure_ascii=False, indent=2)
+            size = f.tell()
+        os.replace(tmp_path, filepath)
+        return size
     
-    def _save_to_txt(self, message_data: Dict[str, Any]):
-        """保存到文本文件"""
-        chat_id = message_data['chat_id']
-        date_str = datetime.now().strftime(self.config.FILENAME_TIME_FORMAT)
-        filename = f"chat_{abs(chat_id)}_{date_str}.txt"
+    def _save_to_jsonl(self, messages: List[Dict[str, Any]], date_str: str) -> int:
+        """追加到 JSON Lines 文件（每条消息一行，O(1) 写入），返回写入的字节数"""
+        touched = []
+        written = 0
+        
+        for chat_id, chat_messages in self._group_by_chat(messages).items():
+            state = self._jsonl_files.get(chat_id)
+            if state is None or state['date_str'] != date_str:
+                if state is not None:
+                    self._close_jsonl_file(state)
+                state = self._open_jsonl_file(chat_id, date_str)
+                self._jsonl_files[chat_id] = state
+            
+            lines = []
+            pending = []
+            for message_data in chat_messages:
+                # 检查是否需要分割文件
+                if state['count'] >= self.config.MAX_MESSAGES_PER_FILE:
+                    written += self._write_lines(state['file'], lines)
+                    self.index.record(os.path.basename(state['path']), date_str, pending)
+                    lines = []
+                    pending = []
+                    self._close_jsonl_file(state)
+                    filename = self._next_shard_filename(chat_id, date_str, '.jsonl')
+                    state = self._open_jsonl_file(chat_id, date_str, filename)
+                    self._jsonl_files[chat_id] = state
+                
+                lines.append(json.dumps(message_data, ensure_ascii=False) + '\n')
+                pending.append(message_data)
+                state['count'] += 1
+            
+            written += self._write_lines(state['file'], lines)
+            state['file'].flush()
+            self.index.record(os.path.basename(state['path']), date_str, pending)
+            touched.append(state)
+        
+        # 按 fsync 策略落盘
+        now = time.monotonic()
+        for state in touched:
+            if now - state['last_fsync'] >= self.config.JSONL_FSYNC_INTERVAL:
+                os.fsync(state['file'].fileno())
+                state['last_fsync'] = now
+        return written
+    
+    @staticmethod
+    def _write_lines(f, lines: List[str]) -> int:
+        """写入若干行，返回 UTF-8 字节数"""
+        data = ''.join(lines)
+        f.write(data)
+        return len(data.encode('utf-8'))
+    
+    def _open_jsonl_file(self, chat_id: int, date_str: str, filename: Optional[str] = None) -> Dict[str, Any]:
+        """打开（或续写）群组当天的 JSONL 文件"""
+        if filename is None:
+            # 续写当天最新的分片文件（基础文件名排序在分片文件之前）
+            existing = [
+                seg for seg in self.index.get_segments(chat_id, date_str)
+                if seg['file'].endswith('.jsonl') and not seg.get('archive')
+            ]
+            filename = existing[-1]['file'] if existing else f"chat_{abs(chat_id)}_{date_str}.jsonl"
         filepath = os.path.join(self.config.DATA_DIR, filename)
         
-        # 格式化消息文本
-        timestamp = message_data['timestamp']
-        user_info = f"{message_data['first_name']} {message_data.get('last_name', '')}".strip()
-        if message_data.get('username'):
-            user_info += f" (@{message_data['username']})"
+        # 修复异常退出留下的不完整末行，并按磁盘内容重新统计该分段
+        if repair_jsonl_tail(filepath):
+            logging.getLogger('telegram_notetaker.storage').warning(f"已修复 {filename} 末尾不完整的行")
+            self.index.rescan_file(filename)
+        
+        # 已有行数来自索引，用于文件分割判断
+        count = 0
+        for seg in self.index.get_segments(chat_id, date_str):
+            if seg['file'] == filename:
+                count = seg['count']
         
-        message_line = f"[{timestamp}] {user_info}: {message_data['message_text']}\n"
+        return {
+            'path': filepath,
+            'date_str': date_str,
+            'file': open(filepath, 'a', encoding='utf-8'),
+            'count': count,
+            'last_fsync': time.monotonic()
+        }
+    
+    def _close_jsonl_file(self, state: Dict[str, Any]):
+        """刷新并关闭 JSONL 文件"""
+        f = state['file']
+        if f.closed:
+            return
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+    
+    def flush(self):
+        """将缓冲中的数据写入磁盘"""
+        for state in self._jsonl_files.values():
+            if not state['file'].closed:
+                state['file'].flush()
+                os.fsync(state['file'].fileno())
+                state['last_fsync'] = time.monotonic()
+    
+    def close(self):
+        """关闭所有打开的文件和数据库连接"""
+        for state in self._jsonl_files.values():
+            self._close_jsonl_file(state)
+        self._jsonl_files.clear()
         
-        # 追加到文件
-        with open(filepath, 'a', encoding='utf-8') as f:
-            f.write(message_line)
+        if self.config.STORAGE_FORMAT == 'sqlite':
+            # 中断的迁移在下次启动时从头检查 ts IS NULL 的行继续
+            self._migration_stop.set()
+            self.wait_for_migration()
+            close_connection_manager()
+        else:
+            if self.rollup:
+                close_stats_rollup(self.config.DATA_DIR)
+            close_segment_index(self.config.DATA_DIR)
     
-    def _save_to_sqlite(self, message_data: Dict[str, Any]):
-        """保存到 SQLite 数据库"""
-        db_path = os.path.join(self.config.DATA_DIR, 'messages.db')
-        with sqlite3.connect(db_path) as conn:
-            conn.execute('''
-                INSERT INTO messages (
-                    message_id, chat_id, chat_title, user_id, username,
-                    first_name, last_name, message_text, message_type,
-                    timestamp, media_info, raw_data
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+    def _save_to_txt(self, messages: List[Dict[str, Any]], date_str: str) -> int:
+        """保存到文本文件，返回写入的字节数"""
+        written = 0
+        
+        for chat_id, chat_messages in self._group_by_chat(messages).items():
+            filename = f"chat_{abs(chat_id)}_{date_str}.txt"
+            filepath = os.path.join(self.config.DATA_DIR, filename)
+            
+            # 格式化消息文本
+            lines = []
+            for message_data in chat_messages:
+                timestamp = message_data['timestamp']
+                user_info = f"{message_data['first_name']} {message_data.get('last_name') or ''}".strip()
+                if message_data.get('username'):
+                    user_info += f" (@{message_data['username']})"
+                
+                lines.append(f"[{timestamp}] {user_info}: {message_data['message_text']}\n")
+            
+            # 追加到文件
+            with open(filepath, 'a', encoding='utf-8') as f:
+                written += self._write_lines(f, lines)
+            self.index.record(filename, date_str, chat_messages)
+        return written
+    
+    def _save_to_sqlite(self, messages: List[Dict[str, Any]]) -> int:
+        """保存到 SQLite 数据库（整批在一个事务中写入），返回行数据的字节数"""
+        rows = [
+            (
                 message_data['message_id'],
                 message_data['chat_id'],
                 message_data['chat_title'],
@@ -133,9 +838,114 @@ class MessageStorage:
                 message_data['message_text'],
                 message_data['message_type'],
                 message_data['timestamp'],
-                json.dumps(message_data.get('media_info')),
-                json.dumps(message_data)
-            ))
+                encode_media_info(message_data.get('media_info')),
+                timestamp_to_epoch(message_data['timestamp'])
+            )
+            for message_data in messages
+        ]
+        
+        with get_connection_manager().writer() as conn:
+            conn.executemany(INSERT_MESSAGE_SQL, rows)
+            self._update_rollups(conn, messages)
+        # 文本按 UTF-8 计算，整数按 8 字节计算（不含索引和页面开销）
+        return sum(
+            len(value.encode('utf-8')) if isinstance(value, str) else 8
+            for row in rows for value in row if value is not None
+        )
+    
+    def _update_rollups(self, conn, messages: List[Dict[str, Any]]):
+        """在写入消息的同一事务中累加统计汇总表"""
+        deltas = aggregate_messages(messages)
+        conn.executemany(UPSERT_CHAT_STATS_SQL, [
+            (chat_id, d['count'], d['first_ts'], d['last_ts']) for chat_id, d in deltas.items()
+        ])
+        conn.executemany(UPSERT_DAILY_STATS_SQL, [
+            (chat_id, day, count) for chat_id, d in deltas.items() for day, count in d['days'].items()
+        ])
+        conn.executemany(UPSERT_HOURLY_STATS_SQL, [
+            (chat_id, hour, count) for chat_id, d in deltas.items() for hour, count in d['hours'].items()
+        ])
+        conn.executemany(UPSERT_TYPE_STATS_SQL, [
+            (chat_id, message_type, count) for chat_id, d in deltas.items() for message_type, count in d['types'].items()
+        ])
+        conn.executemany(UPSERT_USER_STATS_SQL, [
+            (chat_id, user_id, username, first_name, count)
+            for chat_id, d in deltas.items()
+            for user_id, (username, first_name, count) in d['users'].items()
+        ])
+    
+    def search_messages(self, query: str, chat_id: Optional[int] = None,
+                        limit: int = 10, offset: int = 0) -> Tuple[List[Dict[str, Any]], bool]:
+        """搜索消息文本（所有关键词都需出现），按时间倒序分页
+
+        返回 (本页结果, 是否还有下一页)。
+        """
+        terms = query.split()
+        if not terms:
+            return [], False
+        
+        if self.config.STORAGE_FORMAT == 'sqlite':
+            rows = self._search_sqlite(terms, chat_id, limit + 1, offset)
+        else:
+            rows = self._search_files(terms, chat_id, limit + 1, offset)
+        return rows[:limit], len(rows) > limit
+    
+    def _search_sqlite(self, terms: List[str], chat_id: Optional[int], limit: int, offset: int) -> List[Dict[str, Any]]:
+        """使用 FTS5 索引搜索，关键词过短或没有索引时退化为 LIKE"""
+        fts_terms = [t for t in terms if len(t) >= FTS_MIN_TERM_LENGTH] if self.fts_enabled else []
+        like_terms = [t for t in terms if t not in fts_terms]
+        
+        params: List[Any] = []
+        if fts_terms:
+            sql = f'''
+                SELECT {SEARCH_COLUMNS} FROM messages_fts
+                JOIN messages m ON m.id = messages_fts.rowid
+                WHERE messages_fts MATCH ?
+            '''
+            # 每个关键词作为短语匹配，避免 FTS5 查询语法注入
+            params.append(' '.join('"' + t.replace('"', '""') + '"' for t in fts_terms))
+            order_by = 'messages_fts.rowid DESC'
+        else:
+            sql = f'SELECT {SEARCH_COLUMNS} FROM messages m WHERE 1 = 1'
+            order_by = 'm.id DESC'
+        
+        if chat_id is not None:
+            sql += ' AND m.chat_id = ?'
+            params.append(chat_id)
+        for term in like_terms:
+            sql += " AND m.message_text LIKE ? ESCAPE '\\'"
+            escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f'%{escaped}%')
+        sql += f' ORDER BY {order_by} LIMIT ? OFFSET ?'
+        params.extend([limit, offset])
+        
+        with get_connection_manager().reader() as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+    
+    def _search_files(self, terms: List[str], chat_id: Optional[int], limit: int, offset: int) -> List[Dict[str, Any]]:
+        """在分段文件中顺序扫描搜索（从最新的分段开始，够数即停）"""
+        terms = [t.lower() for t in terms]
+        chat_ids = [chat_id] if chat_id is not None else list(self.index.get_chats())
+        segments = [
+            seg
+            for cid in chat_ids
+            for seg in self.index.get_chat_segments(cid)
+            if seg['file'].endswith(MESSAGE_FILE_EXTENSIONS)
+        ]
+        segments.sort(key=lambda seg: seg['max_ts'] or '', reverse=True)
+        
+        needed = offset + limit
+        matches: List[Dict[str, Any]] = []
+        for seg in segments:
+            # 剩余分段都比已找到的第 needed 条结果更早时停止
+            if len(matches) >= needed and (seg['max_ts'] or '') < matches[needed - 1]['timestamp']:
+                break
+            for msg in iter_messages_file(self.index.segment_path(seg)):
+                text = (msg.get('message_text') or '').lower()
+                if all(term in text for term in terms):
+                    matches.append(msg)
+            matches.sort(key=lambda m: m.get('timestamp', ''), reverse=True)
+        return matches[offset:offset + limit]
     
     def get_chat_stats(self, chat_id: int) -> Dict[str, Any]:
         """获取群组统计信息"""
@@ -145,47 +955,21 @@ class MessageStorage:
             return self._get_file_stats(chat_id)
     
     def _get_sqlite_stats(self, chat_id: int) -> Dict[str, Any]:
-        """从 SQLite 获取统计信息"""
-        db_path = os.path.join(self.config.DATA_DIR, 'messages.db')
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            
-            # 总消息数
-            cursor.execute('SELECT COUNT(*) FROM messages WHERE chat_id = ?', (chat_id,))
-            total_messages = cursor.fetchone()[0]
-            
-            # 用户统计
-            cursor.execute('''
-                SELECT username, first_name, COUNT(*) as count
-                FROM messages 
-                WHERE chat_id = ? 
-                GROUP BY user_id 
-                ORDER BY count DESC 
-                LIMIT 10
-            ''', (chat_id,))
-            user_stats = cursor.fetchall()
-            
-            # 日期范围
-            cursor.execute('''
-                SELECT MIN(timestamp), MAX(timestamp) 
-                FROM messages 
-                WHERE chat_id = ?
-            ''', (chat_id,))
-            date_range = cursor.fetchone()
-            
-            return {
-                'total_messages': total_messages,
-                'top_users': user_stats,
-                'date_range': date_range
-            }
+        """从 SQLite 统计汇总表获取统计信息"""
+        with get_connection_manager().reader() as conn:
+            row = conn.execute(SELECT_CHAT_STATS_SQL, (chat_id,)).fetchone()
+            total, first_ts, last_ts = tuple(row) if row else (0, None, None)
+            top_users = [tuple(r) for r in conn.execute(SELECT_TOP_USERS_SQL, (chat_id, TOP_USERS))]
+            days = dict(tuple(r) for r in conn.execute(SELECT_RECENT_DAYS_SQL, (chat_id, RECENT_DAYS)))
+            active_days = conn.execute(SELECT_ACTIVE_DAYS_SQL, (chat_id,)).fetchone()[0]
+            hours = dict(tuple(r) for r in conn.execute(SELECT_HOURLY_STATS_SQL, (chat_id,)))
+            types = dict(tuple(r) for r in conn.execute(SELECT_TYPE_STATS_SQL, (chat_id,)))
+        return build_stats(total, first_ts, last_ts, top_users, days, hours, types, active_days)
     
     def _get_file_stats(self, chat_id: int) -> Dict[str, Any]:
-        """从文件获取统计信息"""
-        # 简单的文件统计实现
-        pattern = f"chat_{abs(chat_id)}_"
-        message_files = [f for f in os.listdir(self.config.DATA_DIR) if f.startswith(pattern)]
-        
-        return {
-            'total_files': len(message_files),
-            'files': message_files
-        }
\ No newline at end of file
+        """从统计汇总获取统计信息，并附带分段文件列表（TXT 格式只有文件列表）"""
+        stats = self.rollup.get_chat_stats(chat_id) if self.rollup else {}
+        message_files = [seg['file'] for seg in self.index.get_chat_segments(chat_id)]
+        stats['total_files'] = len(message_files)
+        stats['files'] = message_files
+        return stats
@@ -0,0 +1,171 @@
+"""
+总结缓存模块
+按 (群组, 消息内容摘要, 模型, 语言, 长度, 风格) 的哈希缓存 AI 总结，
+消息窗口没有变化时直接复用，避免重复调用 AI 接口
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import Config
+from metrics import SUMMARY_CACHE_LOOKUPS
+from async_storage import run_blocking
+
+CACHE_FILENAME = 'summary_cache.json'
+
+
+def make_cache_key(chat_id: int, content_digest: str, **params) -> str:
+    """计算缓存键，params 为影响输出的生成参数（模型、语言、长度、风格等）"""
+    payload = json.dumps(
+        {'chat_id': chat_id, 'digest': content_digest, 'params': params},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SummaryCache:
+    """带 TTL 和 LRU 淘汰的总结缓存
+
+    条目持久化到 SUMMARY_DIR 旁边的 summary_cache.json，重启后仍然有效；
+    put() 只修改内存，由 get_or_compute() 在存储线程池中落盘。
+    get_or_compute() 对相同的键做单飞（single-flight）合并：
+    并发的相同请求只会触发一次 AI 调用，其余请求等待同一个结果。
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None):
+        self.path = path or os.path.join(os.path.dirname(Config.SUMMARY_DIR), CACHE_FILENAME)
+        self.ttl = ttl if ttl is not None else Config.SUMMARY_CACHE_TTL
+        self.max_entries = max_entries or Config.SUMMARY_CACHE_MAX_ENTRIES
+        self.logger = logging.getLogger('telegram_notetaker.summary_cache')
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._dirty = False
+
+        # 运行统计
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._load()
+
+    def _load(self):
+        """加载缓存文件，丢弃已过期的条目"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            self.logger.warning(f"总结缓存文件损坏，将重建: {e}")
+            return
+
+        now = time.time()
+        # 文件中按最近使用顺序保存，最后一个是最近使用的
+        for key, entry in data.get('entries', []):
+            if now - entry.get('created_at', 0) < self.ttl:
+                self._entries[key] = entry
+        self._evict()
+
+    def save(self):
+        """保存缓存文件（原子写入）"""
+        with self._lock:
+            data = {'entries': list(self._entries.items())}
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _evict(self):
+        """淘汰最久未使用的条目，调用方需持有锁或处于初始化阶段"""
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        """读取未过期的缓存总结"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry['created_at'] >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry['summary']
+
+    def put(self, key: str, summary: str):
+        """写入缓存（只修改内存，调用 flush() 落盘）"""
+        with self._lock:
+            self._entries[key] = {'summary': summary, 'created_at': time.time()}
+            self._entries.move_to_end(key)
+            self._evict()
+            self._dirty = True
+
+    def flush(self):
+        """有未保存的变更时保存，写入失败只记录日志"""
+        if not self._dirty:
+            return
+        try:
+            self.save()
+        except OSError as e:
+            self.logger.error(f"保存总结缓存失败: {e}")
+
+    async def get_or_compute(self, key: str, factory: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """命中缓存直接返回，否则调用 factory 生成；相同键的并发请求共享一次调用
+
+        factory 在独立的任务中运行，所有请求（包括发起者）都通过 shield 等待，
+        任何一个请求被取消都不会影响其他等待者。
+        """
+        summary = self.get(key)
+        if summary is not None:
+            self.hits += 1
+            SUMMARY_CACHE_LOOKUPS.inc(result='hit')
+            return summary
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            SUMMARY_CACHE_LOOKUPS.inc(result='coalesced')
+        else:
+            self.misses += 1
+            SUMMARY_CACHE_LOOKUPS.inc(result='miss')
+            task = asyncio.ensure_future(self._compute(key, factory))
+            # 所有等待者都已取消时避免 "exception was never retrieved" 警告
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _compute(self, key: str, factory: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """调用 factory 生成总结，成功时写入缓存并在存储线程池中落盘"""
+        try:
+            summary = await factory()
+            if summary:
+                self.put(key, summary)
+                try:
+                    await run_blocking(self.flush)
+                except Exception as e:
+                    self.logger.error(f"保存总结缓存失败: {e}")
+            return summary
+        finally:
+            self._inflight.pop(key, None)
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取缓存统计"""
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced
+        }
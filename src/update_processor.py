@@ -0,0 +1,93 @@
+"""
+更新调度模块
+不同群组的 Update 并发处理，同一群组内严格按到达顺序处理；
+生成 AI 总结这类耗时的回调走单独的通道，不占用普通消息的处理名额，
+这样总结运行期间消息记录的延迟不受影响。
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+# Application 侧允许同时等待调度的 Update 数量上限（超出时在 Application 中排队）
+MAX_PENDING_UPDATES = 10000
+
+
+class ChatOrderedDispatcher:
+    """按群组保序的并发调度器
+
+    每个群组维护一条"前一个 Update 完成"的链：进入 run() 时同步登记到链尾，
+    因此同一 key 的协程按调用 run() 的顺序依次执行，不依赖锁的唤醒顺序。
+    普通 Update 最多 max_in_flight 个同时执行；heavy=True 的协程不参与群组排序，
+    最多 heavy_concurrency 个同时执行。key 为 None 时不排序。
+    """
+
+    def __init__(self, max_in_flight: int = 8, heavy_concurrency: int = 1):
+        self.max_in_flight = max(1, max_in_flight)
+        self.heavy_concurrency = max(1, heavy_concurrency)
+        self.logger = logging.getLogger('telegram_notetaker.dispatcher')
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._heavy_slots = asyncio.Semaphore(self.heavy_concurrency)
+        self._tails: Dict[Hashable, asyncio.Future] = {}
+
+        self.in_flight = 0
+        self.heavy_in_flight = 0
+        self.processed = 0
+        self.heavy_processed = 0
+        self.peak_in_flight = 0
+
+    async def run(self, key: Optional[Hashable], coroutine: Awaitable[Any], heavy: bool = False) -> Any:
+        """按调度规则执行协程，返回协程的结果"""
+        if heavy:
+            async with self._heavy_slots:
+                self.heavy_in_flight += 1
+                try:
+                    return await coroutine
+                finally:
+                    self.heavy_in_flight -= 1
+                    self.heavy_processed += 1
+
+        if key is None:
+            return await self._run_in_slot(coroutine)
+
+        # 在第一个 await 之前登记，保证同一群组的顺序与调用顺序一致
+        previous = self._tails.get(key)
+        done = asyncio.get_running_loop().create_future()
+        self._tails[key] = done
+        try:
+            if previous is not None:
+                await asyncio.shield(previous)
+            return await self._run_in_slot(coroutine)
+        finally:
+            if previous is not None and not previous.done():
+                # 等待中被取消：前一个完成后再放行后面的 Update
+                previous.add_done_callback(lambda _: self._release(key, done))
+            else:
+                self._release(key, done)
+
+    def _release(self, key: Hashable, done: asyncio.Future):
+        """放行链上的下一个 Update；自己仍是链尾时移除该群组"""
+        done.set_result(None)
+        if self._tails.get(key) is done:
+            del self._tails[key]
+
+    async def _run_in_slot(self, coroutine: Awaitable[Any]) -> Any:
+        """占用一个普通处理名额执行协程"""
+        async with self._slots:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                return await coroutine
+            finally:
+                self.in_flight -= 1
+                self.processed += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取调度统计信息"""
+        return {
+            'in_flight': self.in_flight,
+            'heavy_in_flight': self.heavy_in_flight,
+            'processed': self.processed,
+            'heavy_processed': self.heavy_processed,
+            'peak_in_flight': self.peak_in_flight,
+            'active_chats': len(self._tails),
+        }
@@ -0,0 +1,121 @@
+"""
+Webhook 服务器模块
+内嵌 aiohttp HTTP 服务器接收 Telegram 推送的 Update，替代 run_polling 的长轮询。
+收到的 Update 校验密钥后放入 Application 的 update_queue，由 Application 按
+MAX_CONCURRENT_UPDATES 并发处理；请求本身立即返回，不等待处理完成。
+
+路由:
+    POST <WEBHOOK_PATH>  Telegram 推送的 Update（校验 X-Telegram-Bot-Api-Secret-Token）
+    GET  /healthz        健康检查，返回待处理数量和计数
+    GET  /metrics        Prometheus 指标（设置 metrics_path 时）
+"""
+import asyncio
+import hmac
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+from aiohttp import web
+
+from metrics import handle_metrics
+
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+HEALTH_PATH = '/healthz'
+
+
+class WebhookServer:
+    """接收 Telegram Webhook 的 HTTP 服务器
+
+    parse_update 把请求体（dict）转换成放入队列的对象，例如
+    lambda data: Update.de_json(data, application.bot)；转换结果为 None 时丢弃。
+    服务器本身不依赖 python-telegram-bot，便于本地压测。
+    """
+
+    def __init__(self, update_queue: asyncio.Queue, parse_update: Callable[[Dict[str, Any]], Any],
+                 secret_token: str = '', path: str = '/webhook',
+                 host: str = '0.0.0.0', port: int = 8080, metrics_path: Optional[str] = None):
+        self.update_queue = update_queue
+        self.parse_update = parse_update
+        self.secret_token = secret_token
+        self.path = path if path.startswith('/') else '/' + path
+        self.host = host
+        self.port = port
+        self.metrics_path = metrics_path
+        self.logger = logging.getLogger('telegram_notetaker.webhook')
+
+        self.received = 0
+        self.rejected = 0
+        self.invalid = 0
+        self._started_at: Optional[float] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None
+
+    async def _handle_update(self, request: web.Request) -> web.Response:
+        """处理一次 Telegram 推送"""
+        if self.secret_token:
+            token = request.headers.get(SECRET_TOKEN_HEADER, '')
+            if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+                self.rejected += 1
+                return web.Response(status=403)
+
+        try:
+            data = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            self.invalid += 1
+            return web.Response(status=400)
+
+        try:
+            update = self.parse_update(data)
+        except Exception as e:
+            # 无法解析的 Update 返回 200，避免 Telegram 反复重试同一条
+            self.invalid += 1
+            self.logger.error(f"解析 Update 失败: {e}")
+            return web.Response()
+
+        if update is not None:
+            await self.update_queue.put(update)
+            self.received += 1
+        return web.Response()
+
+    async def _handle_health(self, request: web.Request) -> web.Response:
+        """健康检查"""
+        uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+        return web.json_response({
+            'status': 'ok',
+            'pending': self.update_queue.qsize(),
+            'received': self.received,
+            'rejected': self.rejected,
+            'invalid': self.invalid,
+            'uptime': round(uptime, 1),
+        })
+
+    def make_app(self) -> web.Application:
+        """创建 aiohttp 应用"""
+        app = web.Application()
+        app.router.add_post(self.path, self._handle_update)
+        app.router.add_get(HEALTH_PATH, self._handle_health)
+        if self.metrics_path:
+            app.router.add_get(self.metrics_path, handle_metrics)
+        return app
+
+    async def start(self):
+        """启动服务器（port=0 时自动分配端口）"""
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if not self.port:
+            self.port = site._server.sockets[0].getsockname()[1]
+        self._started_at = time.monotonic()
+        self.logger.info(f"Webhook 服务器已启动: http://{self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        """停止服务器，已接收的 Update 仍留在队列中由 Application 处理"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+            self.logger.info("Webhook 服务器已停止")
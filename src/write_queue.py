@@ -0,0 +1,172 @@
+"""
+消息写入队列模块
+在事件循环和 MessageStorage 之间提供有界的异步批量写入（write-behind）
+"""
+import asyncio
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import Config
+
+# 停止信号
+_STOP = object()
+
+# 队列满时检查空位的间隔（秒）
+PUT_POLL_INTERVAL = 0.01
+
+
+class MessageWriteQueue:
+    """消息批量写入队列
+
+    handle_message 只负责把消息放入有界队列，后台写入线程按批量大小或
+    时间间隔调用 storage.save_messages 落盘。队列满时 put() 在事件循环上
+    异步轮询等待空位（背压），不占用线程池，事件循环本身也不会被阻塞。
+    """
+
+    def __init__(self, storage, maxsize: Optional[int] = None,
+                 batch_size: Optional[int] = None, flush_interval: Optional[float] = None):
+        self.storage = storage
+        self.batch_size = batch_size or Config.WRITE_BATCH_SIZE
+        self.flush_interval = flush_interval or Config.WRITE_FLUSH_INTERVAL
+        self.logger = logging.getLogger('telegram_notetaker.write_queue')
+        self._queue: queue.Queue = queue.Queue(maxsize or Config.WRITE_QUEUE_MAXSIZE)
+        self._thread: Optional[threading.Thread] = None
+
+        # 运行统计
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.backpressure_waits = 0
+        self.batches = 0
+
+    def start(self):
+        """启动后台写入线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='message-writer', daemon=True)
+        self._thread.start()
+        self.logger.info(
+            f"消息写入队列已启动 (容量: {self._queue.maxsize}, 批量: {self.batch_size}, "
+            f"间隔: {self.flush_interval}s)"
+        )
+
+    async def put(self, message_data: Dict[str, Any]) -> bool:
+        """放入一条消息，队列满时异步等待空位，超时则丢弃并返回 False"""
+        try:
+            self._queue.put_nowait(message_data)
+            self.enqueued += 1
+            return True
+        except queue.Full:
+            pass
+
+        # 背压：异步轮询等待空位，不在共享线程池中阻塞线程
+        self.backpressure_waits += 1
+        self.logger.warning(f"消息写入队列已满 ({self._queue.maxsize})，等待写入线程腾出空间")
+        deadline = time.monotonic() + Config.WRITE_QUEUE_PUT_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(PUT_POLL_INTERVAL)
+            try:
+                self._queue.put_nowait(message_data)
+                self.enqueued += 1
+                return True
+            except queue.Full:
+                continue
+
+        self.dropped += 1
+        self.logger.error("消息写入队列持续已满，丢弃消息")
+        return False
+
+    def _run(self):
+        """写入线程主循环"""
+        stopping = False
+        dirty = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # 空闲时把尚未 fsync 的数据落盘
+                if dirty:
+                    self._flush_storage()
+                    dirty = False
+                continue
+
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._write_batch(batch)
+            dirty = True
+
+        # 退出前写完队列中剩余的消息
+        remaining = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                remaining.append(item)
+        for i in range(0, len(remaining), self.batch_size):
+            self._write_batch(remaining[i:i + self.batch_size])
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        """写入一批消息"""
+        try:
+            self.storage.save_messages(batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.dropped += len(batch)
+            self.logger.error(f"批量写入 {len(batch)} 条消息失败: {e}")
+
+    def _flush_storage(self):
+        """刷新存储层缓冲"""
+        try:
+            self.storage.flush()
+        except Exception as e:
+            self.logger.error(f"刷新存储缓冲失败: {e}")
+
+    def stop(self, timeout: float = 30.0):
+        """停止写入线程，并等待队列中的消息全部落盘"""
+        if not self._thread:
+            return
+        # 停止信号必须进入队列，队列满时等待写入线程消费
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            self.logger.error(f"消息写入线程未能在 {timeout} 秒内退出，剩余 {self._queue.qsize()} 条消息")
+        else:
+            self.logger.info(f"消息写入队列已停止，共写入 {self.written} 条消息")
+        self._thread = None
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取队列统计信息"""
+        return {
+            'pending': self._queue.qsize(),
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'backpressure_waits': self.backpressure_waits
+        }
@@ -0,0 +1,82 @@
+"""
+测试公共工具
+临时数据目录、测试消息构造和 AI 总结测试的公共配置，各测试模块通过 from conftest import ... 使用
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+
+from config.config import Config
+from storage import MessageStorage
+
+# AI 总结测试使用的配置（OPENAI_BASE_URL / SUMMARY_DIR 由测试在启动模拟服务器后设置）
+AI_OVERRIDES = {
+    'ENABLE_AI_SUMMARY': True,
+    'AI_PROVIDER': 'openai',
+    'OPENAI_API_KEY': 'test-key',
+    'OPENAI_BASE_URL': '',
+    'SUMMARY_DIR': '',
+    'MIN_MESSAGES_FOR_SUMMARY': 1,
+    'AI_RATE_LIMIT_RPM': 0,
+    'AI_RATE_LIMIT_TPM': 0,
+}
+
+
+def _make_message(i: int, chat_id: int = -1001234567890, timestamp: str = '2024-01-01 10:00:00'):
+    """构造测试消息"""
+    return {
+        'message_id': i,
+        'chat_id': chat_id,
+        'chat_title': '测试群组',
+        'user_id': 1000 + i % 3,
+        'username': f'user{i % 3}',
+        'first_name': '张三',
+        'last_name': None,
+        'message_text': f'第 {i} 条消息',
+        'message_type': 'text',
+        'timestamp': timestamp,
+        'media_info': None
+    }
+
+
+class _TempDataDir:
+    """临时替换 Config 的数据目录和存储格式"""
+
+    def __init__(self, storage_format: str, **overrides):
+        self.storage_format = storage_format
+        self.overrides = overrides
+        self.saved = {}
+
+    def __enter__(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        values = {'DATA_DIR': self.tmp.name, 'STORAGE_FORMAT': self.storage_format}
+        values.update(self.overrides)
+        for key, value in values.items():
+            self.saved[key] = getattr(Config, key)
+            setattr(Config, key, value)
+        return self.tmp.name
+
+    def __exit__(self, *exc):
+        for key, value in self.saved.items():
+            setattr(Config, key, value)
+        self.tmp.cleanup()
+
+
+def _write_day(count: int):
+    """写入今天的测试消息（分段文件按写入日期命名）"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    storage = MessageStorage()
+    storage.save_messages([
+        dict(_make_message(i, timestamp=f'{today} {i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}'),
+             message_text=f'第 {i} 条消息，讨论项目进度和下一步计划')
+        for i in range(count)
+    ])
+    storage.close()
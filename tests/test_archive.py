@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+冷归档测试
+验证旧日文件压缩进归档后，读取方通过分段索引透明读取，索引丢失或中断后可以恢复
+"""
+
+import gzip
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+sys.path.append(current_dir)
+
+from archive import Archiver, archive_filename, is_archive_member
+from ai_summary import AISummarizer
+from segment_index import INDEX_FILENAME, close_segment_index, get_segment_index
+from storage import MESSAGE_FILE_EXTENSIONS, MessageStorage, load_messages_file
+from conftest import _TempDataDir, _make_message
+
+CHAT_ID = -1001234567890
+DATES = ['20240110', '20240111', '20240215', '20240301']
+
+
+def _write_days(data_dir: str):
+    """直接写入几天的 JSON / JSONL 日文件，返回 日期 -> 消息列表"""
+    days = {}
+    for n, date_str in enumerate(DATES):
+        day = datetime.strptime(date_str, '%Y%m%d').strftime('%Y-%m-%d')
+        messages = [_make_message(n * 100 + i, timestamp=f'{day} 10:00:{i:02d}') for i in range(20)]
+        filename = f"chat_{abs(CHAT_ID)}_{date_str}"
+        if n % 2:
+            with open(os.path.join(data_dir, filename + '.jsonl'), 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(m, ensure_ascii=False) + '\n' for m in messages)
+        else:
+            with open(os.path.join(data_dir, filename + '.json'), 'w', encoding='utf-8') as f:
+                json.dump(messages, f, ensure_ascii=False, indent=2)
+        days[date_str] = messages
+    return days
+
+
+def _read_day(data_dir: str, date_str: str):
+    """通过分段索引读取某天的消息"""
+    index = get_segment_index(data_dir)
+    return [
+        msg
+        for path in index.get_segment_paths(CHAT_ID, date_str, MESSAGE_FILE_EXTENSIONS)
+        for msg in load_messages_file(path)
+    ]
+
+
+def test_archive_and_read_transparently():
+    """归档后原文件删除，按天读取、流式读取与归档前一致"""
+    with _TempDataDir('json') as data_dir:
+        days = _write_days(data_dir)
+        storage = MessageStorage()
+
+        stats = Archiver(data_dir).archive_before('20240301')
+        assert stats['days'] == 3 and stats['files'] == 3
+        assert stats['bytes_after'] < stats['bytes_before']
+        assert sorted(f for f in os.listdir(data_dir) if f.startswith('chat_')) == [
+            f"chat_{abs(CHAT_ID)}_20240301.jsonl"
+        ]
+
+        for date_str, messages in days.items():
+            assert _read_day(data_dir, date_str) == messages
+        assert is_archive_member(get_segment_index(data_dir).get_segment_paths(CHAT_ID, '20240111')[0])
+
+        summarizer = AISummarizer()
+        streamed = list(summarizer.iter_messages_for_date(CHAT_ID, datetime(2024, 1, 11)))
+        assert streamed == days['20240111']
+
+        # 整个归档仍是合法的多成员 gzip 文件
+        with gzip.open(os.path.join(data_dir, archive_filename(CHAT_ID, '20240110')), 'rt', encoding='utf-8') as f:
+            assert len(f.readlines()) == 40
+
+        # 再次运行不会重复归档
+        assert Archiver(data_dir).archive_before('20240301')['days'] == 0
+        storage.close()
+
+
+def test_index_recovered_from_archive():
+    """分段索引丢失后从归档索引恢复，中断残留的原文件被清理"""
+    with _TempDataDir('jsonl') as data_dir:
+        days = _write_days(data_dir)
+        leftover = os.path.join(data_dir, f"chat_{abs(CHAT_ID)}_20240111.jsonl")
+        shutil.copy(leftover, leftover + '.bak')
+        get_segment_index(data_dir)
+        Archiver(data_dir).archive_before('20240301')
+        close_segment_index(data_dir)
+
+        # 模拟归档写入后、删除原文件前退出，并且分段索引丢失
+        os.replace(leftover + '.bak', leftover)
+        os.remove(os.path.join(data_dir, INDEX_FILENAME))
+
+        assert _read_day(data_dir, '20240111') == days['20240111']
+        assert get_segment_index(data_dir).is_archived(CHAT_ID, '20240111')
+        assert Archiver(data_dir).archive_before('20240301')['files'] == 1
+        assert not os.path.exists(leftover)
+        assert _read_day(data_dir, '20240215') == days['20240215']
+        close_segment_index(data_dir)
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
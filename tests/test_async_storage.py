@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+异步存储门面和事件循环监控测试
+验证阻塞读取在线程池中执行不阻塞事件循环、超时报错，以及监控记录阻塞位置
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import pytest
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+sys.path.append(current_dir)
+
+from async_storage import AsyncStorage, StorageTimeoutError, get_executor_stats, run_blocking
+from loop_monitor import LoopLagMonitor
+from storage import MessageStorage
+from conftest import _TempDataDir, _make_message
+
+
+def test_facade_runs_off_loop():
+    """存储调用在线程池中执行，期间事件循环继续处理其他协程"""
+    with _TempDataDir('sqlite'):
+        storage = MessageStorage()
+        async_storage = AsyncStorage(storage)
+
+        async def scenario():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.005)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            for i in range(5):
+                await async_storage.save_message(_make_message(i))
+            await run_blocking(time.sleep, 0.1)
+            stats = await async_storage.get_chat_stats(-1001234567890)
+            task.cancel()
+            return ticks, stats
+
+        ticks, stats = asyncio.run(scenario())
+        storage.close()
+        assert stats['total_messages'] == 5
+        assert ticks >= 5
+        assert get_executor_stats()['calls'] >= 7
+
+
+def test_timeout():
+    """超过超时时间抛出 StorageTimeoutError"""
+    async def scenario():
+        await run_blocking(time.sleep, 0.2, timeout=0.05)
+
+    calls_before = get_executor_stats()['timeouts']
+    with pytest.raises(StorageTimeoutError):
+        asyncio.run(scenario())
+    assert get_executor_stats()['timeouts'] == calls_before + 1
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def _block_the_loop():
+    time.sleep(0.3)
+
+
+def test_loop_monitor_reports_blocking_stack():
+    """阻塞事件循环的调用被记录，日志中包含阻塞位置"""
+    handler = _ListHandler()
+    logger = logging.getLogger('telegram_notetaker.loop_monitor')
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+    async def scenario():
+        monitor = LoopLagMonitor(threshold=0.1, interval=0.02)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        _block_the_loop()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        return monitor.get_stats()
+
+    try:
+        stats = asyncio.run(scenario())
+    finally:
+        logger.removeHandler(handler)
+    assert stats['stalls'] == 1 and stats['max_lag_ms'] >= 200
+    assert any('_block_the_loop' in message for message in handler.messages)
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
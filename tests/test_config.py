@@ -11,6 +11,7 @@ import sys
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)
 sys.path.append(project_root)
+sys.path.append(current_dir)
 
 def test_imports():
     """测试模块导入"""
@@ -78,17 +79,21 @@ def test_storage():
     
     try:
         from src.storage import MessageStorage
-        
-        storage = MessageStorage()
-        print("✅ 存储模块初始化成功")
-        
-        # 测试目录创建
         from config.config import Config
-        if os.path.exists(Config.DATA_DIR):
-            print(f"✅ 数据目录存在: {Config.DATA_DIR}")
-        else:
-            print(f"❌ 数据目录不存在: {Config.DATA_DIR}")
-            return False
+        from conftest import _TempDataDir
+        
+        # 在临时数据目录中初始化，不在工作目录的 data/ 下生成索引和统计汇总文件
+        with _TempDataDir(Config.STORAGE_FORMAT) as data_dir:
+            storage = MessageStorage()
+            print("✅ 存储模块初始化成功")
+            storage.close()
+            
+            # 测试目录创建
+            if os.path.exists(data_dir):
+                print(f"✅ 数据目录可以创建: {data_dir}")
+            else:
+                print(f"❌ 数据目录未能创建: {data_dir}")
+                return False
         
         if os.path.exists(Config.LOG_DIR):
             print(f"✅ 日志目录存在: {Config.LOG_DIR}")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+配置快照测试
+验证允许的群组 / 管理员只解析一次，.env 修改后重新加载，删除的变量随之失效
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+import config.config as config_module
+from config.config import Config
+
+
+def _write_env(path: str, text: str, mtime: float):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.utime(path, (mtime, mtime))
+
+
+def test_snapshot_reload_on_env_change():
+    """.env 修改时间变化时重新解析，未变化时不重复解析"""
+    if {'ALLOWED_GROUPS', 'ADMIN_IDS'} & config_module._PROCESS_ENV_KEYS:
+        pytest.skip('进程环境变量中已设置 ALLOWED_GROUPS / ADMIN_IDS')
+
+    saved_env_file = config_module.ENV_FILE
+    with tempfile.TemporaryDirectory() as tmp:
+        env_file = os.path.join(tmp, '.env')
+        config_module.ENV_FILE = env_file
+        try:
+            _write_env(env_file, 'ALLOWED_GROUPS=-100, -200,abc\nADMIN_IDS=1,2\n', 1_000_000)
+            assert Config.reload_if_changed()
+            snapshot = Config.snapshot()
+            assert snapshot.allowed_groups == frozenset({-100, -200})
+            assert snapshot.is_allowed_chat(-200) and not snapshot.is_allowed_chat(-300)
+            assert snapshot.is_admin(2) and not snapshot.is_admin(3)
+            assert Config.ALLOWED_GROUPS == snapshot.allowed_groups
+
+            # 没有修改时直接返回同一个快照
+            assert not Config.reload_if_changed()
+            assert Config.snapshot() is snapshot
+
+            # 删除 ALLOWED_GROUPS 后恢复为允许所有群组
+            _write_env(env_file, 'ADMIN_IDS=3\n', 1_000_100)
+            assert Config.reload_if_changed()
+            assert 'ALLOWED_GROUPS' not in os.environ
+            assert Config.snapshot().is_allowed_chat(-300)
+            assert Config.ADMIN_IDS == frozenset({3})
+        finally:
+            config_module.ENV_FILE = saved_env_file
+            Config.reload()
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Parquet 导出测试
+验证按群组 / 月份分区、增量导出只写新消息，以及已归档日期同样可以导出
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+sys.path.append(current_dir)
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.dataset as ds
+
+from archive import Archiver
+from exporter import WATERMARK_FILENAME, ParquetExporter
+from segment_index import get_segment_index
+from storage import MessageStorage
+from conftest import _TempDataDir, _make_message
+
+
+def _messages(start: int, count: int, month: str):
+    """两个群组在指定月份的消息"""
+    messages = []
+    for i in range(start, start + count):
+        msg = _make_message(i, chat_id=-100 - i % 2, timestamp=f'{month}-0{1 + i % 3} 10:00:{i % 60:02d}')
+        if i % 5 == 0:
+            msg['media_info'] = {'file_id': f'f{i}'}
+        messages.append(msg)
+    return messages
+
+
+def _read_export(export_dir: str):
+    """读取导出目录，返回按 message_id 排序的行"""
+    table = ds.dataset(export_dir, format='parquet', partitioning='hive').to_table()
+    return sorted(table.to_pylist(), key=lambda row: row['message_id'])
+
+
+def _write_jsonl_day(data_dir: str, chat_id: int, date_str: str, messages):
+    """直接写入 JSONL 日文件"""
+    with open(os.path.join(data_dir, f"chat_{abs(chat_id)}_{date_str}.jsonl"), 'a', encoding='utf-8') as f:
+        f.writelines(json.dumps(m, ensure_ascii=False) + '\n' for m in messages)
+
+
+def test_sqlite_incremental_export():
+    """SQLite 按 id 水位线增量导出，分区与列类型正确"""
+    with _TempDataDir('sqlite') as data_dir:
+        export_dir = os.path.join(data_dir, 'exports')
+        storage = MessageStorage()
+        storage.save_messages(_messages(0, 30, '2024-01'))
+
+        first = ParquetExporter(export_dir, batch_rows=7, max_open_files=1).export()
+        assert first['rows'] == 30
+        assert sorted(os.listdir(export_dir)) == ['_watermark.json', 'chat=-100', 'chat=-101']
+        assert os.listdir(os.path.join(export_dir, 'chat=-100')) == ['month=2024-01']
+
+        storage.save_messages(_messages(30, 10, '2024-02'))
+        second = ParquetExporter(export_dir, batch_rows=7).export()
+        assert second['rows'] == 10
+        assert ParquetExporter(export_dir).export()['rows'] == 0
+        storage.close()
+
+        rows = _read_export(export_dir)
+        assert [row['message_id'] for row in rows] == list(range(40))
+        assert rows[0]['media_info'] == '{"file_id":"f0"}' and rows[1]['media_info'] is None
+        assert rows[0]['timestamp'].strftime('%Y-%m-%d %H:%M:%S') == '2024-01-01 10:00:00'
+        assert rows[35]['month'] == '2024-02' and rows[35]['chat_id'] == -101
+        with open(os.path.join(export_dir, WATERMARK_FILENAME), 'r', encoding='utf-8') as f:
+            assert json.load(f)['last_id'] == 40
+
+
+def test_file_incremental_export_with_archive():
+    """文件格式按 群组+日期 水位线导出，当天追加的消息和已归档的日期都只导出一次"""
+    with _TempDataDir('jsonl') as data_dir:
+        export_dir = os.path.join(data_dir, 'exports')
+        messages = _messages(0, 20, '2024-01')
+        _write_jsonl_day(data_dir, -100, '20240101', messages[0::2])
+        _write_jsonl_day(data_dir, -101, '20240101', messages[1::2])
+        storage = MessageStorage()
+        assert ParquetExporter(export_dir).export()['rows'] == 20
+
+        # 同一天继续追加，并归档旧日期
+        more = _messages(20, 4, '2024-01')
+        storage.save_messages(more)
+        Archiver(data_dir).archive_before('20240102')
+        assert ParquetExporter(export_dir).export()['rows'] == 4
+        storage.close()
+
+        rows = _read_export(export_dir)
+        assert [row['message_id'] for row in rows] == list(range(24))
+        assert get_segment_index(data_dir).is_archived(-100, '20240101')
+
+
+def test_remove_inprogress_files():
+    """上次中断留下的未完成文件在下次导出时删除"""
+    with _TempDataDir('sqlite') as data_dir:
+        export_dir = os.path.join(data_dir, 'exports')
+        stale = os.path.join(export_dir, 'chat=-100', 'month=2024-01', 'part-x.parquet.inprogress')
+        os.makedirs(os.path.dirname(stale))
+        with open(stale, 'w') as f:
+            f.write('partial')
+        storage = MessageStorage()
+        storage.save_messages(_messages(0, 4, '2024-01'))
+        ParquetExporter(export_dir).export()
+        storage.close()
+        assert not os.path.exists(stale)
+        assert len(_read_export(export_dir)) == 4
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+群组目录测试
+"""
+
+import os
+import sys
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+sys.path.append(current_dir)
+
+from group_registry import GroupRegistry
+from storage import MessageStorage
+from conftest import _TempDataDir, _make_message
+
+
+def test_record_and_persist():
+    """增量记录并在重新加载后保持"""
+    with _TempDataDir('jsonl') as data_dir:
+        registry = GroupRegistry(data_dir)
+        registry.record(_make_message(1, chat_id=-100, timestamp='2024-01-01 10:00:00'))
+        registry.record(_make_message(2, chat_id=-100, timestamp='2024-01-01 11:00:00'))
+        registry.record(_make_message(3, chat_id=-200, timestamp='2024-01-01 12:00:00'))
+        registry.flush()
+
+        reloaded = GroupRegistry(data_dir)
+        groups = reloaded.get_groups()
+        assert list(groups) == [-200, -100]  # 最近活跃的排在前面
+        assert groups[-100]['message_count'] == 2
+        assert groups[-100]['last_seen'] == '2024-01-01 11:00:00'
+        assert reloaded.get_title(-200) == '测试群组'
+        assert reloaded.get_title(-300) == '群组 -300'
+
+
+def test_record_does_not_write():
+    """record() 只修改内存，flush() 写入失败时只记录日志，之后重试"""
+    with _TempDataDir('jsonl') as data_dir:
+        registry = GroupRegistry(data_dir)
+        registry.record(_make_message(1, chat_id=-100))
+        path = os.path.join(data_dir, 'groups.json')
+        assert not os.path.exists(path)
+
+        os.makedirs(path + '.tmp')  # 让临时文件无法创建
+        registry.flush()
+        assert not os.path.exists(path)
+        os.rmdir(path + '.tmp')
+
+        registry.flush()
+        assert GroupRegistry(data_dir).get_groups()[-100]['message_count'] == 1
+
+
+def test_bootstrap_from_existing_files():
+    """没有 sidecar 文件时从已有消息初始化"""
+    with _TempDataDir('jsonl') as data_dir:
+        storage = MessageStorage()
+        storage.save_messages([_make_message(i, chat_id=-100) for i in range(4)])
+        storage.close()
+
+        registry = GroupRegistry(data_dir)
+        assert registry.get_groups()[-100]['message_count'] == 4
+        assert os.path.exists(os.path.join(data_dir, 'groups.json'))
+
+
+def test_bootstrap_from_sqlite():
+    """SQLite 格式从数据库初始化"""
+    with _TempDataDir('sqlite') as data_dir:
+        storage = MessageStorage()
+        storage.save_messages([_make_message(i, chat_id=-100) for i in range(3)])
+
+        registry = GroupRegistry(data_dir)
+        assert registry.get_groups()[-100]['message_count'] == 3
+        storage.close()
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+日志管道测试
+验证事件级别 / 采样、日志经队列写入文件，以及队列满时丢弃而不阻塞
+"""
+
+import logging
+import os
+import queue
+import sys
+import tempfile
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+
+from log_pipeline import (
+    LOG_FILENAME, DroppingQueueHandler, EventLog, parse_event_setting, setup_logging, stop_logging
+)
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def _event_logger(level: int):
+    logger = logging.getLogger(f'test_log_pipeline.{level}')
+    logger.setLevel(level)
+    logger.propagate = False
+    handler = _ListHandler()
+    logger.handlers = [handler]
+    return logger, handler
+
+
+def test_event_levels_and_sampling():
+    """INFO 级别下默认不输出每条消息的事件，可按事件调整级别和采样率"""
+    logger, handler = _event_logger(logging.INFO)
+    events = EventLog(logger)
+    events.log('message_saved', chat_id=-100, message_id=1)
+    events.log('chat_denied', chat_id=-200)
+    assert handler.messages == ['chat_denied chat_id=-200']
+
+    logger, handler = _event_logger(logging.INFO)
+    events = EventLog(logger, levels={'message_saved': logging.INFO}, sample_rates={'message_saved': 0.1})
+    for i in range(25):
+        events.log('message_saved', message_id=i)
+    assert handler.messages == ['message_saved message_id=0', 'message_saved message_id=10',
+                                'message_saved message_id=20']
+
+    events = EventLog(logger, sample_rates={'chat_denied': 0})
+    assert not events.enabled('chat_denied')
+    assert parse_event_setting(' message_saved=INFO, bad ,x=') == {'message_saved': 'INFO'}
+
+
+def test_pipeline_writes_file_after_stop():
+    """日志由后台线程写入文件，stop_logging 之后全部落盘"""
+    with tempfile.TemporaryDirectory() as log_dir:
+        logger = setup_logging('test_log_pipeline_file', log_dir=log_dir, level='INFO', console=False)
+        assert [type(h) for h in logger.handlers] == [DroppingQueueHandler]
+        for i in range(100):
+            logging.getLogger('test_log_pipeline_file.child').info(f'line {i}')
+        stop_logging('test_log_pipeline_file')
+        with open(os.path.join(log_dir, LOG_FILENAME), encoding='utf-8') as f:
+            lines = f.readlines()
+        assert len(lines) == 100 and lines[-1].rstrip().endswith('line 99')
+        assert logger.handlers == []
+
+
+def test_full_queue_drops():
+    """队列满时丢弃新日志并计数"""
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    logger = logging.getLogger('test_log_pipeline_drop')
+    logger.propagate = False
+    logger.handlers = [handler]
+    for i in range(5):
+        logger.warning(f'line {i}')
+    assert handler.dropped == 3 and handler.queue.qsize() == 2
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
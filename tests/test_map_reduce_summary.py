@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+分层总结（map-reduce）测试
+使用本地模拟 OpenAI 服务器验证分块、并发限制和合并
+"""
+
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+sys.path.append(os.path.join(project_root, 'scripts'))
+sys.path.append(current_dir)
+
+from config.config import Config
+from ai_summary import AISummarizer, PromptSpool, chunk_lines, estimate_tokens, format_message
+from mock_openai_server import MockOpenAIServer
+from conftest import AI_OVERRIDES, _TempDataDir, _make_message, _write_day
+
+
+async def _summarize(data_dir: str, latency: float = 0.0):
+    """启动模拟服务器并生成今天的总结"""
+    server = MockOpenAIServer(latency=latency)
+    await server.start()
+    try:
+        Config.OPENAI_BASE_URL = server.base_url
+        Config.SUMMARY_DIR = os.path.join(data_dir, 'summaries')
+        os.makedirs(Config.SUMMARY_DIR, exist_ok=True)
+        summary = await AISummarizer().generate_daily_summary(-1001234567890, datetime.now())
+        return summary, server
+    finally:
+        await server.stop()
+
+
+def test_chunk_lines_respects_budget():
+    """分块不超过 token 预算，超长单行被截断"""
+    lines = ['消息' * 20] * 10 + ['x' * 10000]
+    chunks = chunk_lines(lines, 100)
+    assert sum(len(chunk) for chunk in chunks) == len(lines)
+    for chunk in chunks:
+        assert sum(estimate_tokens(line) for line in chunk) <= 100
+
+
+def test_prompt_spool_matches_chunk_lines():
+    """暂存的分块与 chunk_lines 一致，完成的分块写入临时文件而不是留在内存中"""
+    messages = [dict(_make_message(i), message_text=f'第 {i} 条\n多行\u2028消息' * (i % 5 + 1))
+                for i in range(200)]
+    expected = chunk_lines([format_message(msg) for msg in messages], 100)
+    with PromptSpool(100) as spool:
+        for msg in messages:
+            spool.add_message(msg)
+        spool.finish()
+        assert spool.count == 200
+        assert spool.chat_title == '测试群组'
+        assert len(spool) == len(expected) > 1
+        assert spool._file is not None and not spool._chunks
+        assert [spool.read_chunk(i) for i in range(len(spool))] == expected
+        # map 阶段在存储线程池中并发读取分块
+        with ThreadPoolExecutor(4) as executor:
+            for _ in range(20):
+                assert list(executor.map(spool.read_chunk, range(len(spool)))) == expected
+
+    # 只有一个分块时不创建临时文件
+    with PromptSpool(100000) as spool:
+        for msg in messages:
+            spool.add_message(msg)
+        spool.finish()
+        assert spool._file is None
+        assert spool.read_chunk(0) == expected[0] + [line for chunk in expected[1:] for line in chunk]
+
+
+def test_small_day_single_request():
+    """未超出预算时只发送一次请求"""
+    with _TempDataDir('jsonl', SUMMARY_CHUNK_TOKENS=100000, **AI_OVERRIDES) as data_dir:
+        _write_day(50)
+        summary, server = asyncio.run(_summarize(data_dir))
+        assert summary
+        assert server.request_count == 1
+
+
+def test_large_day_map_reduce():
+    """超出预算时分块并发总结，并发数受限，最后合并为一份总结"""
+    with _TempDataDir('jsonl', SUMMARY_CHUNK_TOKENS=1000, SUMMARY_MAP_CONCURRENCY=3,
+                      **AI_OVERRIDES) as data_dir:
+        _write_day(2000)
+        summary, server = asyncio.run(_summarize(data_dir, latency=0.05))
+        assert summary
+
+        map_prompts = [p for p in server.prompts if '部分。' in p]
+        reduce_prompts = [p for p in server.prompts if '分段总结：' in p]
+        assert len(map_prompts) > 3
+        assert reduce_prompts
+        assert '分段总结：' in server.prompts[-1]  # 最后一个请求是合并
+        assert server.max_in_flight <= 3
+        # 每个分块请求都应在预算附近，而不是整天的聊天记录
+        assert max(len(p) for p in map_prompts) < 3000
+
+
+
+def test_segment_index_loaded_off_loop():
+    """分段索引在存储线程池中加载，不在事件循环线程上"""
+    import ai_summary
+
+    threads = []
+    original = ai_summary.get_segment_index
+
+    def recording(data_dir):
+        threads.append(threading.current_thread().name)
+        return original(data_dir)
+
+    with _TempDataDir('jsonl', SUMMARY_CHUNK_TOKENS=100000, **AI_OVERRIDES) as data_dir:
+        _write_day(5)
+        ai_summary.get_segment_index = recording
+        try:
+            summary, _ = asyncio.run(_summarize(data_dir))
+        finally:
+            ai_summary.get_segment_index = original
+        assert summary
+        assert threads and all(name.startswith('storage') for name in threads)
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+运行指标测试
+验证 Prometheus 文本格式、直方图分桶，以及存储、AI 请求和 /metrics 端点的埋点
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+import aiohttp
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+sys.path.append(os.path.join(project_root, 'scripts'))
+sys.path.append(current_dir)
+
+from config.config import Config
+from metrics import (
+    AI_PROMPT_TOKENS, AI_REQUEST_FAILURES, AI_REQUEST_SECONDS, CONTENT_TYPE,
+    STORAGE_BYTES_WRITTEN, STORAGE_MESSAGES_WRITTEN, STORAGE_WRITE_SECONDS,
+    MetricsRegistry, MetricsServer
+)
+from mock_openai_server import MockOpenAIServer
+from storage import MessageStorage
+from conftest import AI_OVERRIDES, _TempDataDir, _make_message, _write_day
+from webhook_server import WebhookServer
+
+
+def test_render_text_format():
+    """计数器、仪表和直方图按 Prometheus 文本格式输出"""
+    registry = MetricsRegistry()
+    counter = registry.counter('test_events_total', '事件数', ('kind',))
+    counter.inc(kind='a')
+    counter.inc(2, kind='a')
+    counter.inc(kind='b"x')
+    registry.gauge('test_depth', '队列深度').set_function(lambda: 7)
+    histogram = registry.histogram('test_seconds', '耗时', buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    text = registry.render()
+    assert '# TYPE test_events_total counter' in text
+    assert 'test_events_total{kind="a"} 3' in text
+    assert 'test_events_total{kind="b\\"x"} 1' in text
+    assert 'test_depth 7' in text
+    assert 'test_seconds_bucket{le="0.1"} 2' in text
+    assert 'test_seconds_bucket{le="1"} 3' in text
+    assert 'test_seconds_bucket{le="+Inf"} 4' in text
+    assert 'test_seconds_count 4' in text
+    assert 'test_seconds_sum 3.65' in text
+
+
+def test_registry_reuses_metrics():
+    """同名指标返回同一个对象，类型或标签不同时报错"""
+    registry = MetricsRegistry()
+    assert registry.counter('x_total', 'x') is registry.counter('x_total', 'x')
+    try:
+        registry.gauge('x_total', 'x')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("类型不同的同名指标应当报错")
+
+
+def test_storage_write_metrics():
+    """每种存储格式记录写入次数、消息数和字节数"""
+    for fmt in ('json', 'jsonl', 'txt', 'sqlite'):
+        with _TempDataDir(fmt) as data_dir:
+            writes = STORAGE_WRITE_SECONDS.get_count(backend=fmt)
+            messages = STORAGE_MESSAGES_WRITTEN.get(backend=fmt)
+            written = STORAGE_BYTES_WRITTEN.get(backend=fmt)
+
+            storage = MessageStorage()
+            for i in range(3):
+                storage.save_message(_make_message(i))
+            storage.close()
+
+            assert STORAGE_WRITE_SECONDS.get_count(backend=fmt) == writes + 3
+            assert STORAGE_MESSAGES_WRITTEN.get(backend=fmt) == messages + 3
+            added = STORAGE_BYTES_WRITTEN.get(backend=fmt) - written
+            if fmt in ('jsonl', 'txt'):
+                files = [f for f in os.listdir(data_dir) if f.endswith('.' + fmt)]
+                assert added == os.path.getsize(os.path.join(data_dir, files[0]))
+            else:
+                assert added > 0
+
+
+def test_ai_request_metrics():
+    """AI 请求记录提示词 token、耗时和限流失败"""
+    with _TempDataDir('jsonl', SUMMARY_CHUNK_TOKENS=100000, AI_MAX_RETRIES=1, **AI_OVERRIDES) as data_dir:
+        _write_day(20)
+        tokens = AI_PROMPT_TOKENS.get(provider='openai')
+        requests = AI_REQUEST_SECONDS.get_count(provider='openai')
+        limited = AI_REQUEST_FAILURES.get(provider='openai', reason='rate_limited')
+
+        async def run():
+            server = MockOpenAIServer()
+            server.inject_error(429, retry_after=0)
+            await server.start()
+            try:
+                Config.OPENAI_BASE_URL = server.base_url
+                Config.SUMMARY_DIR = os.path.join(data_dir, 'summaries')
+                os.makedirs(Config.SUMMARY_DIR, exist_ok=True)
+                from ai_summary import AISummarizer
+                return await AISummarizer().generate_daily_summary(-1001234567890, datetime.now())
+            finally:
+                await server.stop()
+
+        assert asyncio.run(run())
+        assert AI_REQUEST_SECONDS.get_count(provider='openai') == requests + 2
+        assert AI_REQUEST_FAILURES.get(provider='openai', reason='rate_limited') == limited + 1
+        assert AI_PROMPT_TOKENS.get(provider='openai') > tokens
+
+
+def test_metrics_endpoints():
+    """Webhook 服务器和单独的指标服务器都提供 /metrics"""
+    async def fetch(port: int, path: str = '/metrics'):
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f'http://127.0.0.1:{port}{path}') as resp:
+                return resp.status, resp.headers['Content-Type'], await resp.text()
+
+    async def run():
+        webhook = WebhookServer(asyncio.Queue(), lambda data: data, host='127.0.0.1', port=0,
+                                metrics_path='/metrics')
+        standalone = MetricsServer('127.0.0.1', 0)
+        await webhook.start()
+        await standalone.start()
+        try:
+            return await fetch(webhook.port), await fetch(standalone.port)
+        finally:
+            await webhook.stop()
+            await standalone.stop()
+
+    for status, content_type, text in asyncio.run(run()):
+        assert status == 200
+        assert content_type == CONTENT_TYPE
+        assert '# TYPE notetaker_updates_received_total counter' in text
+        assert '# TYPE notetaker_storage_write_seconds histogram' in text
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
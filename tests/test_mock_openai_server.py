@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+模拟 OpenAI 服务器测试
+验证流式响应、输出限速和随机错误注入
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+import aiohttp
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'scripts'))
+
+from mock_openai_server import CHARS_PER_TOKEN, MockOpenAIServer
+
+
+async def _post(server: MockOpenAIServer, body: dict):
+    """发送一个 chat/completions 请求，返回 (状态码, 响应头, 响应正文)"""
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f'{server.base_url}/chat/completions', json=body) as resp:
+            return resp.status, dict(resp.headers), await resp.text()
+
+
+def _body(stream: bool = False) -> dict:
+    return {'model': 'mock', 'stream': stream, 'messages': [{'role': 'user', 'content': '总结一下'}]}
+
+
+def test_stream_returns_sse_chunks():
+    """stream=true 时返回 SSE 事件，拼接后与完整内容一致，以 [DONE] 结束"""
+    async def run():
+        server = MockOpenAIServer(completion_tokens=100)
+        await server.start()
+        try:
+            status, headers, text = await _post(server, _body(stream=True))
+        finally:
+            await server.stop()
+        return server, status, headers, text
+
+    server, status, headers, text = asyncio.run(run())
+    assert status == 200
+    assert headers['Content-Type'].startswith('text/event-stream')
+    events = [line[len('data: '):] for line in text.split('\n') if line.startswith('data: ')]
+    assert events[-1] == '[DONE]'
+    chunks = [json.loads(event) for event in events[:-1]]
+    assert all(chunk['object'] == 'chat.completion.chunk' for chunk in chunks)
+    assert chunks[0]['choices'][0]['delta']['role'] == 'assistant'
+    assert chunks[-1]['choices'][0]['finish_reason'] == 'stop'
+    content = ''.join(chunk['choices'][0]['delta'].get('content', '') for chunk in chunks)
+    assert content.startswith('- 模拟总结 #1')
+    assert len(content) == 100 * CHARS_PER_TOKEN
+    assert server.streamed_requests == 1
+
+
+def test_tokens_per_second_throttles_output():
+    """输出按 tokens_per_second 限速，流式和非流式耗时接近"""
+    async def run(stream: bool):
+        server = MockOpenAIServer(tokens_per_second=500, completion_tokens=100)
+        await server.start()
+        try:
+            start = time.perf_counter()
+            status, _, _ = await _post(server, _body(stream))
+            return status, time.perf_counter() - start
+        finally:
+            await server.stop()
+
+    for stream in (False, True):
+        status, elapsed = asyncio.run(run(stream))
+        assert status == 200
+        assert 0.15 <= elapsed < 1.0
+
+
+def test_error_rate_injects_statuses():
+    """error_rate=1 时每个请求都返回错误，429 带 Retry-After"""
+    async def run():
+        server = MockOpenAIServer(error_rate=1.0, error_statuses=(429, 500), retry_after=2, seed=1)
+        await server.start()
+        try:
+            return server, [await _post(server, _body()) for _ in range(20)]
+        finally:
+            await server.stop()
+
+    server, responses = asyncio.run(run())
+    statuses = {status for status, _, _ in responses}
+    assert statuses == {429, 500}
+    for status, headers, text in responses:
+        error_type = json.loads(text)['error']['type']
+        if status == 429:
+            assert headers['Retry-After'] == '2'
+            assert error_type == 'rate_limit_exceeded'
+        else:
+            assert 'Retry-After' not in headers
+            assert error_type == 'server_error'
+    assert server.errors_returned == 20
+    assert server.request_count == 0
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+采样分析器测试
+验证热点统计、空闲线程过滤、调用栈数量上限和 collapsed stack 文件格式
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+
+from profiler import TRUNCATED_STACK, SamplingProfiler
+
+
+def _busy_loop(seconds: float):
+    """占用 CPU 的测试函数"""
+    deadline = time.monotonic() + seconds
+    total = 0
+    while time.monotonic() < deadline:
+        total += sum(range(100))
+    return total
+
+
+def _profile_busy_thread(profiler: SamplingProfiler, seconds: float = 0.3):
+    worker = threading.Thread(target=_busy_loop, args=(seconds,), name='busy-worker')
+    profiler.start()
+    worker.start()
+    worker.join()
+    profiler.stop()
+
+
+def test_finds_busy_function():
+    """占用 CPU 的函数出现在热点中，累计采样包含调用方"""
+    profiler = SamplingProfiler(interval=0.002)
+    _profile_busy_thread(profiler)
+
+    assert profiler.samples > 10
+    assert not profiler.running
+    top = profiler.top_functions(5)
+    labels = [label for label, _, _ in top]
+    assert any(label.startswith('_busy_loop (test_profiler.py:') for label in labels)
+    for label, own, total in top:
+        assert total >= own
+
+    report = profiler.format_report(5)
+    assert '热点函数 Top 5' in report
+    assert '_busy_loop' in report
+
+
+def test_idle_threads_skipped():
+    """等待中的线程默认不计入热点"""
+    event = threading.Event()
+    waiter = threading.Thread(target=event.wait, name='idle-waiter')
+    waiter.start()
+    try:
+        profiler = SamplingProfiler(interval=0.002)
+        profiler.start()
+        time.sleep(0.1)
+        profiler.stop()
+    finally:
+        event.set()
+        waiter.join()
+
+    assert profiler.idle > 0
+    assert not any(stack[0] == 'idle-waiter' for stack in profiler._stacks)
+
+
+def test_max_stacks_bounds_memory():
+    """超出 max_stacks 的调用栈合并计数"""
+    profiler = SamplingProfiler(interval=0.002, max_stacks=1)
+    _profile_busy_thread(profiler, 0.2)
+
+    assert len(profiler._stacks) <= 2
+    if profiler.truncated:
+        assert profiler._stacks[TRUNCATED_STACK] == profiler.truncated
+        assert '未单独保存' in profiler.format_report()
+
+
+def test_write_collapsed():
+    """collapsed stack 文件每行为 "线程;函数;... 次数"，根是线程名"""
+    profiler = SamplingProfiler(interval=0.002)
+    _profile_busy_thread(profiler)
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        path = profiler.write_collapsed(os.path.join(log_dir, 'profile.collapsed'))
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+
+    assert lines
+    total = 0
+    for line in lines:
+        stack, count = line.rsplit(' ', 1)
+        total += int(count)
+        assert stack.split(';')[0]
+    assert total == sum(profiler._stacks.values())
+    assert any(line.startswith('busy-worker;') and '_busy_loop' in line for line in lines)
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
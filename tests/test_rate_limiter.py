@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+AI 接口限流与每日总结并发执行测试
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+sys.path.append(os.path.join(project_root, 'scripts'))
+sys.path.append(current_dir)
+
+from config.config import Config
+from ai_summary import OpenAIProvider, parse_retry_after
+from mock_openai_server import MockOpenAIServer
+from rate_limiter import AIRateLimitError, RateLimiter
+from scheduler import TaskScheduler
+from storage import MessageStorage
+from conftest import _TempDataDir, _make_message
+
+
+def test_request_bucket_spacing():
+    """超过突发容量后按 RPM 匀速放行"""
+    limiter = RateLimiter(requests_per_minute=600)  # 每秒 10 个，容量 600
+    limiter.requests._tokens = 2
+
+    async def run():
+        start = time.monotonic()
+        for _ in range(5):
+            await limiter.acquire()
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(run())
+    # 2 个立即放行，其余 3 个每个约 0.1 秒
+    assert 0.25 <= elapsed < 0.6
+    assert limiter.get_stats()['throttled'] == 3
+
+
+def test_token_bucket_and_pause():
+    """TPM 不足或服务端限流时等待"""
+    limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=6000)  # 每秒 100 个 token
+    limiter.tokens._tokens = 0
+
+    async def run():
+        start = time.monotonic()
+        await limiter.acquire(tokens=20)
+        limiter.pause(0.2)
+        await limiter.acquire(tokens=0)
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(run())
+    assert 0.35 <= elapsed < 0.8
+    assert limiter.get_stats()['rate_limited'] == 1
+
+
+def test_parse_retry_after():
+    """Retry-After 支持秒数和 HTTP 日期"""
+    assert parse_retry_after('3') == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('invalid') is None
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+
+
+def test_retry_after_429():
+    """收到 429 时按 Retry-After 等待后重试成功"""
+    with _TempDataDir('jsonl', OPENAI_API_KEY='test-key', OPENAI_BASE_URL='', AI_MAX_RETRIES=2):
+        async def run():
+            server = MockOpenAIServer()
+            await server.start()
+            try:
+                Config.OPENAI_BASE_URL = server.base_url
+                provider = OpenAIProvider()
+                server.inject_error(429, retry_after=0.2)
+                start = time.monotonic()
+                result = await provider._request('测试')
+                return result, time.monotonic() - start, server, provider
+            finally:
+                await server.stop()
+
+        result, elapsed, server, provider = asyncio.run(run())
+        assert result
+        assert server.errors_returned == 1
+        assert server.request_count == 1
+        assert elapsed >= 0.2
+        assert provider.rate_limiter.get_stats()['rate_limited'] == 1
+
+
+def test_retry_gives_up():
+    """持续限流时在重试次数用完后抛出 AIRateLimitError"""
+    with _TempDataDir('jsonl', OPENAI_API_KEY='test-key', OPENAI_BASE_URL='', AI_MAX_RETRIES=1):
+        async def run():
+            server = MockOpenAIServer()
+            await server.start()
+            try:
+                Config.OPENAI_BASE_URL = server.base_url
+                server.inject_error(429, retry_after=0, count=5)
+                await OpenAIProvider()._request('测试')
+            finally:
+                await server.stop()
+
+        try:
+            asyncio.run(run())
+            assert False, "应抛出 AIRateLimitError"
+        except AIRateLimitError:
+            pass
+
+
+class _SlowSummarizer:
+    """记录并发数的总结器替身"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.chat_ids = []
+
+    async def generate_daily_summary(self, chat_id, date):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.05)
+        self.in_flight -= 1
+        self.chat_ids.append(chat_id)
+        return f'总结 {chat_id}'
+
+
+def test_nightly_summary_runs_concurrently():
+    """每日总结并发处理群组，并发数不超过 SUMMARY_CONCURRENCY"""
+    yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    with _TempDataDir('sqlite', SUMMARY_CONCURRENCY=4, MIN_MESSAGES_FOR_SUMMARY=2,
+                      SEND_SUMMARY_TO_CHAT=False, ALLOWED_GROUPS=[]):
+        storage = MessageStorage()
+        storage.save_messages([
+            _make_message(i, chat_id=-100 - i % 12, timestamp=f'{yesterday} 12:00:{i % 60:02d}')
+            for i in range(36)
+        ])
+
+        summarizer = _SlowSummarizer()
+        scheduler = TaskScheduler(None, summarizer)
+        start = time.monotonic()
+        asyncio.run(scheduler._execute_daily_summary())
+        elapsed = time.monotonic() - start
+        storage.close()
+
+        assert len(summarizer.chat_ids) == 12
+        assert summarizer.max_in_flight == 4
+        # 串行需要 12 * 0.05 秒，并发 4 个约 3 轮
+        assert elapsed < 0.4
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+SQLite 数据库结构测试
+验证整数时间戳、紧凑行编码、旧数据库在线迁移，以及热点查询使用预期的索引
+"""
+
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+sys.path.append(current_dir)
+
+from storage import (
+    CHAT_DATE_RANGE_SQL, COUNT_CHAT_MESSAGES_SQL, SCHEMA_VERSION, TOP_USERS_SQL,
+    MessageStorage, timestamp_to_epoch
+)
+from ai_summary import AISummarizer, SELECT_MESSAGES_IN_RANGE_SQL
+from scheduler import ACTIVE_CHATS_SQL
+from conftest import _TempDataDir, _make_message
+
+V1_SCHEMA = '''
+    CREATE TABLE messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        message_id INTEGER,
+        chat_id INTEGER,
+        chat_title TEXT,
+        user_id INTEGER,
+        username TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        message_text TEXT,
+        message_type TEXT,
+        timestamp DATETIME,
+        media_info TEXT,
+        raw_data TEXT
+    );
+    CREATE INDEX idx_chat_id ON messages(chat_id);
+    CREATE INDEX idx_timestamp ON messages(timestamp);
+'''
+
+
+def _query_plan(conn, sql, params):
+    """返回 EXPLAIN QUERY PLAN 的描述文本"""
+    return ' | '.join(row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params))
+
+
+def test_new_database_is_current_version():
+    """新数据库直接创建当前版本结构，写入时填充 ts，不再有 raw_data 列"""
+    with _TempDataDir('sqlite') as data_dir:
+        storage = MessageStorage()
+        storage.save_messages([_make_message(1, timestamp='2024-01-01 10:00:00')])
+        storage.close()
+
+        conn = sqlite3.connect(os.path.join(data_dir, 'messages.db'))
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+        ts = conn.execute('SELECT ts FROM messages').fetchone()[0]
+        assert ts == timestamp_to_epoch('2024-01-01 10:00:00')
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(messages)')}
+        assert 'raw_data' not in columns
+        assert conn.execute('SELECT media_info FROM messages').fetchone()[0] is None
+        conn.close()
+
+
+def test_rows_decode_to_saved_messages():
+    """从 SQLite 读出的消息与保存时的消息字典相同"""
+    with _TempDataDir('sqlite'):
+        now = datetime.now()
+        messages = [_make_message(i, timestamp=now.strftime('%Y-%m-%d %H:%M:%S')) for i in range(3)]
+        messages[1].update(message_type='photo', media_info={'file_id': 'AgAD', 'caption': '截图', 'width': 1280})
+        storage = MessageStorage()
+        storage.save_messages(messages)
+
+        read_back = list(AISummarizer().iter_messages_for_date(messages[0]['chat_id'], now))
+        assert read_back == messages
+        storage.close()
+
+
+def test_online_migration_from_v1():
+    """旧数据库分批回填 ts、清空 raw_data，迁移期间写入的新消息也带 ts"""
+    with _TempDataDir('sqlite', SQLITE_MIGRATION_BATCH_SIZE=7) as data_dir:
+        db_path = os.path.join(data_dir, 'messages.db')
+        conn = sqlite3.connect(db_path)
+        conn.executescript(V1_SCHEMA)
+        conn.executemany(
+            'INSERT INTO messages (message_id, chat_id, user_id, message_text, timestamp, media_info, raw_data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                (i, -100, i % 3, f'消息 {i}', f'2024-01-01 10:{i // 60:02d}:{i % 60:02d}',
+                 json.dumps({'file_id': f'f{i}'} if i % 10 == 0 else None), json.dumps({'message_id': i}))
+                for i in range(100)
+            ]
+        )
+        conn.commit()
+        conn.close()
+
+        storage = MessageStorage()
+        storage.save_messages([_make_message(100, chat_id=-100, timestamp='2024-01-02 08:00:00')])
+        assert storage.wait_for_migration(10)
+
+        # 迁移完成后可以按 ts 查询，统计结果不变
+        stats = storage.get_chat_stats(-100)
+        assert stats['total_messages'] == 101
+        assert stats['date_range'] == ('2024-01-01 10:00:00', '2024-01-02 08:00:00')
+        storage.close()
+
+        conn = sqlite3.connect(db_path)
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+        assert conn.execute('SELECT COUNT(*) FROM messages WHERE ts IS NULL').fetchone()[0] == 0
+        for timestamp, ts in conn.execute('SELECT timestamp, ts FROM messages'):
+            assert ts == timestamp_to_epoch(timestamp)
+        assert conn.execute('SELECT COUNT(*) FROM messages WHERE raw_data IS NOT NULL').fetchone()[0] == 0
+        assert conn.execute('SELECT COUNT(*) FROM messages WHERE media_info IS NOT NULL').fetchone()[0] == 10
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {'idx_chat_ts', 'idx_ts_chat', 'idx_chat_user'} <= indexes
+        assert 'idx_chat_id' not in indexes and 'idx_timestamp' not in indexes
+        conn.close()
+
+
+def test_migration_from_v2_keeps_indexes():
+    """版本 2 数据库只清理行内容，复合索引保持不变"""
+    with _TempDataDir('sqlite') as data_dir:
+        db_path = os.path.join(data_dir, 'messages.db')
+        conn = sqlite3.connect(db_path)
+        conn.executescript(V1_SCHEMA.replace('raw_data TEXT', 'raw_data TEXT, ts INTEGER'))
+        conn.execute('DROP INDEX idx_chat_id')
+        conn.execute('DROP INDEX idx_timestamp')
+        conn.execute('CREATE INDEX idx_chat_ts ON messages(chat_id, ts)')
+        conn.execute(
+            'INSERT INTO messages (message_id, chat_id, timestamp, media_info, raw_data, ts) VALUES (?, ?, ?, ?, ?, ?)',
+            (1, -100, '2024-01-01 10:00:00', 'null', '{}', timestamp_to_epoch('2024-01-01 10:00:00'))
+        )
+        conn.execute('PRAGMA user_version = 2')
+        conn.commit()
+        conn.close()
+
+        storage = MessageStorage()
+        assert storage.wait_for_migration(10)
+        storage.close()
+
+        conn = sqlite3.connect(db_path)
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+        assert conn.execute('SELECT media_info, raw_data FROM messages').fetchone() == (None, None)
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert 'idx_chat_ts' in indexes and 'idx_chat_id' not in indexes
+        conn.close()
+
+
+def test_hot_queries_use_indexes():
+    """热点查询的执行计划使用版本 2 的复合索引"""
+    with _TempDataDir('sqlite') as data_dir:
+        storage = MessageStorage()
+        storage.save_messages([
+            _make_message(i, chat_id=-100 - i % 5, timestamp=f'2024-01-01 10:00:{i % 60:02d}')
+            for i in range(200)
+        ])
+        storage.close()
+
+        conn = sqlite3.connect(os.path.join(data_dir, 'messages.db'))
+        conn.execute('ANALYZE')
+        start, end = timestamp_to_epoch('2024-01-01 00:00:00'), timestamp_to_epoch('2024-01-01 23:59:59')
+
+        plan = _query_plan(conn, SELECT_MESSAGES_IN_RANGE_SQL, (-100, start, end))
+        assert 'USING INDEX idx_chat_ts (chat_id=? AND ts>? AND ts<?)' in plan
+        assert 'TEMP B-TREE' not in plan  # ORDER BY ts 由索引顺序满足
+
+        plan = _query_plan(conn, ACTIVE_CHATS_SQL, (start, end, 10))
+        assert 'USING COVERING INDEX idx_ts_chat (ts>? AND ts<?)' in plan
+
+        plan = _query_plan(conn, COUNT_CHAT_MESSAGES_SQL, (-100,))
+        assert 'USING COVERING INDEX idx_chat_' in plan
+
+        plan = _query_plan(conn, CHAT_DATE_RANGE_SQL, (-100,))
+        assert 'USING COVERING INDEX idx_chat_ts (chat_id=?)' in plan
+
+        plan = _query_plan(conn, TOP_USERS_SQL, (-100,))
+        assert 'USING INDEX idx_chat_user (chat_id=?)' in plan
+        conn.close()
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
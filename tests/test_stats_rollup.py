@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+群组统计汇总测试
+验证 SQLite 汇总表和文件格式 sidecar 的统计结果与全量扫描一致，并能从历史数据重建
+"""
+
+import os
+import sqlite3
+import sys
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+sys.path.append(current_dir)
+
+from storage import (
+    CHAT_DATE_RANGE_SQL, COUNT_CHAT_MESSAGES_SQL, TOP_USERS_SQL, MessageStorage
+)
+import segment_index
+import stats_rollup
+from stats_rollup import ROLLUP_FILENAME, aggregate_messages
+from conftest import _TempDataDir, _make_message
+
+CHAT_ID = -1001234567890
+
+
+def _messages(count: int):
+    """跨 3 天、多个小时、多种类型和用户的消息"""
+    messages = []
+    for i in range(count):
+        msg = _make_message(i, timestamp=f'2024-01-0{1 + i % 3} {8 + i % 5:02d}:00:{i % 60:02d}')
+        msg['user_id'] = 1000 + i % 4
+        msg['first_name'] = f'用户{i % 4}'
+        msg['message_type'] = 'photo' if i % 7 == 0 else 'text'
+        messages.append(msg)
+    return messages
+
+
+def _check_stats(stats, messages):
+    """统计结果与消息列表一致"""
+    deltas = aggregate_messages(messages)[CHAT_ID]
+    assert stats['total_messages'] == len(messages)
+    assert stats['date_range'] == ('2024-01-01 08:00:00', max(m['timestamp'] for m in messages))
+    assert stats['active_days'] == 3
+    assert stats['daily'] == sorted(deltas['days'].items())
+    assert sum(stats['hourly']) == len(messages)
+    assert stats['hourly'][8] == deltas['hours'][8]
+    assert dict(stats['message_types']) == dict(deltas['types'])
+    assert stats['message_types'][0][0] == 'text'
+    assert sum(count for _, _, count in stats['top_users']) == len(messages)
+
+
+def test_aggregate_messages():
+    """批次增量按群组汇总"""
+    messages = _messages(10) + [_make_message(99, chat_id=-100, timestamp='2024-01-05 23:59:59')]
+    deltas = aggregate_messages(messages)
+    assert set(deltas) == {CHAT_ID, -100}
+    assert deltas[CHAT_ID]['count'] == 10
+    assert deltas[-100]['hours'] == {23: 1}
+    assert deltas[-100]['first_ts'] == deltas[-100]['last_ts'] == '2024-01-05 23:59:59'
+    assert deltas[CHAT_ID]['users'][1000][1:] == ['用户0', 3]
+
+
+def test_sqlite_rollups_match_full_scan():
+    """SQLite 汇总表与全量聚合查询结果一致，且跨批次累加"""
+    with _TempDataDir('sqlite') as data_dir:
+        messages = _messages(50)
+        storage = MessageStorage()
+        storage.save_messages(messages[:20])
+        storage.save_messages(messages[20:])
+        stats = storage.get_chat_stats(CHAT_ID)
+        _check_stats(stats, messages)
+
+        conn = sqlite3.connect(os.path.join(data_dir, 'messages.db'))
+        assert stats['total_messages'] == conn.execute(COUNT_CHAT_MESSAGES_SQL, (CHAT_ID,)).fetchone()[0]
+        assert stats['date_range'] == conn.execute(CHAT_DATE_RANGE_SQL, (CHAT_ID,)).fetchone()
+        expected_top = sorted(count for _, _, count in conn.execute(TOP_USERS_SQL, (CHAT_ID,)))
+        assert sorted(count for _, _, count in stats['top_users']) == expected_top
+
+        # 删除汇总表后重新打开，从已有消息重建
+        storage.close()
+        conn.execute('DROP TABLE chat_stats')
+        conn.commit()
+        conn.close()
+        storage = MessageStorage()
+        assert storage.get_chat_stats(CHAT_ID) == stats
+        assert storage.get_chat_stats(-1)['total_messages'] == 0
+        storage.close()
+
+
+def test_file_rollup_persist_and_rebuild():
+    """文件格式的汇总保存到 sidecar，丢失后从分段文件重建"""
+    with _TempDataDir('jsonl') as data_dir:
+        messages = _messages(30)
+        storage = MessageStorage()
+        storage.save_messages(messages)
+        stats = storage.get_chat_stats(CHAT_ID)
+        _check_stats(stats, messages)
+        assert stats['total_files'] == 1
+        storage.close()
+        assert os.path.exists(os.path.join(data_dir, ROLLUP_FILENAME))
+
+        storage = MessageStorage()
+        assert storage.get_chat_stats(CHAT_ID) == stats
+        storage.close()
+
+        os.remove(os.path.join(data_dir, ROLLUP_FILENAME))
+        storage = MessageStorage()
+        assert storage.get_chat_stats(CHAT_ID) == stats
+        storage.close()
+
+
+def test_file_rollup_reconciles_after_crash():
+    """两次保存之间进程退出时，重启后按分段索引补录未保存的消息"""
+    with _TempDataDir('jsonl', STATS_ROLLUP_SAVE_INTERVAL=3600, SEGMENT_INDEX_SAVE_INTERVAL=3600):
+        messages = _messages(30)
+        storage = MessageStorage()
+        storage.save_messages(messages[:10])
+        storage.close()
+
+        storage = MessageStorage()
+        storage.save_messages(messages[10:15])  # 启动后的第一批立即保存
+        storage.save_messages(messages[15:])
+        # 模拟进程被杀：最后一批消息已写入文件，索引和汇总都没有保存
+        for state in storage._jsonl_files.values():
+            state['file'].close()
+        stats_rollup._rollups.clear()
+        segment_index._indexes.clear()
+
+        storage = MessageStorage()
+        _check_stats(storage.get_chat_stats(CHAT_ID), messages)
+        storage.close()
+
+        storage = MessageStorage()
+        _check_stats(storage.get_chat_stats(CHAT_ID), messages)
+        storage.close()
+
+
+def test_txt_not_rolled_up():
+    """TXT 格式不维护统计汇总，只返回文件列表"""
+    with _TempDataDir('txt') as data_dir:
+        storage = MessageStorage()
+        storage.save_messages(_messages(5))
+        stats = storage.get_chat_stats(CHAT_ID)
+        storage.close()
+        assert 'total_messages' not in stats
+        assert stats['total_files'] == len(stats['files']) == 1
+        assert not os.path.exists(os.path.join(data_dir, ROLLUP_FILENAME))
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+存储模块测试
+使用临时数据目录验证各存储格式的写入与读取
+"""
+
+import json
+import os
+import sys
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+sys.path.append(current_dir)
+
+from storage import MessageStorage, load_messages_file, iter_messages_file, iter_messages_in_range
+from conftest import _TempDataDir, _make_message
+
+
+def test_jsonl_append_and_read():
+    """JSONL 格式追加写入后可以完整读回"""
+    with _TempDataDir('jsonl') as data_dir:
+        storage = MessageStorage()
+        for i in range(5):
+            storage.save_message(_make_message(i))
+        storage.close()
+
+        files = [f for f in os.listdir(data_dir) if f.endswith('.jsonl')]
+        assert len(files) == 1
+
+        messages = load_messages_file(os.path.join(data_dir, files[0]))
+        assert [m['message_id'] for m in messages] == list(range(5))
+        assert messages[0]['message_text'] == '第 0 条消息'
+
+
+def test_jsonl_split_and_resume():
+    """超过单文件上限时分割，重启后续写最新的分片"""
+    with _TempDataDir('jsonl', MAX_MESSAGES_PER_FILE=3) as data_dir:
+        storage = MessageStorage()
+        for i in range(4):
+            storage.save_message(_make_message(i))
+        storage.close()
+
+        files = sorted(f for f in os.listdir(data_dir) if f.endswith('.jsonl'))
+        assert len(files) == 2
+
+        # 模拟重启：新实例应当续写分片文件而不是基础文件
+        storage = MessageStorage()
+        storage.save_message(_make_message(4))
+        storage.close()
+
+        counts = [len(load_messages_file(os.path.join(data_dir, f))) for f in files]
+        assert counts == [3, 2]
+
+
+def _read_day_shards(data_dir: str, extension: str):
+    """按文件名顺序读取当天的分片：[(文件名, 消息 id 列表)]"""
+    files = sorted(f for f in os.listdir(data_dir) if f.startswith('chat_') and f.endswith(extension))
+    return [(f, [m['message_id'] for m in load_messages_file(os.path.join(data_dir, f))]) for f in files]
+
+
+def test_json_overflow_split_into_numbered_shards():
+    """JSON 溢出按单文件上限切分为多个分片，同一秒内多次分割使用递增序号而不会覆盖"""
+    with _TempDataDir('json', MAX_MESSAGES_PER_FILE=3) as data_dir:
+        storage = MessageStorage()
+        storage.save_messages([_make_message(i) for i in range(2)])
+        storage.save_messages([_make_message(i) for i in range(2, 12)])
+        storage.save_messages([_make_message(i) for i in range(12, 14)])
+        storage.close()
+
+        shards = _read_day_shards(data_dir, '.json')
+        assert [len(ids) for _, ids in shards] == [3, 3, 3, 3, 2]
+        assert [i for _, ids in shards for i in ids] == list(range(14))
+        assert [f.rsplit('_', 1)[-1] for f, _ in shards[1:]] == [
+            '000001.json', '000002.json', '000003.json', '000004.json'
+        ]
+
+
+def test_jsonl_rollover_numbered_shards():
+    """JSONL 一批内多次轮转使用递增序号，并接在旧版本 HHMMSS 命名的分片之后"""
+    with _TempDataDir('jsonl', MAX_MESSAGES_PER_FILE=3) as data_dir:
+        storage = MessageStorage()
+        storage.save_messages([_make_message(i) for i in range(8)])
+        storage.close()
+
+        shards = _read_day_shards(data_dir, '.jsonl')
+        assert [ids for _, ids in shards] == [[0, 1, 2], [3, 4, 5], [6, 7]]
+        date_str = shards[0][0].split('_')[2][:8]
+
+        # 旧版本按时间命名的分片：新分片的序号接在它之后
+        legacy = f'chat_1001234567890_{date_str}_235959.jsonl'
+        with open(os.path.join(data_dir, legacy), 'w', encoding='utf-8') as f:
+            for i in range(8, 11):
+                f.write(json.dumps(_make_message(i), ensure_ascii=False) + '\n')
+        os.remove(os.path.join(data_dir, 'segment_index.json'))
+
+        storage = MessageStorage()
+        storage.save_messages([_make_message(i) for i in range(11, 13)])
+        storage.close()
+
+        shards = _read_day_shards(data_dir, '.jsonl')
+        assert shards[-1] == (f'chat_1001234567890_{date_str}_235960.jsonl', [11, 12])
+        assert [i for _, ids in shards for i in ids] == list(range(13))
+
+
+def test_jsonl_skips_truncated_line():
+    """读取时跳过异常退出留下的不完整行"""
+    with _TempDataDir('jsonl') as data_dir:
+        storage = MessageStorage()
+        storage.save_message(_make_message(1))
+        storage.close()
+
+        filename = [f for f in os.listdir(data_dir) if f.endswith('.jsonl')][0]
+        with open(os.path.join(data_dir, filename), 'a', encoding='utf-8') as f:
+            f.write('{"message_id": 2, "chat_')
+
+        messages = load_messages_file(os.path.join(data_dir, filename))
+        assert [m['message_id'] for m in messages] == [1]
+
+
+def test_jsonl_append_after_truncated_line():
+    """重启后续写前先截掉不完整的末行，新消息单独成行；行数按磁盘内容重新统计"""
+    with _TempDataDir('jsonl') as data_dir:
+        storage = MessageStorage()
+        storage.save_messages([_make_message(1), _make_message(2)])
+        storage.close()
+
+        filepath = os.path.join(data_dir, [f for f in os.listdir(data_dir) if f.endswith('.jsonl')][0])
+        with open(filepath, 'a', encoding='utf-8') as f:
+            f.write('{"message_id": 3, "chat_')
+
+        storage = MessageStorage()
+        storage.save_message(_make_message(4))
+        assert storage._jsonl_files[-1001234567890]['count'] == 3
+        storage.close()
+
+        messages = load_messages_file(filepath)
+        assert [m['message_id'] for m in messages] == [1, 2, 4]
+
+
+def test_jsonl_append_after_missing_newline():
+    """末行是完整的消息、只缺换行符时保留该消息"""
+    with _TempDataDir('jsonl') as data_dir:
+        storage = MessageStorage()
+        storage.save_message(_make_message(1))
+        storage.close()
+
+        filepath = os.path.join(data_dir, [f for f in os.listdir(data_dir) if f.endswith('.jsonl')][0])
+        with open(filepath, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(_make_message(2), ensure_ascii=False))
+
+        storage = MessageStorage()
+        storage.save_message(_make_message(3))
+        storage.close()
+
+        messages = load_messages_file(filepath)
+        assert [m['message_id'] for m in messages] == [1, 2, 3]
+
+
+def test_sqlite_wal_and_stats():
+    """SQLite 使用 WAL 模式，并通过共享连接写入和统计"""
+    with _TempDataDir('sqlite'):
+        from sqlite_pool import get_connection_manager
+
+        storage = MessageStorage()
+        for i in range(6):
+            storage.save_message(_make_message(i, timestamp=f'2024-01-01 10:00:0{i}'))
+
+        with get_connection_manager().reader() as conn:
+            assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+        stats = storage.get_chat_stats(-1001234567890)
+        assert stats['total_messages'] == 6
+        assert stats['date_range'] == ('2024-01-01 10:00:00', '2024-01-01 10:00:05')
+        assert sum(count for _, _, count in stats['top_users']) == 6
+        storage.close()
+
+
+def test_segment_index_tracks_writes():
+    """分段索引随写入更新，并能在重启后从磁盘恢复"""
+    with _TempDataDir('jsonl') as data_dir:
+        from segment_index import SegmentIndex
+
+        storage = MessageStorage()
+        storage.save_messages([
+            _make_message(1, timestamp='2024-01-01 09:00:00'),
+            _make_message(2, timestamp='2024-01-01 11:00:00'),
+            _make_message(3, chat_id=-100999, timestamp='2024-01-01 10:00:00'),
+        ])
+        storage.close()
+
+        date_str = [f for f in os.listdir(data_dir) if f.startswith('chat_')][0].split('_')[2][:8]
+
+        # 重新加载索引（模拟重启）
+        index = SegmentIndex(data_dir)
+        segments = index.get_segments(-1001234567890, date_str)
+        assert len(segments) == 1
+        assert segments[0]['count'] == 2
+        assert segments[0]['min_ts'] == '2024-01-01 09:00:00'
+        assert segments[0]['max_ts'] == '2024-01-01 11:00:00'
+        assert sorted(index.get_chats_for_date(date_str)) == [-1001234567890, -100999]
+        assert index.get_chats_for_date(date_str, min_messages=2) == [-1001234567890]
+        assert index.get_chats()[-100999]['title'] == '测试群组'
+
+
+def test_segment_index_rebuilds_from_files():
+    """索引文件丢失时从已有的日文件重建"""
+    with _TempDataDir('json') as data_dir:
+        storage = MessageStorage()
+        for i in range(3):
+            storage.save_message(_make_message(i))
+        storage.close()
+        os.remove(os.path.join(data_dir, 'segment_index.json'))
+
+        from segment_index import SegmentIndex
+        index = SegmentIndex(data_dir)
+        chats = index.get_chats()
+        assert chats[-1001234567890]['message_count'] == 3
+
+
+def test_streaming_json_array_reader():
+    """增量解析 JSON 数组的结果与 json.load 一致（数据块小于单条消息）"""
+    with _TempDataDir('json') as data_dir:
+        storage = MessageStorage()
+        storage.save_messages([_make_message(i) for i in range(50)])
+        storage.close()
+
+        filename = [f for f in os.listdir(data_dir) if f.startswith('chat_')][0]
+        filepath = os.path.join(data_dir, filename)
+        assert list(iter_messages_file(filepath, chunk_size=7)) == load_messages_file(filepath)
+
+
+def test_iter_messages_in_range_filters_and_merges():
+    """按时间窗口过滤，多个分片按时间顺序合并"""
+    with _TempDataDir('jsonl') as data_dir:
+        # 三个分段交错写入，模拟同一天的多个文件
+        filepaths = []
+        for part in range(3):
+            filepath = os.path.join(data_dir, f'chat_1234567890_20240101_10000{part}.jsonl')
+            with open(filepath, 'w', encoding='utf-8') as f:
+                for i in range(part, 10, 3):
+                    message = _make_message(i, timestamp=f'2024-01-01 10:00:{i:02d}')
+                    f.write(json.dumps(message, ensure_ascii=False) + '\n')
+            filepaths.append(filepath)
+
+        messages = list(iter_messages_in_range(
+            filepaths, '2024-01-01 10:00:02', '2024-01-01 10:00:06'
+        ))
+        assert [m['message_id'] for m in messages] == [2, 3, 4, 5, 6]
+
+def _seed_search_messages():
+    """写入搜索测试消息"""
+    texts = ['今天讨论项目进度', '明天发布新版本 release', '项目 deadline 是周五', '50% 完成', 'hello_world']
+    storage = MessageStorage()
+    storage.save_messages([
+        dict(_make_message(i, chat_id=-100 - i % 2, timestamp=f'2024-01-01 10:00:{i:02d}'), message_text=text)
+        for i, text in enumerate(texts)
+    ])
+    storage.flush()
+    return storage
+
+
+def test_search_sqlite_fts():
+    """SQLite 全文搜索：中文子串、多关键词、短关键词、特殊字符、分页和群组过滤"""
+    with _TempDataDir('sqlite'):
+        storage = _seed_search_messages()
+        assert storage.fts_enabled
+
+        results, has_more = storage.search_messages('项目', limit=1)
+        assert [r['message_text'] for r in results] == ['项目 deadline 是周五']  # 最新的在前
+        assert has_more
+        results, has_more = storage.search_messages('项目', limit=1, offset=1)
+        assert [r['message_text'] for r in results] == ['今天讨论项目进度']
+        assert not has_more
+
+        assert len(storage.search_messages('项目进度')[0]) == 1
+        assert len(storage.search_messages('RELEASE')[0]) == 1
+        assert len(storage.search_messages('deadline 项目')[0]) == 1
+        assert len(storage.search_messages('50%')[0]) == 1
+        assert len(storage.search_messages('_')[0]) == 1
+        assert len(storage.search_messages('"项目')[0]) == 0
+        assert len(storage.search_messages('项目', chat_id=-100)[0]) == 2
+        assert len(storage.search_messages('项目', chat_id=-101)[0]) == 0
+        storage.close()
+
+
+def test_search_fts_backfill():
+    """已有数据库首次创建 FTS 索引时为历史消息建立索引"""
+    with _TempDataDir('sqlite') as data_dir:
+        storage = _seed_search_messages()
+        storage.close()
+
+        import sqlite3
+        conn = sqlite3.connect(os.path.join(data_dir, 'messages.db'))
+        conn.execute('DROP TABLE messages_fts')
+        conn.execute('DROP TRIGGER messages_fts_ai')
+        conn.commit()
+        conn.close()
+
+        storage = MessageStorage()
+        assert len(storage.search_messages('发布新版本')[0]) == 1
+        storage.close()
+
+
+def test_search_files():
+    """文件格式下顺序扫描搜索"""
+    with _TempDataDir('jsonl'):
+        storage = _seed_search_messages()
+        results, has_more = storage.search_messages('项目', limit=1)
+        assert [r['message_text'] for r in results] == ['项目 deadline 是周五']
+        assert has_more
+        assert len(storage.search_messages('hello_world')[0]) == 1
+        storage.close()
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+总结缓存测试
+验证 TTL、LRU 淘汰、持久化，以及并发相同请求只调用一次 AI 接口
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+sys.path.append(os.path.join(project_root, 'scripts'))
+sys.path.append(current_dir)
+
+from config.config import Config
+from ai_summary import AISummarizer
+from mock_openai_server import MockOpenAIServer
+from summary_cache import SummaryCache, make_cache_key
+from conftest import AI_OVERRIDES, _TempDataDir, _write_day
+
+
+def test_key_depends_on_params():
+    """内容摘要或生成参数不同时缓存键不同"""
+    key = make_cache_key(-100, 'abc', model='gpt-4o-mini', language='zh')
+    assert key == make_cache_key(-100, 'abc', language='zh', model='gpt-4o-mini')
+    assert key != make_cache_key(-100, 'abd', model='gpt-4o-mini', language='zh')
+    assert key != make_cache_key(-100, 'abc', model='gpt-4o', language='zh')
+    assert key != make_cache_key(-200, 'abc', model='gpt-4o-mini', language='zh')
+
+
+def test_lru_ttl_and_persistence():
+    """超出容量淘汰最久未使用的条目，过期条目失效，重启后保留"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'summary_cache.json')
+        cache = SummaryCache(path, ttl=3600, max_entries=2)
+        cache.put('a', '总结 A')
+        cache.put('b', '总结 B')
+        assert cache.get('a') == '总结 A'  # a 变为最近使用
+        cache.put('c', '总结 C')
+        assert cache.get('b') is None
+        assert cache.get('a') == '总结 A'
+        # put() 只修改内存，flush() 之后才落盘
+        assert not os.path.exists(path)
+        cache.flush()
+
+        reloaded = SummaryCache(path, ttl=3600, max_entries=2)
+        assert reloaded.get('a') == '总结 A'
+        assert reloaded.get('c') == '总结 C'
+
+        expired = SummaryCache(path, ttl=0.05, max_entries=2)
+        time.sleep(0.06)
+        assert expired.get('a') is None
+
+
+def test_single_flight():
+    """并发的相同请求共享一次调用，之后命中缓存"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SummaryCache(os.path.join(tmp, 'summary_cache.json'), ttl=3600, max_entries=10)
+        calls = []
+
+        async def factory():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return '总结'
+
+        async def run():
+            results = await asyncio.gather(*(cache.get_or_compute('k', factory) for _ in range(5)))
+            results.append(await cache.get_or_compute('k', factory))
+            return results
+
+        results = asyncio.run(run())
+        assert results == ['总结'] * 6
+        assert len(calls) == 1
+        stats = cache.get_stats()
+        assert stats['misses'] == 1
+        assert stats['coalesced'] == 4
+        assert stats['hits'] == 1
+
+
+def test_leader_cancel_keeps_waiters():
+    """发起请求被取消时，合并等待的请求仍然拿到结果，结果写入缓存文件"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'summary_cache.json')
+        cache = SummaryCache(path, ttl=3600, max_entries=10)
+        calls = []
+
+        async def factory():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return '总结'
+
+        async def run():
+            leader = asyncio.ensure_future(cache.get_or_compute('k', factory))
+            await asyncio.sleep(0)
+            waiters = [asyncio.ensure_future(cache.get_or_compute('k', factory)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            results = await asyncio.gather(*waiters)
+            try:
+                await leader
+            except asyncio.CancelledError:
+                pass
+            else:
+                raise AssertionError("发起请求应当被取消")
+            return results
+
+        assert asyncio.run(run()) == ['总结', '总结']
+        assert len(calls) == 1
+        assert SummaryCache(path, ttl=3600, max_entries=10).get('k') == '总结'
+
+
+def test_failure_not_cached():
+    """调用失败时所有等待者收到异常，下次重新调用"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SummaryCache(os.path.join(tmp, 'summary_cache.json'), ttl=3600, max_entries=10)
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError('API 错误')
+
+        async def run():
+            return await asyncio.gather(
+                *(cache.get_or_compute('k', failing) for _ in range(3)), return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert cache.get('k') is None
+
+
+def test_summarizer_reuses_cached_summary():
+    """两个管理员同时请求同一群组的总结只调用一次 AI，消息变化后重新生成"""
+    with _TempDataDir('jsonl', SUMMARY_CACHE_ENABLED=True, **AI_OVERRIDES) as data_dir:
+        _write_day(20)
+
+        async def run():
+            server = MockOpenAIServer(latency=0.05)
+            await server.start()
+            try:
+                Config.OPENAI_BASE_URL = server.base_url
+                Config.SUMMARY_DIR = os.path.join(data_dir, 'summaries')
+                os.makedirs(Config.SUMMARY_DIR, exist_ok=True)
+                summarizer = AISummarizer()
+                first = await asyncio.gather(
+                    summarizer.generate_today_summary(-1001234567890),
+                    summarizer.generate_today_summary(-1001234567890)
+                )
+                again = await summarizer.generate_today_summary(-1001234567890)
+                requests_before_change = server.request_count
+
+                _write_day(21)
+                await summarizer.generate_today_summary(-1001234567890)
+                return first, again, requests_before_change, server.request_count
+            finally:
+                await server.stop()
+
+        first, again, requests_before_change, requests_after_change = asyncio.run(run())
+        assert first[0] and first[0] == first[1] == again
+        assert requests_before_change == 1
+        assert requests_after_change == 2
+        assert os.path.exists(os.path.join(data_dir, 'summary_cache.json'))
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+更新调度测试
+验证同一群组按顺序处理、不同群组并发、并发上限以及重任务通道不阻塞消息处理
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+
+from update_processor import ChatOrderedDispatcher
+
+
+def test_per_chat_order_and_concurrency_limit():
+    """同一群组的处理顺序与到达顺序一致，同时处理数不超过上限"""
+    async def scenario():
+        dispatcher = ChatOrderedDispatcher(max_in_flight=4)
+        rng = random.Random(1)
+        handled = {chat: [] for chat in range(6)}
+
+        async def handle(chat, seq):
+            await asyncio.sleep(rng.random() / 500)
+            handled[chat].append(seq)
+
+        tasks = [
+            asyncio.create_task(dispatcher.run(i % 6, handle(i % 6, i)))
+            for i in range(120)
+        ]
+        await asyncio.gather(*tasks)
+        return dispatcher, handled
+
+    dispatcher, handled = asyncio.run(scenario())
+    for chat, seqs in handled.items():
+        assert seqs == sorted(seqs) and len(seqs) == 20
+    stats = dispatcher.get_stats()
+    assert stats['processed'] == 120 and stats['active_chats'] == 0
+    assert 1 < stats['peak_in_flight'] <= 4
+
+
+def test_heavy_lane_does_not_block_messages():
+    """重任务占满自己的通道时，普通消息仍能立即处理"""
+    async def scenario():
+        dispatcher = ChatOrderedDispatcher(max_in_flight=2, heavy_concurrency=1)
+        release = asyncio.Event()
+
+        async def summary():
+            await release.wait()
+
+        heavy = [asyncio.create_task(dispatcher.run(None, summary(), heavy=True)) for _ in range(3)]
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        await asyncio.gather(*(dispatcher.run(-100, asyncio.sleep(0.001)) for _ in range(10)))
+        elapsed = time.perf_counter() - start
+        stats = dispatcher.get_stats()
+        release.set()
+        await asyncio.gather(*heavy)
+        return elapsed, stats, dispatcher.get_stats()
+
+    elapsed, during, after = asyncio.run(scenario())
+    assert elapsed < 1
+    assert during['heavy_in_flight'] == 1 and during['processed'] == 10
+    assert after['heavy_processed'] == 3
+
+
+def test_cancelled_waiter_keeps_order():
+    """排队中的 Update 被取消后，后面的 Update 仍等待前一个完成"""
+    async def scenario():
+        dispatcher = ChatOrderedDispatcher()
+        events = []
+        gate = asyncio.Event()
+
+        async def first():
+            await gate.wait()
+            events.append('first')
+
+        async def record(name):
+            events.append(name)
+
+        t1 = asyncio.create_task(dispatcher.run(1, first()))
+        second = record('second')
+        t2 = asyncio.create_task(dispatcher.run(1, second))
+        t3 = asyncio.create_task(dispatcher.run(1, record('third')))
+        await asyncio.sleep(0.01)
+        t2.cancel()
+        await asyncio.sleep(0.01)
+        assert events == []
+        gate.set()
+        await asyncio.gather(t1, t3)
+        second.close()
+        return events
+
+    assert asyncio.run(scenario()) == ['first', 'third']
+
+
+def test_cancelled_tail_released():
+    """链尾的 Update 在等待中被取消，前一个完成后该群组不再计入 active_chats"""
+    async def scenario():
+        dispatcher = ChatOrderedDispatcher()
+        gate = asyncio.Event()
+
+        async def noop():
+            pass
+
+        t1 = asyncio.create_task(dispatcher.run(1, gate.wait()))
+        waiting = noop()
+        t2 = asyncio.create_task(dispatcher.run(1, waiting))
+        await asyncio.sleep(0.01)
+        t2.cancel()
+        await asyncio.sleep(0.01)
+        assert dispatcher.get_stats()['active_chats'] == 1
+        gate.set()
+        await t1
+        await asyncio.sleep(0)
+        waiting.close()
+        return dispatcher.get_stats()['active_chats']
+
+    assert asyncio.run(scenario()) == 0
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
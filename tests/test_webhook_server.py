@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Webhook 服务器测试
+验证密钥校验、Update 入队和健康检查
+"""
+
+import asyncio
+import os
+import sys
+
+import aiohttp
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+
+from webhook_server import HEALTH_PATH, SECRET_TOKEN_HEADER, WebhookServer
+
+
+async def _exchange(requests):
+    """启动服务器，依次发送 (method, path, headers, body)，返回状态码列表、队列和服务器"""
+    queue: asyncio.Queue = asyncio.Queue()
+    server = WebhookServer(
+        queue, lambda data: data if 'update_id' in data else None,
+        secret_token='s3cret', path='hook', host='127.0.0.1', port=0
+    )
+    await server.start()
+    statuses = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            for method, path, headers, body in requests:
+                url = f'http://127.0.0.1:{server.port}{path}'
+                async with session.request(method, url, headers=headers, data=body) as resp:
+                    statuses.append((resp.status, await resp.json() if path == HEALTH_PATH else None))
+    finally:
+        await server.stop()
+    return statuses, queue, server
+
+
+def test_secret_token_and_enqueue():
+    """只有携带正确密钥的合法 Update 会入队"""
+    good = {SECRET_TOKEN_HEADER: 's3cret'}
+    statuses, queue, server = asyncio.run(_exchange([
+        ('POST', '/hook', good, '{"update_id": 1}'),
+        ('POST', '/hook', {SECRET_TOKEN_HEADER: 'wrong'}, '{"update_id": 2}'),
+        ('POST', '/hook', {}, '{"update_id": 3}'),
+        ('POST', '/hook', good, 'not json'),
+        ('POST', '/hook', good, '{"unknown": true}'),
+        ('POST', '/hook', good, '{"update_id": 4}'),
+    ]))
+    assert [status for status, _ in statuses] == [200, 403, 403, 400, 200, 200]
+    assert [queue.get_nowait()['update_id'] for _ in range(queue.qsize())] == [1, 4]
+    assert (server.received, server.rejected, server.invalid) == (2, 2, 1)
+
+
+def test_health_endpoint():
+    """健康检查不需要密钥，返回待处理数量"""
+    statuses, _, _ = asyncio.run(_exchange([
+        ('POST', '/hook', {SECRET_TOKEN_HEADER: 's3cret'}, '{"update_id": 1}'),
+        ('GET', HEALTH_PATH, {}, None),
+    ]))
+    status, body = statuses[1]
+    assert status == 200
+    assert body['status'] == 'ok' and body['pending'] == 1 and body['received'] == 1
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
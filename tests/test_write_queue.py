@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+消息写入队列测试
+验证突发消息不会阻塞事件循环，并且关闭时全部落盘
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'src'))
+sys.path.append(current_dir)
+
+from storage import MessageStorage, load_messages_file
+from write_queue import MessageWriteQueue
+from conftest import _TempDataDir, _make_message
+
+
+def _burst(storage_format: str, count: int = 1000):
+    """向队列写入一批突发消息，返回 (入队耗时, 数据目录中的消息)"""
+    with _TempDataDir(storage_format) as data_dir:
+        storage = MessageStorage()
+        write_queue = MessageWriteQueue(storage, batch_size=100, flush_interval=0.05)
+        write_queue.start()
+
+        async def produce():
+            start = time.perf_counter()
+            for i in range(count):
+                await write_queue.put(_make_message(i, chat_id=-100 - i % 5))
+            return time.perf_counter() - start
+
+        elapsed = asyncio.run(produce())
+        write_queue.stop()
+
+        stats = write_queue.get_stats()
+        assert stats['written'] == count
+        assert stats['dropped'] == 0
+        assert stats['batches'] < count
+
+        if storage_format == 'sqlite':
+            from sqlite_pool import get_connection_manager
+            with get_connection_manager().reader() as conn:
+                total = conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0]
+        else:
+            total = sum(
+                len(load_messages_file(os.path.join(data_dir, f)))
+                for f in os.listdir(data_dir) if f.startswith('chat_')
+            )
+        storage.close()
+        return elapsed, total
+
+
+def test_burst_sqlite():
+    """SQLite 批量写入：入队不阻塞，关闭后全部落盘"""
+    elapsed, total = _burst('sqlite')
+    assert total == 1000
+    # 1000 条消息入队应远小于 1 秒
+    assert elapsed < 0.5
+
+
+def test_burst_jsonl():
+    """JSONL 批量写入"""
+    elapsed, total = _burst('jsonl')
+    assert total == 1000
+    assert elapsed < 0.5
+
+
+def test_burst_json():
+    """JSON 数组格式批量写入（每批每个文件只重写一次）"""
+    _, total = _burst('json')
+    assert total == 1000
+
+
+def test_backpressure():
+    """队列满时 put() 等待写入线程腾出空间，而不是丢弃消息"""
+    with _TempDataDir('jsonl'):
+        storage = MessageStorage()
+        write_queue = MessageWriteQueue(storage, maxsize=10, batch_size=5, flush_interval=0.01)
+        write_queue.start()
+
+        async def produce():
+            for i in range(200):
+                assert await write_queue.put(_make_message(i))
+
+        asyncio.run(produce())
+        write_queue.stop()
+        storage.close()
+
+        stats = write_queue.get_stats()
+        assert stats['written'] == 200
+        assert stats['dropped'] == 0
+
+
+def test_put_timeout_drops():
+    """写入线程未消费时，等待超过 WRITE_QUEUE_PUT_TIMEOUT 后丢弃并返回 False"""
+    with _TempDataDir('jsonl', WRITE_QUEUE_PUT_TIMEOUT=0.05):
+        write_queue = MessageWriteQueue(MessageStorage(), maxsize=1)
+
+        async def produce():
+            assert await write_queue.put(_make_message(0))
+            return await write_queue.put(_make_message(1))
+
+        assert asyncio.run(produce()) is False
+        stats = write_queue.get_stats()
+        assert stats['enqueued'] == 1
+        assert stats['dropped'] == 1
+        assert stats['backpressure_waits'] == 1
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")